@@ -7,7 +7,7 @@ import logging
 from collections import defaultdict
 from logging.handlers import TimedRotatingFileHandler
 from datetime import timedelta, datetime
-from time import perf_counter, sleep
+from time import perf_counter
 from typing import Optional
 
 import msgspec
@@ -31,8 +31,9 @@ from rich.logging import RichHandler
 
 from stratbot.alerts import tasks
 from stratbot.alerts.ops.user_setup_alerts import create_user_setup_alert, AlertType
-from stratbot.scanner.models.symbols import SymbolRec, Setup, SetupBuilder, NegatedReason, Direction
-from stratbot.users.models import User
+from stratbot.scanner.models.symbols import Setup, SetupBuilder, NegatedReason, Direction
+from stratbot.scanner.ops.pacing import AdaptivePacer
+from stratbot.scanner.ops.setups import changed_setups, persist_dirty_setups
 from v1.engines import CryptoEngine, StockEngine
 from stratbot.scanner.ops.candles.candlepair import CandlePair
 
@@ -63,31 +64,12 @@ indicies = [
     'BTCUSDT', 'ETHUSDT'
 ]
 
-fields_to_update = [
-    'has_triggered',
-    'in_force',
-    'in_force_alerted',
-    'in_force_last_alerted',
-    'hit_magnitude',
-    'magnitude_alerted',
-    'magnitude_last_alerted',
-    'initial_trigger',
-    'last_triggered',
-    'in_force_alerted',
-    'discord_alerted',
-    'potential_outside',
-]
-
 
-def fetch_bars(scanner: StockEngine | CryptoEngine):
-    symbols = (
-        SymbolRec.objects
-        .filter(symbol_type=scanner.engine_type)
-        .values_list('symbol', flat=True)
-    )
+def fetch_bars(scanner: StockEngine | CryptoEngine, symbols: set[str]):
+    symbols = sorted(symbols)
 
     bars = dict()
-    with r.pipeline() as pipe:
+    with r.pipeline(transaction=False) as pipe:
         for symbol in symbols:
             pipe.json().get(f'barHistory:{scanner.engine_type}:{symbol}')
 
@@ -103,6 +85,8 @@ def fetch_bars(scanner: StockEngine | CryptoEngine):
 
 def process_gappers(scanner: StockEngine | CryptoEngine):
     setups_to_update = []
+    # `bulk_update` skips `auto_now`, so stamp `updated_at` ourselves.
+    updated_at = timezone.now()
     for setup in scanner.setups:
         if setup.tf not in ['15', '30', '60', '4H', 'D']:
             continue
@@ -114,13 +98,16 @@ def process_gappers(scanner: StockEngine | CryptoEngine):
         if setup.gapped and not is_gapping:
             log.info(f"no longer gapping: {symbol}, {setup}")
             setup.gapped = False
+            setup.updated_at = updated_at
             setups_to_update.append(setup)
         elif is_gapping and not setup.gapped:
             gap_percentage = (price - setup.trigger) / setup.trigger
             log.info(f"gapping {gap_percentage}%: {symbol}, {setup}")
             setup.gapped = True
+            setup.updated_at = updated_at
             setups_to_update.append(setup)
-    Setup.objects.bulk_update(setups_to_update, ['gapped'])
+    Setup.objects.bulk_update(setups_to_update, ['gapped', 'updated_at'])
+    return len(setups_to_update)
 
 
 def is_in_force(setup: Setup) -> bool:
@@ -130,30 +117,36 @@ def is_in_force(setup: Setup) -> bool:
     return triggered_bear or triggered_bull
 
 
-def scan_loop(scanner: StockEngine | CryptoEngine, setups: list[Setup]):
+def scan_loop(scanner: StockEngine | CryptoEngine, setups: list[Setup]) -> int:
+    """
+    Check `setups` against the latest bars and persist whatever changed with a single
+    `bulk_update`. Returns the number of setups whose state changed, setups that only had
+    `last_triggered` stamped don't count.
+    """
     loop_timer = perf_counter()
 
     if isinstance(scanner, StockEngine) and scanner.exchange_calendar.is_closed():
+        updated = 0
         if scanner.exchange_calendar.is_premarket_hours():
-            process_gappers(scanner)
+            updated = process_gappers(scanner)
             elapsed = perf_counter() - loop_timer
             log.info(f'scanned gappers in {elapsed * 1000:.4f} ms ({elapsed:.2f} s)')
-        else:
-            sleep(0.5)
-        return
+        return updated
 
-    bars = fetch_bars(scanner)
-    user = User.objects.get(email='tom@bluegravity.com')
+    bars = fetch_bars(scanner, scanner.active_symbols(setups))
+    tfc_conflict = scanner.negated_reasons[NegatedReason.TFC_CONFLICT]
+    SetupNegatedReason = Setup.negated_reasons.through
 
-    setups_to_update = []
+    new_negated_reasons = []
     for setup in setups:
+        if setup.negated:
+            continue
         symbol = setup.symbol_rec.symbol
         price = setup.symbol_rec.price
         if not price:
             continue
 
         tf = setup.tf
-        updated = False
 
         # ==============================================================================================================
         # check negatable conditions
@@ -199,11 +192,9 @@ def scan_loop(scanner: StockEngine | CryptoEngine, setups: list[Setup]):
             if bull_day_bear_setup or bear_day_bull_setup:
                 log.info(f"TFC mismatch (daily): {symbol}, {setup}")
                 setup.negated = True
-                negated_reason = NegatedReason.objects.get(reason=NegatedReason.TFC_CONFLICT)
-                setup.negated_reasons.add(negated_reason)
+                new_negated_reasons.append(SetupNegatedReason(setup_id=setup.pk, negatedreason_id=tfc_conflict.pk))
 
         if setup.negated:
-            setup.save()
             continue
 
         # ==============================================================================================================
@@ -218,10 +209,8 @@ def scan_loop(scanner: StockEngine | CryptoEngine, setups: list[Setup]):
                 # print(opposing_setup)
 
             setup.last_triggered = timezone.now()
-            updated = True
         else:
             setup.in_force = False
-            updated = True
 
         try:
             target = setup.targets[0]
@@ -259,7 +248,6 @@ def scan_loop(scanner: StockEngine | CryptoEngine, setups: list[Setup]):
             if not setup.hit_magnitude and (hit_magnitude_bull or hit_magnitude_bear):
                 log.info(f"hit magnitude: {symbol}, {setup}")
                 setup.hit_magnitude = True
-                updated = True
         except (KeyError, IndexError) as e:
             print(e)
             pass
@@ -304,13 +292,11 @@ def scan_loop(scanner: StockEngine | CryptoEngine, setups: list[Setup]):
                 alert_type = AlertType.IN_FORCE
                 setup.in_force_alerted = True
                 setup.in_force_last_alerted = timezone.now()
-                setup.save()
 
             if setup.hit_magnitude:
                 alert_type = AlertType.MAGNITUDE
                 setup.magnitude_alerted = True
                 setup.magnitude_last_alerted = timezone.now()
-                setup.save()
 
             # todo: temp check start_datetime against initial_trigger to skip dupes after a code restart
             if setup.initial_trigger and scanner.started_on < setup.initial_trigger - timedelta(seconds=60):
@@ -344,25 +330,33 @@ def scan_loop(scanner: StockEngine | CryptoEngine, setups: list[Setup]):
                 # else:
                 #     log.info(f"skipping discord alert: {scanner.started_on=}, {setup.initial_trigger=}")
 
-        if updated is True:
-            setups_to_update.append(setup)
-    Setup.objects.bulk_update(setups_to_update, fields_to_update)
+    num_changed = len(changed_setups(setups))
+    num_updated = len(persist_dirty_setups(setups))
+    if new_negated_reasons:
+        SetupNegatedReason.objects.bulk_create(new_negated_reasons, ignore_conflicts=True)
     elapsed = perf_counter() - loop_timer
-    log.info(f'scanned {scanner.timeframes} - {len(scanner.setups)} setups in {elapsed * 1000:.4f} ms ({elapsed:.2f} s)')
+    log.info(
+        f'scanned {scanner.timeframes} - {len(setups)} setups, {len(bars)} symbols, {num_changed} changed, '
+        f'{num_updated} updated in {elapsed * 1000:.4f} ms ({elapsed:.2f} s)'
+    )
+    return num_changed
     # if scanner.console.table.row_count > 0:
     #     print(scanner.console.table)
     #     print('\a') # beep
 
 
 def main(scanner: Optional[StockEngine, CryptoEngine]):
-    setups = scanner.setups
+    setups = scanner.load_setups()
     last_setup_refresh = timezone.now()
+    pacer = AdaptivePacer()
 
     while True:
         if last_setup_refresh < timezone.now() - timedelta(seconds=5):
-            setups = scanner.setups
+            setups = scanner.load_setups()
             last_setup_refresh = timezone.now()
-        scan_loop(scanner, setups)
+        s = perf_counter()
+        num_changed = scan_loop(scanner, setups)
+        pacer.wait(perf_counter() - s, busy=num_changed > 0)
 
 
 VALID_TIMEFRAMES = {'15', '30', '60', '4H', '6H', '12H', 'D', 'W', 'M', 'Q', 'Y'}
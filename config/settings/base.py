@@ -65,6 +65,8 @@ POSTGRES_PORT = env("POSTGRES_PORT")
 POSTGRES_DB = env("POSTGRES_DB")
 POSTGRES_USER = env("POSTGRES_USER")
 POSTGRES_PASSWORD = env("POSTGRES_PASSWORD")
+# Database written by the bytewax PostgreSQL sinks, defaults to the one above.
+DATAFLOWS_DATABASE_URL = env("DATAFLOWS_DATABASE_URL", default="")
 
 DATABASES = {
     'default': {
@@ -1,13 +1,18 @@
+from __future__ import annotations
+
 from datetime import datetime, timezone
 import logging
+from typing import Optional, Union
 
 import pytz
-from discord_webhook import DiscordWebhook, DiscordEmbed
+from discord_webhook import DiscordEmbed
 from rich.table import Table
 
+from stratbot.alerts.integrations.discord.dispatchers import discord_dispatcher
 from stratbot.scanner.models.symbols import SymbolRec, Direction
 
 from .setups import SetupMsg
+from .symbols import SymbolInfo
 
 
 log = logging.getLogger(__name__)
@@ -19,10 +24,23 @@ class SetupMsgAlert:
         'shooter': '(s)',
     }
 
-    def __init__(self, symbolrec: SymbolRec, setup: SetupMsg, route: str):
+    def __init__(
+        self,
+        symbolrec: Union[SymbolRec, SymbolInfo],
+        setup: SetupMsg,
+        route: str,
+        price: Optional[float] = None,
+    ):
+        """
+        `price` is the last traded price shown in the alert and used for its TFC,
+        the close of `setup.current_bar` by default.
+        """
         self.symbolrec = symbolrec
         self.setup = setup
         self.route = route
+        if price is None:
+            price = setup.current_bar.c if setup.current_bar is not None else getattr(symbolrec, 'price', None)
+        self.price = price
         self.setup_pattern = '-'.join(setup.pattern)
         self.display_timeframes = symbolrec.display_timeframes
         self.tfc_timeframes = symbolrec.tfc_timeframes
@@ -50,7 +68,7 @@ class SetupMsgAlert:
     def timeframes_colored(self) -> str:
         excluded_timeframes = []
         output = []
-        for tf, state in self.symbolrec.tfc_state(self.display_timeframes).items():
+        for tf, state in self.symbolrec.tfc_state(self.display_timeframes, price=self.price).items():
             if tf in excluded_timeframes:
                 continue
 
@@ -207,8 +225,8 @@ class DiscordMsgAlert(SetupMsgAlert):
     CRYPTO_FTFC_CHANNEL = '/1217672185565413468/1jWulFYj5hRyDaSQYsjzZaLFFSECBwuf5Owfui6Hk5yQm1t2q9qAOsqGXi1NdiNkxoNk'
     CRYPTO_REVSTRATS_CHANNEL = '/1220899886904377376/gr9HFSax-HR9jKKTud_wsfLAqkiYk03DuMrZleRteNZ0HlTmdKD1tUiCsJcViqEwN2CY'
 
-    def __init__(self, symbolrec: SymbolRec, setup: SetupMsg):
-        super().__init__(symbolrec, setup, 'discord')
+    def __init__(self, symbolrec: Union[SymbolRec, SymbolInfo], setup: SetupMsg, price: Optional[float] = None):
+        super().__init__(symbolrec, setup, 'discord', price=price)
         if setup.potential_outside is True:
             self.setup_pattern = 'POTENTIAL 3'
         else:
@@ -252,7 +270,7 @@ class DiscordMsgAlert(SetupMsgAlert):
         magnitude_msg = f' :dart: **TARGET HIT**' if self.setup.hit_magnitude else ''
         msg_details = f'```\n' \
                       f'TRIGGER: {self.setup.trigger}\n' \
-                      f'   LAST: {self.symbolrec.price}\n' \
+                      f'   LAST: {self.price}\n' \
                       f'     T1: {self.setup.target}\n' \
                       f'    MAG: {self.setup.magnitude_dollars} ({self.setup.magnitude_percent}%)\n' \
                       f'```{url}\n' \
@@ -296,39 +314,32 @@ class DiscordMsgAlert(SetupMsgAlert):
         # todo: remove channel check in the future?? used to block dupe mag alerts on dang channels
         if self.setup.hit_magnitude and channel in ['stock', 'crypto']:
             url = self._create_url(self.MAGNITUDE_CHANNELS[channel])
-            webhook = DiscordWebhook(url=url, embeds=[embed])
-            r = webhook.execute()
+            discord_dispatcher.submit(url, embed)
             return
 
         push_role_header = self._alert_header(channel, self.setup.tf)
         url = self._create_url(webhook_channel_map[channel])
-        webhook = DiscordWebhook(url=url, content=push_role_header, embeds=[embed])
-        # webhook = DiscordWebhook(url=url, embeds=[embed])
-        r = webhook.execute()
+        discord_dispatcher.submit(url, embed, content=push_role_header)
 
         if channel in ['stock', 'crypto']:
             if self.setup.priority in [1, 2]:
                 url = self._create_url(self.PRIORITY_CHANNELS[channel])
                 push_role_header = self._alert_header(channel, 'PRIORITY')
-                webhook = DiscordWebhook(url=url, content=push_role_header, embeds=[embed])
-                r = webhook.execute()
+                discord_dispatcher.submit(url, embed, content=push_role_header)
 
             if 'P3' in self.setup.pattern:
                 url = self._create_url(self.SSS50_CHANNELS[channel])
                 push_role_header = self._alert_header(channel, 'SSS50')
-                webhook = DiscordWebhook(url=url, content=push_role_header, embeds=[embed])
-                r = webhook.execute()
+                discord_dispatcher.submit(url, embed, content=push_role_header)
 
             if self.symbolrec.is_index or self.symbolrec.is_sector:
                 url = self._create_url(self.STOCKS_INDEX_CHANNEL)
                 push_role_header = self._alert_header(channel, 'PRIORITY')
-                webhook = DiscordWebhook(url=url, content=push_role_header, embeds=[embed])
-                r = webhook.execute()
+                discord_dispatcher.submit(url, embed, content=push_role_header)
 
             partial_url = self.CRYPTO_ALL if self.symbolrec.is_crypto else self.STOCKS_ALL
             url = self._create_url(partial_url)
-            webhook = DiscordWebhook(url=url, embeds=[embed])
-            r = webhook.execute()
+            discord_dispatcher.submit(url, embed)
 
 
 def create_table():
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from decimal import Decimal
+from typing import Callable
 import redis
 
 import msgspec
@@ -32,47 +33,89 @@ class Bar:
     def as_dict(self):
         return self.__dict__
 
+    def copy(self) -> 'Bar':
+        return Bar(self.ts, self.o, self.h, self.l, self.c, self.v, self.sid)
+
     @property
     def as_tuple(self):
         return self.sid, bar_shape(self), self.green, self.red
 
 
 class BarSeries:
+    """
+    The newest `MAXLEN` bars of a symbol and timeframe, oldest first.
+
+    Bars are held in a fixed-size ring (`_start` is the slot of the oldest bar), so
+    appending, replacing the newest bar and indexing from either end are O(1) instead of
+    sorting the timestamps on every call.
+    """
     MAXLEN = 5
-    _bars: dict[float, Bar]
 
     def __init__(self, symbol: str, tf: str, bars: dict[float, Bar] = None):
         self.symbol = symbol
         self.tf = tf
-        self._bars = bars or {}
+        self._ring: list[Bar | None] = [None] * self.MAXLEN
+        self._start = 0
+        self._count = 0
+        for ts in sorted(bars or {}):
+            self.add_bar(bars[ts])
 
     def __str__(self):
-        return f'{self.symbol} {self.tf} - {len(self._bars)} bars'
+        return f'{self.symbol} {self.tf} - {self._count} bars'
+
+    def _slot(self, index: int) -> int:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('bar index out of range')
+        return (self._start + index) % self.MAXLEN
+
+    def _iter_bars(self):
+        for i in range(self._count):
+            yield self._ring[(self._start + i) % self.MAXLEN]
 
     @property
     def bars(self) -> dict[float, Bar]:
-        return self._bars
+        return {bar.ts: bar for bar in self._iter_bars()}
 
     def add_bar(self, bar):
-        if len(self._bars) >= self.MAXLEN:
-            self._bars.pop(min(self._bars.keys()))
-        self._bars[bar.ts] = bar
+        if self._count and bar.ts <= self.get_newest().ts:
+            self._add_out_of_order(bar)
+        elif self._count == self.MAXLEN:
+            self._ring[self._start] = bar
+            self._start = (self._start + 1) % self.MAXLEN
+        else:
+            self._ring[(self._start + self._count) % self.MAXLEN] = bar
+            self._count += 1
+
+    def _add_out_of_order(self, bar):
+        # Rare (a repeated or late timestamp), rebuild the ring in timestamp order.
+        bars = self.bars
+        if bar.ts not in bars and len(bars) >= self.MAXLEN:
+            bars.pop(min(bars))
+        bars[bar.ts] = bar
+        self._ring = [None] * self.MAXLEN
+        self._start = self._count = 0
+        for ts in sorted(bars):
+            self._ring[self._count] = bars[ts]
+            self._count += 1
 
     def get_newest(self):
-        return self._bars[max(self._bars.keys())] if self._bars else None
+        return self._ring[(self._start + self._count - 1) % self.MAXLEN] if self._count else None
 
     def get_previous(self):
-        sorted_keys = sorted(self._bars.keys())
-        return self._bars[sorted_keys[-2]] if len(sorted_keys) > 1 else None
+        return self._ring[(self._start + self._count - 2) % self.MAXLEN] if self._count > 1 else None
 
     def get_by_index(self, index):
-        sorted_keys = sorted(self._bars.keys())
-        return self._bars[sorted_keys[index]] if len(sorted_keys) > index else None
+        return self._ring[self._slot(index)] if self._count > index else None
 
     def replace_newest(self, bar):
-        if self._bars:
-            self._bars.pop(max(self._bars.keys()))
-        self._bars[bar.ts] = bar
+        if self._count == 1 or (self._count and bar.ts > self.get_previous().ts):
+            self._ring[(self._start + self._count - 1) % self.MAXLEN] = bar
+            return
+        if self._count:
+            self._count -= 1
+        self.add_bar(bar)
 
     def merge_bar_from_timescale(self, new_bar):
         existing_bar = self.get_newest()
@@ -89,16 +132,13 @@ class BarSeries:
             self.add_bar(new_bar)
 
     def strat_candles(self):
-        if len(self._bars) < 3:
+        if self._count < 3:
             return None, None
-        trigger_bar = self.get_previous()
-        sorted_keys = sorted(self._bars.keys())
-        target_bar = self._bars[sorted_keys[-3]] if len(sorted_keys) > 2 else None
-        return target_bar, trigger_bar
+        return self._ring[(self._start + self._count - 3) % self.MAXLEN], self.get_previous()
 
     @property
     def outside_trigger(self):
-        if len(self._bars) < 2:
+        if self._count < 2:
             return None
         previous_bar = self.get_previous()
         high = Decimal(str(previous_bar.h))
@@ -106,7 +146,33 @@ class BarSeries:
         return (high + low) / 2
 
     def as_dict(self):
-        return [bar.__dict__ for bar in self.bars.values()]
+        return [bar.__dict__ for bar in self._iter_bars()]
+
+    def snapshot(self) -> 'BarSeriesSnapshot':
+        """
+        An immutable view of the series to emit from a `stateful_map` step instead of a
+        `copy.deepcopy`. Only the newest bar is still being updated in place, so it is the
+        only one copied, the older (closed) bars are shared with the live series.
+        """
+        bars = tuple(self._iter_bars())
+        if bars:
+            bars = bars[:-1] + (bars[-1].copy(),)
+        return BarSeriesSnapshot(self.symbol, self.tf, bars)
+
+
+class BarSeriesSnapshot(msgspec.Struct, frozen=True):
+    symbol: str
+    tf: str
+    bars: tuple[Bar, ...] = ()
+
+    def get_newest(self) -> Bar | None:
+        return self.bars[-1] if self.bars else None
+
+    def get_previous(self) -> Bar | None:
+        return self.bars[-2] if len(self.bars) > 1 else None
+
+    def as_dict(self):
+        return [bar.__dict__ for bar in self.bars]
 
 
 def bar_series_from_cache(r: redis.client, key_prefix: str, symbol: str, tf: str):
@@ -120,6 +186,82 @@ def bar_series_from_cache(r: redis.client, key_prefix: str, symbol: str, tf: str
     return bar_series
 
 
+def bar_series_by_tf_from_cache(r: redis.client, key_prefix: str, symbol: str, timeframes) -> dict[str, BarSeries]:
+    """
+    Every timeframe's `BarSeries` for `symbol` from a single read of its bar history.
+    """
+    tf_bar_series = {tf: BarSeries(symbol, tf) for tf in timeframes}
+    try:
+        tf_bars = r.json().get(f'{key_prefix}{symbol}') or {}
+    except redis.exceptions.ResponseError:
+        tf_bars = {}
+    for tf, bar_series in tf_bar_series.items():
+        for bar in tf_bars.get(tf) or []:
+            bar_series.add_bar(Bar(**bar))
+    return tf_bar_series
+
+
+def aggregate_bar(bar_series: BarSeries, bucket_ts: float, bar: Bar) -> bool:
+    """
+    Fold a (second) bar into the `bar_series` bar starting at `bucket_ts`, opening a new bar
+    when the bucket changes. Returns False if `bar` is older than the series' newest bar.
+    """
+    current_bar = bar_series.get_newest()
+
+    if current_bar is None:
+        current_bar = Bar(ts=bucket_ts, o=bar.o, h=bar.h, l=bar.l, c=bar.c, v=bar.v)
+        bar_series.add_bar(current_bar)
+
+    # if the bar is older than the current bar in the series, such as when reading from the
+    # beginning of a redpanda topic when no state is available, skip updating the bar_series
+    # because the bar_series is "current".
+    if bar.ts < current_bar.ts:
+        return False
+
+    if bucket_ts == current_bar.ts:
+        current_bar.h = max(bar.h, current_bar.h, float('-inf'))
+        current_bar.l = min(bar.l, current_bar.l, float('inf'))
+        current_bar.c = bar.c
+        current_bar.v = current_bar.v + bar.v
+
+        if previous_bar := bar_series.get_previous():
+            current_bar.sid = strat_id(previous_bar, current_bar)
+        bar_series.replace_newest(current_bar)
+    else:
+        current_bar = Bar(ts=bucket_ts, o=bar.o, h=bar.h, l=bar.l, c=bar.c, v=bar.v)
+        if previous_bar := bar_series.get_previous():
+            current_bar.sid = strat_id(previous_bar, current_bar)
+        bar_series.add_bar(current_bar)
+    return True
+
+
+def build_timeframe_aggregator(r: redis.client, key_prefix: str, boundaries) -> Callable:
+    """
+    A `stateful_map` mapper that keeps every timeframe's `BarSeries` for a symbol in one
+    state object. Each `(symbol, bar)` second bar is folded into all of them at once, using
+    the bucket starts from `boundaries` (a `timeframe_ops.BucketBoundaries`), and the
+    `{tf: bars}` payload for the symbol is emitted directly.
+    """
+    def aggregate_timeframes(tf_bar_series, symbol__bar):
+        symbol, bar = symbol__bar
+
+        if tf_bar_series is None:
+            print(f'load historical data for {symbol}')
+            tf_bar_series = bar_series_by_tf_from_cache(r, key_prefix, symbol, boundaries.timeframes)
+
+        for tf, bucket_ts in boundaries.buckets(bar.ts).items():
+            bar_series = tf_bar_series[tf]
+            if not aggregate_bar(bar_series, bucket_ts, bar):
+                bar_ts = datetime.fromtimestamp(bar.ts, tz=timezone.utc)
+                current_bar_ts = datetime.fromtimestamp(bar_series.get_newest().ts, tz=timezone.utc)
+                print(f'skipping {symbol} [{tf}] {bar_ts} < {current_bar_ts}')
+
+        by_tf = {tf: bar_series.snapshot().as_dict() for tf, bar_series in tf_bar_series.items()}
+        return tf_bar_series, by_tf
+
+    return aggregate_timeframes
+
+
 # def bar_series_from_db(symbol, tf):
 #     symbolrec = SymbolRec.objects.get(symbol=symbol)
 #
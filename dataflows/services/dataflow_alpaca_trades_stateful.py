@@ -1,12 +1,9 @@
 import os
-import copy
 from datetime import datetime, timedelta, timezone, time
-from typing import Tuple, Callable
 
 import bytewax.operators as op
 import bytewax.operators.window as window_op
 import pytz
-import redis.exceptions
 from bytewax.connectors.stdio import StdOutSink
 from bytewax.dataflow import Dataflow
 from bytewax.connectors.kafka import KafkaSource, KafkaSink
@@ -22,8 +19,8 @@ from django.conf import settings
 from django.core.cache import caches
 from stratbot.scanner.models.symbols import SymbolRec
 
-from dataflows.bars import Bar, to_ohlc, strat_id, parse_tfc, clean, bar_series_from_cache
-from dataflows.timeframe_ops import floor_datetime_variable, floor_datetime_mixed
+from dataflows.bars import to_ohlc, parse_tfc, clean, add_key_to_value, build_timeframe_aggregator
+from dataflows.timeframe_ops import stock_bucket_boundaries
 
 cache = caches['markets']
 r = cache.client.get_client(write=True)
@@ -104,76 +101,6 @@ def accumulate(acc, x):
     return acc
 
 
-def update_bar_series(bar_series, symbol__tf__bucket__bar):
-    symbol, tf, bucket, bar = symbol__tf__bucket__bar
-
-    if bar_series is None:
-        print(f'load historical data for {symbol} [{tf}]')
-        bar_series = bar_series_from_cache(r, bar_history_key_prefix, symbol, tf)
-        # bar_series = bar_series_from_db(symbol, tf)
-
-    bucket_ts = bucket.timestamp()
-    current_bar = bar_series.get_newest()
-
-    if current_bar is None:
-        current_bar = Bar(ts=bucket_ts, o=bar.o, h=bar.h, l=bar.l, c=bar.c, v=bar.v)
-        bar_series.add_bar(current_bar)
-
-    # if the bar is older than the current bar in the series, such as when reading from the
-    # beginning of a redpanda topic when no state is available, skip updating the bar_series
-    # because the bar_series is "current".
-    if bar.ts < current_bar.ts:
-        bar_ts = datetime.fromtimestamp(bar.ts, tz=timezone.utc)
-        current_bar_ts = datetime.fromtimestamp(current_bar.ts, tz=timezone.utc)
-        print(f'skipping {symbol} [{tf}] {bar_ts} < {current_bar_ts}')
-        return bar_series, copy.deepcopy(bar_series)
-
-    if bucket_ts == current_bar.ts:
-        current_bar.h = max(bar.h, current_bar.h, float('-inf'))
-        current_bar.l = min(bar.l, current_bar.l, float('inf'))
-        current_bar.c = bar.c
-        current_bar.v = current_bar.v + bar.v
-
-        if previous_bar := bar_series.get_previous():
-            current_bar.sid = strat_id(previous_bar, current_bar)
-        bar_series.replace_newest(current_bar)
-    else:
-        current_bar = Bar(ts=bucket_ts, o=bar.o, h=bar.h, l=bar.l, c=bar.c, v=bar.v)
-        if previous_bar := bar_series.get_previous():
-            current_bar.sid = strat_id(previous_bar, current_bar)
-        bar_series.add_bar(current_bar)
-
-    return bar_series, copy.deepcopy(bar_series)
-
-
-def build_window_assigner(
-    tf: str,
-    delta: timedelta | None,
-    offset: timedelta | None = timedelta(0),
-) -> Callable[[Bar], Tuple[str, Tuple[str, str, datetime, Bar]]]:
-
-    def window_assigner(symbol__bar):
-        symbol, bar = symbol__bar
-        dt = datetime.fromtimestamp(bar.ts, tz=timezone.utc)
-        if tf in ['M', 'Q', 'Y']:
-            bucket = floor_datetime_variable(dt, interval=tf)
-        else:
-            bucket = floor_datetime_mixed(dt, delta=delta, offset=offset)
-        return symbol, (symbol, tf, bucket, bar)
-
-    return window_assigner
-
-
-def group_by_tf(symbol__bar_series_streams):
-    symbol, bar_series_streams = symbol__bar_series_streams
-
-    by_tf = {}
-    for bar_series in bar_series_streams:
-        by_tf[bar_series.tf] = bar_series.as_dict()
-
-    return symbol, by_tf
-
-
 flow = Dataflow("alpaca_trades_stateful")
 trades = (
     op.input('kafka_source', flow, kafka_source)
@@ -193,73 +120,11 @@ one_second_window = window_op.fold_window(
     "window", trades, clock_config, window_config, list, accumulate
 ).then(op.map, "agg", to_ohlc)
 
-timeframe_15 = op.map(
-    "assign_15m_timeframe", one_second_window, build_window_assigner('15', timedelta(minutes=15))
-)
-trades_15 = op.stateful_map("process_15m_trades", timeframe_15, update_bar_series)
-
-timeframe_30 = op.map(
-    "assign_30m_timeframe", one_second_window, build_window_assigner('30', timedelta(minutes=30))
-)
-trades_30 = op.stateful_map("process_30m_trades", timeframe_30, update_bar_series)
-
-timeframe_60 = op.map(
-    "assign_60m_timeframe", one_second_window, build_window_assigner('60', timedelta(minutes=60), offset=timedelta(minutes=30))
-)
-trades_60 = op.stateful_map("process_60m_trades", timeframe_60, update_bar_series)
-
-timeframe_4h = op.map(
-    "assign_4H_timeframe", one_second_window, build_window_assigner('4H', timedelta(hours=4), offset=timedelta(hours=9, minutes=30))
-)
-trades_4h = op.stateful_map("process_4H_trades", timeframe_4h, update_bar_series)
-
-timeframe_d = op.map(
-    "assign_D_timeframe", one_second_window, build_window_assigner('D', timedelta(days=1))
-)
-trades_d = op.stateful_map("process_D_trades", timeframe_d, update_bar_series)
-
-timeframe_w = op.map(
-    "assign_W_timeframe", one_second_window, build_window_assigner('W', timedelta(weeks=1))
-)
-trades_w = op.stateful_map(
-    "process_W_trades", timeframe_w, update_bar_series
-)
-
-timeframe_m = op.map(
-    "assign_M_timeframe", one_second_window, build_window_assigner('M', None)
-)
-trades_m = op.stateful_map(
-    "process_M_trades", timeframe_m, update_bar_series
-)
-
-timeframe_q = op.map(
-    "assign_Q_timeframe", one_second_window, build_window_assigner('Q', None)
-)
-trades_q = op.stateful_map(
-    "process_Q_trades", timeframe_q, update_bar_series
-)
-
-timeframe_y = op.map(
-    "assign_Y_timeframe", one_second_window, build_window_assigner('Y', None)
-)
-trades_y = op.stateful_map(
-    "process_Y_trades", timeframe_y, update_bar_series
-)
-
-tf_streams = op.join(
-    "join_tf_streams",
-    trades_15,
-    trades_30,
-    trades_60,
-    trades_4h,
-    trades_d,
-    trades_w,
-    trades_m,
-    trades_q,
-    trades_y
+tf_streams = (
+    op.map('add_symbol_key', one_second_window, add_key_to_value)
+    .then(op.stateful_map, 'aggregate_timeframes', build_timeframe_aggregator(r, bar_history_key_prefix, stock_bucket_boundaries()))
 )
-tf_streams = op.map('group_by_tf', tf_streams, group_by_tf)
-op.output('redis_sink', tf_streams, RedisSink(r, bar_history_key_prefix))
+op.output('redis_sink', tf_streams, RedisSink(r, bar_history_key_prefix, bar_history=True))
 
 s_serialized = op.map('kafka_serialize', tf_streams, serialize)
 op.output('kafka_sink', s_serialized, kafka_sink)
@@ -155,7 +155,7 @@ s = (
     .then(op.map, 'downsample', downsample)
     .then(op.filter, 'filter_null', lambda data: data[1] != {})
 )
-op.output('redis_sink', s, RedisSink(r, bar_history_key_prefix))
+op.output('redis_sink', s, RedisSink(r, bar_history_key_prefix, bar_history=True))
 s_serialized = op.map('kafka_serialize', s, serialize)
 op.output('kafka_sink', s_serialized, kafka_sink_bars)
 
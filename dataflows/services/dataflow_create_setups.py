@@ -1,4 +1,4 @@
-import copy
+import logging
 import os
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
@@ -17,13 +17,14 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.prod")
 import django
 django.setup()
 from django.conf import settings
-from stratbot.scanner.models.symbols import SymbolRec
 from stratbot.scanner.models.pricerecs import STOCK_TF_PRICEREC_MODEL_MAP, CRYPTO_TF_PRICEREC_MODEL_MAP
 
-from dataflows.setups import find_targets, create_setups_from_bar_series
+from dataflows.setups import find_targets, create_setups_from_bar_series, snapshot_setups
 from dataflows.serializers import deserialize, serialize
 from dataflows.bars import to_bar_series_by_tf, potential_outside_bar, opening_prices, tfc_state
 from dataflows.alerts import DiscordMsgAlert
+from dataflows.symbols import SymbolRegistry
+from dataflows.targets import MagnitudeLadders, pricerec_history_loader
 
 
 kafka_conf = {
@@ -49,9 +50,21 @@ kafka_sink = KafkaSink(
     add_config=kafka_conf,
 )
 
-symbols = SymbolRec.objects.filter(skip_discord_alerts=False).values_list('symbol', 'symbol_type')
-symbol_type_map = {symbol: symbol_type for symbol, symbol_type in symbols}
-allowed_symbols = symbol_type_map.keys()
+log = logging.getLogger(__name__)
+
+symbol_registry = SymbolRegistry(skip_discord_alerts=False).start()
+
+
+def pricerec_model_map(symbol):
+    # None once a registry refresh has dropped a symbol that is still in flight
+    if (symbol_info := symbol_registry.get(symbol)) is None:
+        return None
+    if symbol_info.symbol_type == 'stock':
+        return STOCK_TF_PRICEREC_MODEL_MAP
+    return CRYPTO_TF_PRICEREC_MODEL_MAP
+
+
+magnitude_ladders = MagnitudeLadders(pricerec_history_loader(pricerec_model_map))
 
 
 def scan_setups(historical_setups, symbol__tf_bar_series__tf_setups):
@@ -61,6 +74,8 @@ def scan_setups(historical_setups, symbol__tf_bar_series__tf_setups):
         if historical_setups.get(tf) is None or historical_setups[tf].timestamp < setup.timestamp:
             historical_setups[tf] = setup
 
+    magnitude_ladders.update(tf_bar_series)
+
     # opens = opening_prices(tf_bar_series)
     price = Decimal(str(tf_bar_series['15'].get_newest().c))
     # tfc_table = tfc_state(opens, price)
@@ -73,6 +88,8 @@ def scan_setups(historical_setups, symbol__tf_bar_series__tf_setups):
 
     in_force_setups = []
     setup_triggers = {}
+    # only the setups checked on this bar are emitted, negated ones no longer change
+    checked_setups = {}
     for tf, setup in historical_setups.items():
         bar_series = tf_bar_series[tf]
         if bar_series is None or setup is None:
@@ -83,13 +100,14 @@ def scan_setups(historical_setups, symbol__tf_bar_series__tf_setups):
             continue
         # if setup.negated or setup.hit_magnitude or setup.potential_outside:
         #     continue
+        checked_setups[tf] = setup
 
         current_bar = bar_series.get_newest()
 
         continuation = trigger_bar.sid == current_bar.sid or (trigger_bar.sid == '3' and current_bar.sid != '1')
         if continuation:
             setup.negated = True
-            setup.negated_reasons.add('CONTINUATION')
+            setup.negated_reasons = setup.negated_reasons | {'CONTINUATION'}
             continue
 
         setup.check_potential_outside(current_bar)
@@ -107,41 +125,11 @@ def scan_setups(historical_setups, symbol__tf_bar_series__tf_setups):
             in_force_setups.append((tf, setup.bull_or_bear, setup.potential_outside))
             setup.target = find_targets(setup, bar_series)
 
-            if symbol_type_map[setup.symbol] == 'stock':
-                model_map = STOCK_TF_PRICEREC_MODEL_MAP
-            else:
-                model_map = CRYPTO_TF_PRICEREC_MODEL_MAP
-            model = model_map[tf]
-
             if setup.targets is None and setup.target is not None:
                 s = perf_counter()
-                targets = []
-                if setup.direction == 1:
-                    additional_targets = (
-                        model.objects
-                        .filter(symbol=setup.symbol, high__gt=setup.target)
-                        .order_by('-bucket')
-                        .values_list('high', flat=True)
-                    )
-                    current_high = setup.target
-                    for target in additional_targets:
-                        if target > current_high:
-                            targets.append(target)
-                            current_high = target
-                else:
-                    additional_targets = (
-                        model.objects
-                        .filter(symbol=setup.symbol, low__lt=setup.target)
-                        .order_by('-bucket')
-                        .values_list('low', flat=True)
-                    )
-                    current_low = setup.target
-                    for target in additional_targets:
-                        if target < current_low:
-                            targets.append(target)
-                            current_low = target
-
-                setup.targets = targets[0:5]
+                ladder = magnitude_ladders.get(bar_series)
+                if ladder is not None:
+                    setup.targets = ladder.targets(setup.target, setup.direction)
                 print(f'additional targets [{symbol}]: ', setup.targets)
                 elapsed = perf_counter() - s
                 print(f'completed in {elapsed * 1000:.4f} ms ({elapsed:.2f} s)')
@@ -157,12 +145,15 @@ def scan_setups(historical_setups, symbol__tf_bar_series__tf_setups):
                     print(f'*** INSIDE BAR WARNING: {inside_bars}')
                 # console.print(f'* TFC: {tfc_output}')
 
-                symbolrec = SymbolRec.objects.get(symbol=setup.symbol)
-                alert = DiscordMsgAlert(symbolrec, setup)
-                # alert.send_msg(channel=symbolrec.symbol_type)
+                symbol_info = symbol_registry.get(setup.symbol)
+                if symbol_info is None:
+                    log.info(f'{setup.symbol} is no longer in the symbol registry, skipping alert')
+                else:
+                    alert = DiscordMsgAlert(symbol_info, setup, price=float(price))
+                    # alert.send_msg(channel=symbol_info.symbol_type)
 
-                setup.in_force_alerted = True
-                setup.in_force_last_alerted = datetime.now(tz=timezone.utc)
+                    setup.in_force_alerted = True
+                    setup.in_force_last_alerted = datetime.now(tz=timezone.utc)
 
         if not setup.hit_magnitude:
             hit_magnitude_bull = setup.direction == 1 and (price >= setup.target or current_bar.h >= setup.target)
@@ -185,7 +176,7 @@ def scan_setups(historical_setups, symbol__tf_bar_series__tf_setups):
     # if len(in_force_setups) >= 3:
     #     print(f'*** IN FORCE SETUPS: {symbol} {in_force_setups}')
 
-    return historical_setups, copy.deepcopy(historical_setups)
+    return historical_setups, snapshot_setups(checked_setups)
 
 
 flow = Dataflow("create_setups_dataflow")
@@ -193,7 +184,7 @@ flow = Dataflow("create_setups_dataflow")
 bar_stream = (
     op.input('kafka_source', flow, kafka_source)
     .then(op.map, 'deserialize', deserialize)
-    .then(op.filter, 'filter_symbols', lambda data: data[0] in allowed_symbols)
+    .then(op.filter, 'filter_symbols', lambda data: data[0] in symbol_registry)
     .then(op.map, 'to_bar_series_by_tf', to_bar_series_by_tf)
 )
 
@@ -1,5 +1,4 @@
 import os
-import pickle
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 
@@ -19,6 +18,8 @@ django.setup()
 from django.conf import settings
 from django.core.cache import caches
 from stratbot.scanner.models.symbols import SymbolRec, SymbolType
+from stratbot.scanner.ops.candles.columnar import candles_from_bytes, dumps_df
+from stratbot.scanner.ops.candles.metrics import stratify_tail
 
 from dataflows.bars import Bar
 from dataflows.timeframe_ops import make_crypto_time_buckets, make_stock_time_buckets
@@ -67,8 +68,7 @@ def initialize_dfs_from_redis(symbol: str, symbol_type: SymbolType):
     results = pipe.execute()
 
     for tf, df_bytes in zip(timeframes, results):
-        df = pickle.loads(df_bytes)
-        dfs[tf] = df
+        dfs[tf] = candles_from_bytes(df_bytes)
     return dfs
 
 
@@ -127,25 +127,27 @@ def update_timeframes_stateful(dfs, symbol__bar):
     bucket_func = make_crypto_time_buckets if symbol_type == SymbolType.CRYPTO else make_stock_time_buckets
     time_buckets = bucket_func(dt)
 
+    # Frames are kept stratified, only the bucket this bar lands in is recomputed.
     for tf, bucket in time_buckets.items():
         tf_df = dfs[tf]
-        if bucket not in tf_df.index:
-            new_bar_df = pd.DataFrame(bar.as_dict, index=pd.Index([bucket], name='time'))
-            del new_bar_df['ts']
-            del new_bar_df['sid']
-            tf_df = pd.concat([tf_df, new_bar_df]).drop_duplicates(keep='first')
+        if not tf_df.empty and bucket in tf_df.index:
+            current = tf_df.loc[bucket]
+            row = {
+                'open': current.open,
+                'high': max(current.high, bar.h),
+                'low': min(current.low, bar.l),
+                'close': bar.c,
+                'volume': current.volume + bar.v,
+            }
         else:
-            tf_df.loc[bucket, 'h'] = max(tf_df.loc[bucket, 'h'], bar.h)
-            tf_df.loc[bucket, 'l'] = min(tf_df.loc[bucket, 'l'], bar.l)
-            tf_df.loc[bucket, 'c'] = bar.c
-            tf_df.loc[bucket, 'v'] += bar.v
-        dfs[tf] = tf_df.tail(10_000)
+            row = {'open': bar.o, 'high': bar.h, 'low': bar.l, 'close': bar.c, 'volume': bar.v}
+        tail = pd.DataFrame(row, index=pd.Index([bucket], name='time'))
+        dfs[tf] = stratify_tail(tf_df, tail).tail(10_000)
         # data.ts = dt
 
-    pipe = r.pipeline()
+    pipe = r.pipeline(transaction=False)
     for tf_, df in dfs.items():
-        serialized_df = pickle.dumps(df)
-        pipe.set(f'df:{symbol_type}:{symbol}:{tf_}', serialized_df)
+        pipe.set(f'df:{symbol_type}:{symbol}:{tf_}', dumps_df(df))
     pipe.execute()
 
     return dfs, bar
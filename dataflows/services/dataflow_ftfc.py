@@ -1,4 +1,4 @@
-import copy
+import logging
 import os
 from datetime import datetime, timezone
 from decimal import Decimal
@@ -15,13 +15,13 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.prod")
 import django
 django.setup()
 from django.conf import settings
-from stratbot.scanner.models.symbols import SymbolRec
 
 from dataflows.alerts import DiscordMsgAlert
 from dataflows.bars import to_bar_series_by_tf, opening_prices, potential_outside_bar
 from dataflows.serializers import deserialize
-from dataflows.setups import find_initial_target, create_setups_from_bar_series
+from dataflows.setups import find_initial_target, create_setups_from_bar_series, snapshot_setups
 from dataflows.sinks.null import NullSink
+from dataflows.symbols import SymbolRegistry
 
 
 kafka_conf = {
@@ -41,9 +41,9 @@ kafka_source = KafkaSource(
 )
 
 
-symbols = SymbolRec.objects.filter(skip_discord_alerts=False).values_list('symbol', 'symbol_type')
-symbol_type_map = {symbol: symbol_type for symbol, symbol_type in symbols}
-allowed_symbols = symbol_type_map.keys()
+log = logging.getLogger(__name__)
+
+symbol_registry = SymbolRegistry(skip_discord_alerts=False).start()
 
 
 def filter_ftfc(symbol__tf_bar_series):
@@ -75,10 +75,12 @@ def scan_setups(historical_setups, tf_bar_series__setup):
     if historical_setups.get(tf) is None or historical_setups[tf].timestamp < setup.timestamp:
         historical_setups[tf] = setup
 
+    checked_setups = {}
     for tf, setup in historical_setups.items():
         bar_series = tf_bar_series[tf]
         if bar_series is None or setup is None:
             continue
+        checked_setups[tf] = setup
         current_bar = bar_series.get_newest()
 
         setup.check_in_force(current_bar)
@@ -94,17 +96,20 @@ def scan_setups(historical_setups, tf_bar_series__setup):
             if not setup.in_force_alerted and tf not in ['15', '30']:
                 print(f'{datetime.now()}: {setup.bull_or_bear}: {setup.symbol} [{tf}] {setup.pattern} {current_bar.sid}')
 
-                symbolrec = SymbolRec.objects.get(symbol=setup.symbol)
-                alert = DiscordMsgAlert(symbolrec, setup)
-                if setup.trigger_bar.sid == '3':
-                    channel = f'{symbolrec.symbol_type}-expando'
+                symbol_info = symbol_registry.get(setup.symbol)
+                if symbol_info is None:
+                    log.info(f'{setup.symbol} is no longer in the symbol registry, skipping alert')
                 else:
-                    channel = f'{symbolrec.symbol_type}-ftfc'
-                alert.send_msg(channel=channel)
-                setup.in_force_alerted = True
+                    alert = DiscordMsgAlert(symbol_info, setup, price=current_bar.c)
+                    if setup.trigger_bar.sid == '3':
+                        channel = f'{symbol_info.symbol_type}-expando'
+                    else:
+                        channel = f'{symbol_info.symbol_type}-ftfc'
+                    alert.send_msg(channel=channel)
+                    setup.in_force_alerted = True
             setup.in_force_last_alerted = datetime.now(tz=timezone.utc)
 
-    return historical_setups, copy.deepcopy(historical_setups)
+    return historical_setups, snapshot_setups(checked_setups)
 
 
 flow = Dataflow("dataflow_ftfc")
@@ -112,7 +117,7 @@ flow = Dataflow("dataflow_ftfc")
 bar_stream = (
     op.input('kafka_source', flow, kafka_source)
     .then(op.map, 'deserialize', deserialize)
-    .then(op.filter, 'filter_symbols', lambda data: data[0] in allowed_symbols)
+    .then(op.filter, 'filter_symbols', lambda data: data[0] in symbol_registry)
     .then(op.map, 'to_bar_series_by_tf', to_bar_series_by_tf)
     .then(op.filter, 'filter_ftfc', filter_ftfc)
 )
@@ -1,4 +1,4 @@
-import copy
+import logging
 import os
 from datetime import datetime
 from decimal import Decimal
@@ -16,12 +16,12 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.prod")
 import django
 django.setup()
 from django.conf import settings
-from stratbot.scanner.models.symbols import SymbolRec
 
 from dataflows.alerts import DiscordMsgAlert
 from dataflows.setups import SetupMsg, build_setup
 from dataflows.serializers import deserialize, serialize
 from dataflows.bars import to_bar_series_by_tf, add_key_to_value, opening_prices
+from dataflows.symbols import SymbolRegistry
 
 
 kafka_conf = {
@@ -57,7 +57,9 @@ bar_source = KafkaSource(
 # )
 
 
-allowed_symbols = SymbolRec.objects.filter(symbol_type='stock').values_list('symbol', flat=True)
+log = logging.getLogger(__name__)
+
+symbol_registry = SymbolRegistry(symbol_type='stock').start()
 
 
 def filter_tfc(symbol__tf_bar_series):
@@ -136,32 +138,38 @@ def send_alerts(historical_alerts, symbol_setups):
     if historical_alerts is None:
         historical_alerts = {}
 
-    # if symbol not in allowed_symbols:
+    # if symbol not in symbol_registry:
     #     return historical_alerts, copy.deepcopy(historical_alerts)
 
     # if spread['spread_percentage'] > 0.10:
     #     print(f'spread: {spread["spread_percentage"]}')
     #     return historical_alerts, copy.deepcopy(historical_alerts)
 
+    # alert timestamps are immutable, emit just the ones sent for this bar
+    sent_alerts = {}
     for tf, setup in setups.items():
         ts = setup.timestamp
         if historical_alerts.get(tf) is None or ts > historical_alerts[tf]:
             direction_msg = 'BULL' if setup.direction == 1 else 'BEAR' if setup.direction == -1 else 'NEUTRAL'
             print(datetime.now(), f'actionable: [yellow]{setup.symbol}[/yellow] [[white]{tf}[/white]] - {direction_msg}')
 
-            symbolrec = SymbolRec.objects.get(symbol=setup.symbol)
-            alert = DiscordMsgAlert(symbolrec, setup)
+            symbol_info = symbol_registry.get(setup.symbol)
+            if symbol_info is None:
+                log.info(f'{setup.symbol} is no longer in the symbol registry, skipping alert')
+                continue
+            alert = DiscordMsgAlert(symbol_info, setup)
             alert.send_msg(channel='gappers')
 
             historical_alerts[tf] = ts
-    return historical_alerts, copy.deepcopy(historical_alerts)
+            sent_alerts[tf] = ts
+    return historical_alerts, sent_alerts
 
 
 flow = Dataflow("gappers")
 bar_stream = (
     op.input('bar_source', flow, bar_source)
     .then(op.map, 'deserialize_bars', deserialize)
-    .then(op.filter, 'filter_symbols', lambda data: data[0] in allowed_symbols)
+    .then(op.filter, 'filter_symbols', lambda data: data[0] in symbol_registry)
     .then(op.map, 'to_bar_series_by_tf', to_bar_series_by_tf)
     .then(op.filter, 'filter_tfc', filter_tfc)
     .then(op.filter_map, 'is_gapper', is_gapper)
@@ -171,7 +179,7 @@ bar_stream = (
 # spread_stream = (
 #     op.input('spread_source', flow, spread_source)
 #     .then(op.map, 'deserialize_spreads', deserialize)
-#     .then(op.filter, 'filter_spread_symbols', lambda data: data[0] in allowed_symbols)
+#     .then(op.filter, 'filter_spread_symbols', lambda data: data[0] in symbol_registry)
 # )
 
 # s_joined = op.join('join', bar_stream, spread_stream)
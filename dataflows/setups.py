@@ -1,4 +1,3 @@
-import copy
 from datetime import datetime, timezone
 from decimal import Decimal
 
@@ -152,7 +151,7 @@ class SetupMsg(msgspec.Struct):
     trigger: Decimal | None = None
     trigger_count: int = 0
     target: Decimal | None = None
-    # targets: list[Decimal] | None = None
+    targets: list[float] | None = None
     potential_outside: bool = False
     in_force: bool = False
     in_force_alerted: bool = False
@@ -253,6 +252,17 @@ class SetupMsg(msgspec.Struct):
 
 
 
+def snapshot_setups(setups: dict[str, SetupMsg | None]) -> dict[str, SetupMsg | None]:
+    """
+    Copies of `setups` to emit from a `stateful_map` step instead of a `copy.deepcopy`.
+
+    A shallow `msgspec.structs.replace` is enough as long as setups are only updated by
+    assigning fields: their bars are never modified once built and containers such as
+    `pattern` and `negated_reasons` are replaced, not mutated in place.
+    """
+    return {tf: None if setup is None else msgspec.structs.replace(setup) for tf, setup in setups.items()}
+
+
 def bar_tuple(bar: Bar) -> tuple:
     return bar.sid, bar_shape(bar), bar.green, bar.red
 
@@ -376,7 +386,7 @@ def create_setups_from_bar_series(setups, tf_bar_series):
             setups[tf] = build_setup(bar_series.symbol, bar_series)
         else:
             setups[tf].current_bar = bar_series.get_newest()
-    return setups, copy.deepcopy(setups)
+    return setups, snapshot_setups(setups)
 
 
 def find_targets(setup, bar_series):
@@ -1,35 +1,182 @@
-import redis
+from dataclasses import dataclass
+from time import perf_counter
 
+import orjson
+import redis
 from bytewax.outputs import StatelessSinkPartition, DynamicSink
-import msgspec
-from orjson import orjson
+
+
+@dataclass
+class RedisSinkStatistics:
+    batches: int = 0
+    items: int = 0
+    keys_written: int = 0
+    commands: int = 0
+    bytes_written: int = 0
+    errors: int = 0
+    resyncs: int = 0
+    batch_seconds: float = 0.0
+    last_batch_seconds: float = 0.0
+
+    def __str__(self):
+        avg_ms = self.batch_seconds / self.batches * 1000 if self.batches else 0.0
+        return (
+            f'batches: {self.batches:,}  items: {self.items:,}  keys: {self.keys_written:,}  '
+            f'commands: {self.commands:,}  bytes: {self.bytes_written:,}  errors: {self.errors:,}  '
+            f'resyncs: {self.resyncs:,}  '
+            f'batch avg: {avg_ms:.2f} ms  last: {self.last_batch_seconds * 1000:.2f} ms'
+        )
 
 
 class RedisSinkPartition(StatelessSinkPartition):
     """
     Output partition that writes to a Redis instance.
+
+    Items are `(key, value)` and each value is stored as a RedisJSON document. Only the
+    last value of a key in a batch is written, in one non-transactional pipeline.
+
+    With `bar_history`, values are `{tf: [bar, ...]}` bar histories (oldest bar first)
+    and the partition remembers what it last wrote for each key. A timeframe whose newest
+    bar changed is written as `$["{tf}"][-1]`, a new bar is appended to `$["{tf}"]`
+    (popping the oldest when the length stays the same), an unchanged timeframe is
+    skipped and anything else replaces the timeframe's array. Other writers replace
+    these documents too (`scanner.tasks.refresh_candles_to_redis`), so the same pipeline
+    first reads the length and newest `ts` of every timeframe updated in place, and a
+    key whose array isn't the one last written here is rewritten whole. Keys not written
+    by this partition yet, not written whole for `full_write_every` seconds, or whose
+    path updates fail, get the whole document.
     """
-    def __init__(self, client: redis.Redis, key_prefix: str = ''):
+    def __init__(
+        self,
+        client: redis.Redis,
+        key_prefix: str = '',
+        bar_history: bool = False,
+        log_every: float = 60.0,
+        full_write_every: float = 300.0,
+    ):
         self.client = client
         self.key_prefix = f'{key_prefix}' if key_prefix else ''
+        self.bar_history = bar_history
+        self.log_every = log_every
+        self.full_write_every = full_write_every
+        self.stats = RedisSinkStatistics()
+        self._last_log_time = perf_counter()
+        # key -> {tf: [encoded bar, ...]} as last written
+        self._written: dict[str, dict[str, list[bytes]]] = {}
+        # key -> when the whole document was last written
+        self._full_written_at: dict[str, float] = {}
 
     def write_batch(self, batch: list) -> None:
         """
         Write a batch of output items to Redis. Called multiple times whenever new items are seen at this
         point in the dataflow. Non-deterministically batched.
         """
-        with self.client.pipeline() as pipe:
-            for key, value in batch:
-                pipe.json().set(f'{self.key_prefix}{key}', '$', value)
-            pipe.execute()
+        s = perf_counter()
+        latest = {}
+        for key, value in batch:
+            latest[f'{self.key_prefix}{key}'] = value
+
+        with self.client.pipeline(transaction=False) as pipe:
+            checks, commands = [], []
+            for key, value in latest.items():
+                if self.bar_history:
+                    key_checks, key_commands = self._bar_history_commands(key, value, now=s)
+                    checks.extend(key_checks)
+                    commands.extend(key_commands)
+                else:
+                    commands.append(self._set_document(key, value))
+            for _, _, *args in checks:
+                pipe.execute_command(*args)
+            for _, *args in commands:
+                pipe.execute_command(*args)
+            results = pipe.execute(raise_on_error=False) if commands else []
+            check_results, results = results[:len(checks)], results[len(checks):]
+
+            failed = {key for (key, *_), result in zip(commands, results) if isinstance(result, Exception)}
+            self.stats.errors += len(failed)
+            stale = {
+                key for (key, expected, *_), result in zip(checks, check_results)
+                if key not in failed and not _check_matches(result, expected)
+            }
+            self.stats.resyncs += len(stale)
+            if failed or stale:
+                retries = [self._set_document(key, latest[key], now=s) for key in failed | stale]
+                for _, *args in retries:
+                    pipe.execute_command(*args)
+                pipe.execute()
+                commands.extend(retries)
+
+        elapsed = perf_counter() - s
+        stats = self.stats
+        stats.batches += 1
+        stats.items += len(batch)
+        stats.keys_written += len({key for key, *_ in commands})
+        stats.commands += len(commands)
+        stats.bytes_written += sum(len(arg) for _, *args in commands for arg in args if isinstance(arg, bytes))
+        stats.batch_seconds += elapsed
+        stats.last_batch_seconds = elapsed
+        if self.log_every and s - self._last_log_time >= self.log_every:
+            print(f'redis sink [{self.key_prefix}] {stats}')
+            self._last_log_time = s
+
+    def _set_document(self, key: str, value, now: float = 0.0) -> tuple:
+        if not self.bar_history:
+            return key, 'JSON.SET', key, '$', orjson.dumps(value)
+        encoded = {tf: [orjson.dumps(bar) for bar in bars] for tf, bars in value.items()}
+        self._written[key] = encoded
+        self._full_written_at[key] = now
+        document = b'{' + b','.join(
+            orjson.dumps(tf) + b':[' + b','.join(bars) + b']' for tf, bars in encoded.items()
+        ) + b'}'
+        return key, 'JSON.SET', key, '$', document
+
+    def _bar_history_commands(self, key: str, tf_bars: dict, now: float) -> tuple[list[tuple], list[tuple]]:
+        """
+        The checks, `(key, expected result, *command)`, and the commands that bring
+        `key` from what this partition last wrote to `tf_bars`.
+        """
+        written = self._written.get(key)
+        if written is None or now - self._full_written_at.get(key, now) >= self.full_write_every:
+            return [], [self._set_document(key, tf_bars, now=now)]
+
+        checks, commands = [], []
+        for tf, bars in tf_bars.items():
+            new = [orjson.dumps(bar) for bar in bars]
+            old = written.get(tf)
+            path = f'$["{tf}"]'
+            if new == old:
+                continue
+            if old and new and len(new) == len(old) and new[:-1] == old[:-1]:
+                commands.append((key, 'JSON.SET', key, f'{path}[-1]', new[-1]))
+            elif old and new and len(new) in (len(old), len(old) + 1) and new[:-1] == old[len(old) - len(new) + 1:]:
+                commands.append((key, 'JSON.ARRAPPEND', key, path, new[-1]))
+                if len(new) == len(old):
+                    commands.append((key, 'JSON.ARRPOP', key, path, 0))
+            else:
+                commands.append((key, 'JSON.SET', key, path, b'[' + b','.join(new) + b']'))
+                written[tf] = new
+                continue
+            checks.append((key, [len(old)], 'JSON.ARRLEN', key, path))
+            checks.append((key, [orjson.loads(old[-1]).get('ts')], 'JSON.GET', key, f'{path}[-1].ts'))
+            written[tf] = new
+        return checks, commands
 
     def close(self) -> None:
         """
         Cleanup this partition when the dataflow completes. This is not guaranteed to be called on unbounded data.
         """
+        print(f'redis sink [{self.key_prefix}] {self.stats}')
         self.client.close()
 
 
+def _check_matches(result, expected: list) -> bool:
+    if isinstance(result, Exception):
+        return False
+    if isinstance(result, (bytes, str)):
+        result = orjson.loads(result)
+    return result == expected
+
+
 class RedisSink(DynamicSink):
     """
     An output sink where all workers write items to a Redis instance concurrently.
@@ -37,12 +184,13 @@ class RedisSink(DynamicSink):
     Does not support storing any resume state. Thus, these kind of
     outputs only naively can support at-least-once processing.
     """
-    def __init__(self, client: redis.client.Redis, key_prefix: str = ''):
+    def __init__(self, client: redis.client.Redis, key_prefix: str = '', bar_history: bool = False):
         self.client = client
         self.key_prefix = key_prefix
+        self.bar_history = bar_history
 
     def build(self, step_id: str, worker_index: int, worker_count: int) -> RedisSinkPartition:
         """
         Build an output partition for a worker. Will be called once on each worker.
         """
-        return RedisSinkPartition(self.client, self.key_prefix)
+        return RedisSinkPartition(self.client, self.key_prefix, self.bar_history)
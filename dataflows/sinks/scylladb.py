@@ -1,7 +1,57 @@
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from time import perf_counter
 
 from bytewax.outputs import StatelessSinkPartition, DynamicSink
-from cassandra.cluster import Cluster
+from cassandra.cluster import Cluster, Session
+from cassandra.concurrent import execute_concurrent, execute_concurrent_with_args
+from cassandra.query import BatchStatement, BatchType
+
+
+INSERT_CQL = 'INSERT INTO ohlcv (symbol, tf, timestamp, o, h, l, c, v, sid) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+
+
+@dataclass
+class ScyllaDBSinkStatistics:
+    batches: int = 0
+    items: int = 0
+    rows: int = 0
+    requests: int = 0
+    errors: int = 0
+    batch_seconds: float = 0.0
+    last_batch_seconds: float = 0.0
+
+    def __str__(self):
+        avg_ms = self.batch_seconds / self.batches * 1000 if self.batches else 0.0
+        return (
+            f'batches: {self.batches:,}  items: {self.items:,}  rows: {self.rows:,}  '
+            f'requests: {self.requests:,}  errors: {self.errors:,}  '
+            f'batch avg: {avg_ms:.2f} ms  last: {self.last_batch_seconds * 1000:.2f} ms'
+        )
+
+
+def ohlcv_rows(items: list) -> list[tuple]:
+    """
+    The newest bar of every timeframe in `(symbol, {tf: [bar, ...]})` items, as
+    `ohlcv` rows. Only the last row for a `(symbol, tf, timestamp)` is kept.
+    """
+    rows = {}
+    for symbol, values in items:
+        for tf, item_list in values.items():
+            item = item_list[-1]  # Get the last item for each timeframe
+            ts = datetime.fromtimestamp(item['ts'], tz=timezone.utc)
+            rows[(symbol, tf, ts)] = (
+                symbol,
+                tf,
+                ts,
+                item['o'],
+                item['h'],
+                item['l'],
+                item['c'],
+                item['v'],
+                item['sid'],
+            )
+    return list(rows.values())
 
 
 class ScyllaDBSinkPartition(StatelessSinkPartition):
@@ -18,44 +68,108 @@ class ScyllaDBSinkPartition(StatelessSinkPartition):
     sid TEXT,
     PRIMARY KEY ((symbol), tf, timestamp)
     ) WITH CLUSTERING ORDER BY (tf ASC, timestamp ASC);
+
+    Rows are written with a prepared statement, at most `concurrency` requests in flight.
+    By default every row is its own request (`execute_concurrent_with_args`). With
+    `batch_by_symbol`, each symbol's rows go in unlogged batches of up to `max_batch_rows`,
+    a single partition per batch so the coordinator doesn't fan it out. `write_batch`
+    returns once every request has completed, which holds back the dataflow while Scylla
+    is behind.
     """
-    def __init__(self):
-        cluster = Cluster(['localhost'])
-        self._session = cluster.connect('crypto')
+    def __init__(
+        self,
+        session: Session,
+        concurrency: int = 64,
+        batch_by_symbol: bool = False,
+        max_batch_rows: int = 50,
+        log_every: float = 60.0,
+    ):
+        self._session = session
+        self._insert = session.prepare(INSERT_CQL)
+        self.concurrency = concurrency
+        self.batch_by_symbol = batch_by_symbol
+        self.max_batch_rows = max_batch_rows
+        self.log_every = log_every
+        self.stats = ScyllaDBSinkStatistics()
+        self._last_log_time = perf_counter()
 
     def write_batch(self, items: list) -> None:
-        # CQL statement for inserting data, with upsert logic
-        insert_cql = """
-        INSERT INTO ohlcv (symbol, tf, timestamp, o, h, l, c, v, sid) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        # insert_cql = """
-        # INSERT INTO ohlcv (symbol, tf, timestamp) VALUES (%s, %s, %s)
-        # """
-
-        data = []
-        for symbol, values in items:
-            for tf, item_list in values.items():
-                item = item_list[-1]  # Get the last item for each timeframe
-                ts = datetime.fromtimestamp(item['ts'], tz=timezone.utc)
-                data.append((
-                    symbol,
-                    tf,
-                    ts,
-                    item['o'],
-                    item['h'],
-                    item['l'],
-                    item['c'],
-                    item['v'],
-                    item['sid']
-                ))
-
-        try:
-            for row in data:
-                self._session.execute(insert_cql, row)
-        except Exception as e:
-            print("error while inserting data", e)
+        s = perf_counter()
+        rows = ohlcv_rows(items)
+        if self.batch_by_symbol:
+            statements = self._symbol_batches(rows)
+            results = execute_concurrent(
+                self._session, statements, concurrency=self.concurrency, raise_on_first_error=False,
+            )
+        else:
+            statements = rows
+            results = execute_concurrent_with_args(
+                self._session, self._insert, rows, concurrency=self.concurrency, raise_on_first_error=False,
+            )
+
+        errors = [result for success, result in results if not success]
+        if errors:
+            print(f'error while inserting data: {len(errors)} of {len(statements)} requests failed', errors[0])
+
+        elapsed = perf_counter() - s
+        stats = self.stats
+        stats.batches += 1
+        stats.items += len(items)
+        stats.rows += len(rows)
+        stats.requests += len(statements)
+        stats.errors += len(errors)
+        stats.batch_seconds += elapsed
+        stats.last_batch_seconds = elapsed
+        if self.log_every and s - self._last_log_time >= self.log_every:
+            print(f'scylladb sink {stats}')
+            self._last_log_time = s
+
+    def _symbol_batches(self, rows: list[tuple]) -> list[tuple[BatchStatement, None]]:
+        by_symbol = {}
+        for row in rows:
+            by_symbol.setdefault(row[0], []).append(row)
+
+        statements = []
+        for symbol_rows in by_symbol.values():
+            for i in range(0, len(symbol_rows), self.max_batch_rows):
+                batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+                for row in symbol_rows[i:i + self.max_batch_rows]:
+                    batch.add(self._insert, row)
+                statements.append((batch, None))
+        return statements
+
+    def close(self) -> None:
+        print(f'scylladb sink {self.stats}')
 
 
 class ScyllaDBSink(DynamicSink):
-    def build(self, worker_index, worker_count) -> ScyllaDBSinkPartition:
-        return ScyllaDBSinkPartition()
+    """
+    Writes the newest bar of each timeframe to `ohlcv`. All partitions in a process share
+    one session (sessions are thread safe and pool their own connections), connected on
+    the first `build` unless one is passed in, e.g. a fake for testing.
+    """
+    def __init__(
+        self,
+        contact_points: tuple[str, ...] = ('localhost',),
+        keyspace: str = 'crypto',
+        session: Session | None = None,
+        concurrency: int = 64,
+        batch_by_symbol: bool = False,
+        max_batch_rows: int = 50,
+    ):
+        self.contact_points = contact_points
+        self.keyspace = keyspace
+        self.session = session
+        self.concurrency = concurrency
+        self.batch_by_symbol = batch_by_symbol
+        self.max_batch_rows = max_batch_rows
+
+    def build(self, step_id: str, worker_index: int, worker_count: int) -> ScyllaDBSinkPartition:
+        if self.session is None:
+            self.session = Cluster(list(self.contact_points)).connect(self.keyspace)
+        return ScyllaDBSinkPartition(
+            self.session,
+            concurrency=self.concurrency,
+            batch_by_symbol=self.batch_by_symbol,
+            max_batch_rows=self.max_batch_rows,
+        )
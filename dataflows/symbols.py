@@ -0,0 +1,118 @@
+"""
+Process-local symbol registry for the streaming operators.
+
+Dataflow steps check every message against the allowed symbols and need a symbol's
+metadata for every alert. `SymbolRegistry` loads the symbols once with a single query
+and serves both from memory. Only static metadata is kept, prices come from the bar
+stream. A background thread then reloads them every
+`refresh_interval` seconds, so no ORM round trip happens inside stream processing.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Iterable, Optional
+
+from django.db import connection
+
+from stratbot.scanner.models.symbols import SymbolRec, SymbolType
+
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class SymbolInfo:
+    symbol: str
+    symbol_type: str
+    is_index: bool
+    is_sector: bool
+    display_timeframes: tuple[str, ...]
+    tfc_timeframes: tuple[str, ...]
+
+    @property
+    def is_crypto(self) -> bool:
+        return self.symbol_type == SymbolType.CRYPTO
+
+    def tfc_state(self, timeframes: Optional[Iterable[str]] = None, price: Optional[float] = None) -> dict:
+        """
+        `SymbolRec.tfc_state` at `price`, the opening prices are read from the bar
+        history rather than the row.
+        """
+        symbolrec = SymbolRec(symbol=self.symbol, symbol_type=self.symbol_type, price=price)
+        return symbolrec.tfc_state(list(timeframes or self.tfc_timeframes))
+
+    @classmethod
+    def from_symbolrec(cls, symbolrec: SymbolRec) -> SymbolInfo:
+        return cls(
+            symbol=symbolrec.symbol,
+            symbol_type=symbolrec.symbol_type,
+            is_index=symbolrec.is_index,
+            is_sector=symbolrec.is_sector,
+            display_timeframes=tuple(symbolrec.display_timeframes),
+            tfc_timeframes=tuple(symbolrec.tfc_timeframes),
+        )
+
+
+class SymbolRegistry:
+    """
+    The `SymbolRec`s matching `filters` (e.g. `skip_discord_alerts=False`), as a frozen
+    set of symbols for membership checks and `SymbolInfo` metadata for building alerts.
+    A refresh builds new collections and swaps them in, so readers never see a partly
+    loaded registry.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, **filters):
+        self.refresh_interval = refresh_interval
+        self.filters = filters
+        self.symbols: frozenset[str] = frozenset()
+        self.info: dict[str, SymbolInfo] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.symbols
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def get(self, symbol: str) -> Optional[SymbolInfo]:
+        return self.info.get(symbol)
+
+    def refresh(self) -> None:
+        s = perf_counter()
+        info = {
+            symbolrec.symbol: SymbolInfo.from_symbolrec(symbolrec)
+            for symbolrec in SymbolRec.objects.filter(**self.filters)
+        }
+        self.info, self.symbols = info, frozenset(info)
+        log.info(f'symbol registry {self.filters}: {len(info)} symbols loaded in {perf_counter() - s:.2f}s')
+
+    def start(self) -> SymbolRegistry:
+        """
+        Load the registry, then keep refreshing it on a daemon thread.
+        """
+        self.refresh()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='symbol-registry', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                log.exception('symbol registry refresh failed, keeping the previous symbols')
+            finally:
+                # The thread's own connection, don't hold it open between refreshes.
+                connection.close()
@@ -0,0 +1,154 @@
+"""
+Magnitude ladders: the unbroken prior highs and lows of a symbol and timeframe.
+
+Walking back from the newest closed bar, a prior high is a target if it is above every
+high after it, i.e. it has not been taken out since. Those highs form a monotonic stack
+(oldest and highest at the bottom), and pushing a newly closed bar pops every level at or
+below its high. The additional targets above a trigger's first target are then the
+levels of the stack above it, nearest first, found with a bisect instead of scanning the
+timeframe's price records. Lows are the mirror image.
+"""
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Callable, Iterable, Optional
+
+from dataflows.bars import Bar, BarSeries
+
+
+log = logging.getLogger(__name__)
+
+
+class MagnitudeLadder:
+    __slots__ = ('symbol', 'tf', 'highs', 'lows', 'last_ts')
+
+    def __init__(self, symbol: str, tf: str):
+        self.symbol = symbol
+        self.tf = tf
+        # strictly decreasing / increasing from the oldest level to the newest
+        self.highs: list[float] = []
+        self.lows: list[float] = []
+        self.last_ts: float = float('-inf')
+
+    def __str__(self):
+        return f'[{self.symbol}] [{self.tf}] {len(self.highs)} highs / {len(self.lows)} lows'
+
+    def push(self, ts: float, high: float, low: float) -> None:
+        """
+        Add a closed bar. Bars at or before the newest one already pushed are ignored.
+        """
+        if ts <= self.last_ts:
+            return
+        highs, lows = self.highs, self.lows
+        while highs and highs[-1] <= high:
+            highs.pop()
+        highs.append(high)
+        while lows and lows[-1] >= low:
+            lows.pop()
+        lows.append(low)
+        self.last_ts = ts
+
+    def extend(self, rows: Iterable[tuple[float, float, float]]) -> None:
+        """
+        Push `(ts, high, low)` rows, oldest first.
+        """
+        for ts, high, low in rows:
+            self.push(ts, high, low)
+
+    def update(self, bar_series: BarSeries) -> None:
+        """
+        Push the closed bars of `bar_series` (all but the newest) not seen yet.
+        """
+        previous = bar_series.get_previous()
+        if previous is None or previous.ts <= self.last_ts:
+            return
+        newest = bar_series.get_newest()
+        for bar in bar_series.bars.values():
+            if bar is not newest and bar.ts > self.last_ts:
+                self.push(bar.ts, bar.h, bar.l)
+
+    def targets(self, target: float, direction: int, limit: int = 5) -> list[float]:
+        """
+        Up to `limit` unbroken levels beyond `target` in `direction`, nearest first.
+        """
+        if direction == 1:
+            # highs above target are a prefix of the (decreasing) stack
+            end = bisect_left(self.highs, -target, key=lambda high: -high)
+            return self.highs[max(0, end - limit):end][::-1]
+        end = bisect_left(self.lows, target)
+        return self.lows[max(0, end - limit):end][::-1]
+
+
+class MagnitudeLadders:
+    """
+    The ladder of every symbol and timeframe seen by a worker. A ladder is built from its
+    price record history with `load_history(symbol, tf, before)` the first time it is
+    asked for, then kept current from the bar series passed to `get` and `update`. Every
+    bar of a symbol should go through `update`, a bar closing while a built ladder is not
+    updated would otherwise be missed once it falls out of the series. `load_history`
+    returns None when it can't read a symbol's history, nothing is cached then.
+    """
+
+    def __init__(
+        self,
+        load_history: Callable[[str, str, float], Optional[Iterable[tuple[float, float, float]]]],
+    ):
+        self.load_history = load_history
+        self._ladders: dict[tuple[str, str], MagnitudeLadder] = {}
+
+    def __len__(self) -> int:
+        return len(self._ladders)
+
+    def update(self, tf_bar_series: dict[str, BarSeries]) -> None:
+        ladders = self._ladders
+        for tf, bar_series in tf_bar_series.items():
+            ladder = ladders.get((bar_series.symbol, tf))
+            if ladder is not None:
+                ladder.update(bar_series)
+
+    def get(self, bar_series: BarSeries) -> Optional[MagnitudeLadder]:
+        key = (bar_series.symbol, bar_series.tf)
+        ladder = self._ladders.get(key)
+        if ladder is None:
+            ladder = self._build(bar_series)
+            if ladder is None:
+                return None
+            self._ladders[key] = ladder
+        ladder.update(bar_series)
+        return ladder
+
+    def _build(self, bar_series: BarSeries) -> Optional[MagnitudeLadder]:
+        s = perf_counter()
+        oldest: Optional[Bar] = next(iter(bar_series.bars.values()), None)
+        before = oldest.ts if oldest is not None else float('inf')
+        history = self.load_history(bar_series.symbol, bar_series.tf, before)
+        if history is None:
+            return None
+        ladder = MagnitudeLadder(bar_series.symbol, bar_series.tf)
+        ladder.extend(history)
+        log.info(f'built magnitude ladder {ladder} in {(perf_counter() - s) * 1000:.2f} ms')
+        return ladder
+
+
+def pricerec_history_loader(model_map: Callable[[str], Optional[dict]]) -> Callable:
+    """
+    `load_history` for `MagnitudeLadders` reading a symbol's price record materialized
+    view, `model_map(symbol)` being its `*_TF_PRICEREC_MODEL_MAP`, or None for a symbol
+    it doesn't know. Only buckets before the oldest bar of the live series are read, the
+    series supplies the rest.
+    """
+    def load_history(symbol: str, tf: str, before: float):
+        models = model_map(symbol)
+        if models is None:
+            log.info(f'[{symbol}] [{tf}] no price records to build a magnitude ladder from')
+            return None
+        model = models[tf]
+        queryset = model.objects.filter(symbol=symbol)
+        if before != float('inf'):
+            queryset = queryset.filter(bucket__lt=datetime.fromtimestamp(before, tz=timezone.utc))
+        rows = queryset.order_by('bucket').values_list('bucket', 'high', 'low')
+        return ((bucket.timestamp(), high, low) for bucket, high, low in rows.iterator(chunk_size=10_000))
+    return load_history
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+from psycopg2.pool import PoolError
+
+from dataflows.sinks import postgresql
+from dataflows.sinks.postgresql import PostgresqlSink, PostgresqlSinkPartition, PsqlTradeSink
+
+
+class FakePool:
+    def __init__(self, connection=None, error=None):
+        self.connection = connection
+        self.error = error
+        self.returned = []
+
+    def getconn(self):
+        if self.error is not None:
+            raise self.error
+        return self.connection
+
+    def putconn(self, connection, close=False):
+        self.returned.append((connection, close))
+
+
+class RowsPartition(PostgresqlSinkPartition):
+    def write_rows(self, cursor, items: list) -> int:
+        cursor.execute('INSERT', items)
+        return len(items)
+
+
+def _partition(mocker, pool: FakePool) -> RowsPartition:
+    mocker.patch.object(postgresql, 'connection_pool', return_value=pool)
+    return RowsPartition('dsn', log_every=0)
+
+
+def test_writes_batch_and_returns_connection(mocker):
+    connection = MagicMock(closed=0)
+    pool = FakePool(connection)
+    sink = _partition(mocker, pool)
+
+    sink.write_batch([1, 2, 3])
+
+    connection.commit.assert_called_once()
+    assert pool.returned == [(connection, False)]
+    assert (sink.stats.rows, sink.stats.errors) == (3, 0)
+
+
+def test_discards_connection_closed_by_the_server(mocker):
+    connection = MagicMock(closed=0)
+
+    def lose_connection():
+        connection.closed = 2
+        raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+    connection.commit.side_effect = lose_connection
+    pool = FakePool(connection)
+    sink = _partition(mocker, pool)
+
+    sink.write_batch([1])
+
+    connection.rollback.assert_not_called()
+    assert pool.returned == [(connection, True)]
+    assert (sink.stats.rows, sink.stats.errors) == (0, 1)
+
+
+def test_failed_rollback_still_returns_connection(mocker):
+    connection = MagicMock(closed=0)
+    connection.commit.side_effect = psycopg2.DatabaseError('deadlock')
+    connection.rollback.side_effect = psycopg2.InterfaceError('connection already closed')
+    pool = FakePool(connection)
+    sink = _partition(mocker, pool)
+
+    sink.write_batch([1])
+
+    assert pool.returned == [(connection, False)]
+    assert sink.stats.errors == 1
+
+
+def test_exhausted_pool_counts_as_error(mocker):
+    pool = FakePool(error=PoolError('connection pool exhausted'))
+    sink = _partition(mocker, pool)
+
+    sink.write_batch([1])
+
+    assert pool.returned == []
+    assert (sink.stats.batches, sink.stats.errors) == (1, 1)
+
+
+def test_non_database_error_rolls_back_before_returning_connection(mocker):
+    connection = MagicMock(closed=0)
+    connection.cursor.return_value.__enter__.return_value.execute.side_effect = KeyError('p')
+    pool = FakePool(connection)
+    sink = _partition(mocker, pool)
+
+    with pytest.raises(KeyError):
+        sink.write_batch([1])
+
+    connection.commit.assert_not_called()
+    connection.rollback.assert_called_once()
+    assert pool.returned == [(connection, False)]
+
+
+def test_base_sink_and_partition_are_abstract(mocker):
+    mocker.patch.object(postgresql, 'connection_pool', return_value=FakePool())
+
+    with pytest.raises(TypeError):
+        PostgresqlSink()
+    with pytest.raises(TypeError):
+        PostgresqlSinkPartition('dsn')
+    partition = PsqlTradeSink('dsn').build('step', 0, 1)
+    assert isinstance(partition, postgresql.PsqlTradePartition)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import orjson
+
+from dataflows.sinks.redis import RedisSinkPartition
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    def execute(self, raise_on_error=True):
+        commands, self.commands = self.commands, []
+        self.client.commands.extend(command[0] for command in commands)
+        return [self.client.run(*command) for command in commands]
+
+
+class FakeRedis:
+    """
+    Just enough RedisJSON for `$["tf"]` bar arrays.
+    """
+    def __init__(self):
+        self.documents: dict[str, dict] = {}
+        self.commands: list[str] = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def run(self, command, key, path, *args):
+        if path == '$':
+            self.documents[key] = orjson.loads(args[0])
+            return b'OK'
+        tf = path[3:path.index('"]')]
+        bars = self.documents[key][tf]
+        if command == 'JSON.SET' and path.endswith('[-1]'):
+            bars[-1] = orjson.loads(args[0])
+        elif command == 'JSON.SET':
+            self.documents[key][tf] = orjson.loads(args[0])
+        elif command == 'JSON.ARRAPPEND':
+            bars.append(orjson.loads(args[0]))
+            return [len(bars)]
+        elif command == 'JSON.ARRPOP':
+            bars.pop(args[0])
+        elif command == 'JSON.ARRLEN':
+            return [len(bars)]
+        elif command == 'JSON.GET':
+            return orjson.dumps([bars[-1]['ts']] if bars else [])
+        return b'OK'
+
+
+def _bars(*closes: float, start: int = 0) -> list[dict]:
+    return [{'ts': start + i * 60, 'c': c} for i, c in enumerate(closes)]
+
+
+def _partition(**kwargs) -> RedisSinkPartition:
+    return RedisSinkPartition(FakeRedis(), 'barHistory:crypto:', bar_history=True, log_every=0, **kwargs)
+
+
+def test_updates_only_the_newest_bar():
+    sink = _partition()
+    sink.write_batch([('BTCUSDT', {'1': _bars(1, 2, 3)})])
+    sink.client.commands.clear()
+
+    sink.write_batch([('BTCUSDT', {'1': _bars(1, 2, 4)})])
+    sink.write_batch([('BTCUSDT', {'1': _bars(2, 4, 5, start=60)})])
+
+    assert sink.client.commands == [
+        'JSON.ARRLEN', 'JSON.GET', 'JSON.SET',
+        'JSON.ARRLEN', 'JSON.GET', 'JSON.ARRAPPEND', 'JSON.ARRPOP',
+    ]
+    assert sink.client.documents['barHistory:crypto:BTCUSDT'] == {'1': _bars(2, 4, 5, start=60)}
+    assert sink.stats.resyncs == 0
+
+
+def test_rewrites_the_array_when_it_shrinks():
+    sink = _partition()
+    sink.write_batch([('BTCUSDT', {'1': _bars(1, 2, 3)})])
+    sink.client.commands.clear()
+
+    sink.write_batch([('BTCUSDT', {'1': _bars(3, start=120)})])
+
+    assert sink.client.commands == ['JSON.SET']
+    assert sink.client.documents['barHistory:crypto:BTCUSDT'] == {'1': _bars(3, start=120)}
+
+
+def test_rewrites_the_document_after_another_writer():
+    sink = _partition()
+    sink.write_batch([('BTCUSDT', {'1': _bars(1, 2, 3)})])
+    # e.g. `refresh_candles_to_redis` replacing the document with a longer history
+    sink.client.documents['barHistory:crypto:BTCUSDT'] = {'1': _bars(7, 8, 9, 10, start=-60)}
+
+    sink.write_batch([('BTCUSDT', {'1': _bars(1, 2, 4)})])
+
+    assert sink.stats.resyncs == 1
+    assert sink.client.documents['barHistory:crypto:BTCUSDT'] == {'1': _bars(1, 2, 4)}
+
+
+def test_rewrites_the_document_periodically():
+    sink = _partition(full_write_every=0)
+    sink.write_batch([('BTCUSDT', {'1': _bars(1, 2, 3)})])
+    sink.client.commands.clear()
+
+    sink.write_batch([('BTCUSDT', {'1': _bars(1, 2, 4)})])
+
+    assert sink.client.commands == ['JSON.SET']
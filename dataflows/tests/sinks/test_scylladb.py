@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip('cassandra')
+
+from dataflows.sinks import scylladb  # noqa: E402
+from dataflows.sinks.scylladb import ScyllaDBSinkPartition, ohlcv_rows  # noqa: E402
+
+
+class FakeSession:
+    def __init__(self):
+        self.prepared = []
+
+    def prepare(self, query: str) -> str:
+        self.prepared.append(query)
+        return query
+
+
+class FakeBatch:
+    def __init__(self, batch_type=None):
+        self.batch_type = batch_type
+        self.rows = []
+
+    def add(self, statement, parameters=None):
+        self.rows.append(parameters)
+
+
+def _bar(ts: int, c: float) -> dict:
+    return {'ts': ts, 'o': 1.0, 'h': 2.0, 'l': 0.5, 'c': c, 'v': 10.0, 'sid': '2U'}
+
+
+def test_ohlcv_rows_keeps_the_newest_bar_once():
+    items = [
+        ('BTCUSDT', {'1': [_bar(0, 1.0), _bar(60, 1.5)], '5': [_bar(0, 1.5)]}),
+        ('BTCUSDT', {'1': [_bar(0, 1.0), _bar(60, 1.7)]}),
+        ('ETHUSDT', {'1': [_bar(60, 3.0)]}),
+    ]
+
+    rows = ohlcv_rows(items)
+
+    ts = datetime.fromtimestamp(60, tz=timezone.utc)
+    assert [(symbol, tf, timestamp, c) for symbol, tf, timestamp, _, _, _, c, _, _ in rows] == [
+        ('BTCUSDT', '1', ts, 1.7),
+        ('BTCUSDT', '5', datetime.fromtimestamp(0, tz=timezone.utc), 1.5),
+        ('ETHUSDT', '1', ts, 3.0),
+    ]
+
+
+def test_symbol_batches_are_chunked_per_symbol(mocker):
+    mocker.patch.object(scylladb, 'BatchStatement', FakeBatch)
+    execute_concurrent = mocker.patch.object(
+        scylladb, 'execute_concurrent', side_effect=lambda session, statements, **kwargs: [(True, None)] * 4
+    )
+    sink = ScyllaDBSinkPartition(FakeSession(), batch_by_symbol=True, max_batch_rows=2, log_every=0)
+    items = [
+        ('BTCUSDT', {tf: [_bar(0, 1.0)] for tf in ('1', '5', '15', '30', '60')}),
+        ('ETHUSDT', {'1': [_bar(0, 1.0)]}),
+    ]
+
+    sink.write_batch(items)
+
+    statements = execute_concurrent.call_args.args[1]
+    batches = [batch for batch, _ in statements]
+    assert [{row[0] for row in batch.rows} for batch in batches] == [{'BTCUSDT'}] * 3 + [{'ETHUSDT'}]
+    assert [len(batch.rows) for batch in batches] == [2, 2, 1, 1]
+    assert (sink.stats.rows, sink.stats.requests, sink.stats.errors) == (6, 4, 0)
+
+
+def test_failed_requests_are_counted(mocker):
+    mocker.patch.object(
+        scylladb,
+        'execute_concurrent_with_args',
+        side_effect=lambda session, statement, rows, **kwargs: [(True, None), (False, Exception('timeout'))],
+    )
+    sink = ScyllaDBSinkPartition(FakeSession(), log_every=0)
+
+    sink.write_batch([('BTCUSDT', {'1': [_bar(0, 1.0)], '5': [_bar(0, 1.0)]})])
+
+    assert (sink.stats.rows, sink.stats.requests, sink.stats.errors) == (2, 2, 1)
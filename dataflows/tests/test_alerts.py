@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from dataflows.alerts import DiscordMsgAlert
+from dataflows.bars import Bar
+from dataflows.setups import SetupMsg
+from dataflows.symbols import SymbolInfo
+from stratbot.scanner.models.symbols import SymbolRec
+
+
+def _setup(close: float) -> SetupMsg:
+    return SetupMsg(
+        symbol='BTCUSDT',
+        timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        tf='60',
+        pattern=['2D', '2U'],
+        trigger_bar=Bar(ts=0, o=100.0, h=101.0, l=99.0, c=100.5, v=1.0, sid='2U'),
+        target_bar=Bar(ts=0, o=99.0, h=102.0, l=98.0, c=101.0, v=1.0, sid='2D'),
+        current_bar=Bar(ts=3600, o=100.5, h=106.0, l=100.0, c=close, v=1.0, sid='2U'),
+        direction=1,
+    )
+
+
+def test_alert_uses_the_price_from_the_bar_stream(mocker):
+    mocker.patch.object(SymbolRec, 'opening_prices', return_value={'D': 104.0, '60': 100.5})
+    info = SymbolInfo(
+        symbol='BTCUSDT',
+        symbol_type='crypto',
+        is_index=False,
+        is_sector=False,
+        display_timeframes=('D', '60'),
+        tfc_timeframes=('D', '60'),
+    )
+
+    alert = DiscordMsgAlert(info, _setup(close=105.0))
+
+    assert alert.price == 105.0
+    assert 'LAST: 105.0' in alert._create_embed().fields[0]['value']
+    assert alert.timeframes_colored == 'D:green_circle: 60:green_circle:'
+    assert DiscordMsgAlert(info, _setup(close=105.0), price=103.0).timeframes_colored == (
+        'D:red_circle: 60:green_circle:'
+    )
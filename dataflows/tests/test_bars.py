@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from dataflows.bars import Bar, BarSeries, build_timeframe_aggregator, strat_id
+from dataflows.timeframe_ops import (
+    crypto_bucket_boundaries,
+    make_crypto_time_buckets,
+    make_stock_time_buckets,
+    stock_bucket_boundaries,
+)
+
+
+class DictBarSeries:
+    """
+    The dict-backed `BarSeries` the per-timeframe flows used.
+    """
+    MAXLEN = 5
+
+    def __init__(self):
+        self.bars: dict[float, Bar] = {}
+
+    def add_bar(self, bar):
+        if len(self.bars) >= self.MAXLEN:
+            self.bars.pop(min(self.bars))
+        self.bars[bar.ts] = bar
+
+    def get_newest(self):
+        return self.bars[max(self.bars)] if self.bars else None
+
+    def get_previous(self):
+        keys = sorted(self.bars)
+        return self.bars[keys[-2]] if len(keys) > 1 else None
+
+    def replace_newest(self, bar):
+        if self.bars:
+            self.bars.pop(max(self.bars))
+        self.bars[bar.ts] = bar
+
+    def as_dict(self):
+        return [bar.__dict__ for bar in self.bars.values()]
+
+
+def update_bar_series(bar_series: DictBarSeries, bucket_ts: float, bar: Bar) -> DictBarSeries:
+    """
+    The per-timeframe `stateful_map` mapper the flows used before
+    `build_timeframe_aggregator`, without the cache load and the deep copy.
+    """
+    current_bar = bar_series.get_newest()
+
+    if current_bar is None:
+        current_bar = Bar(ts=bucket_ts, o=bar.o, h=bar.h, l=bar.l, c=bar.c, v=bar.v)
+        bar_series.add_bar(current_bar)
+
+    if bar.ts < current_bar.ts:
+        return bar_series
+
+    if bucket_ts == current_bar.ts:
+        current_bar.h = max(bar.h, current_bar.h, float('-inf'))
+        current_bar.l = min(bar.l, current_bar.l, float('inf'))
+        current_bar.c = bar.c
+        current_bar.v = current_bar.v + bar.v
+
+        if previous_bar := bar_series.get_previous():
+            current_bar.sid = strat_id(previous_bar, current_bar)
+        bar_series.replace_newest(current_bar)
+    else:
+        current_bar = Bar(ts=bucket_ts, o=bar.o, h=bar.h, l=bar.l, c=bar.c, v=bar.v)
+        if previous_bar := bar_series.get_previous():
+            current_bar.sid = strat_id(previous_bar, current_bar)
+        bar_series.add_bar(current_bar)
+    return bar_series
+
+
+def _bar(ts: float, price: float = 10.0) -> Bar:
+    return Bar(ts=ts, o=price, h=price + 1, l=price - 1, c=price, v=1.0)
+
+
+def _ts(bar_series: BarSeries) -> list[float]:
+    return [bar.ts for bar in bar_series.bars.values()]
+
+
+def test_append_evicts_the_oldest_and_wraps_around():
+    bar_series = BarSeries('BTCUSDT', '60')
+    assert bar_series.get_newest() is None and bar_series.get_previous() is None
+
+    for ts in range(1, 13):
+        bar_series.add_bar(_bar(ts))
+        assert _ts(bar_series) == list(range(max(1, ts - 4), ts + 1))
+        assert bar_series.get_newest().ts == ts
+
+    # 12 appends into 5 slots, the oldest bar is no longer in slot 0
+    assert bar_series._start != 0
+    assert bar_series.get_previous().ts == 11
+    assert [bar['ts'] for bar in bar_series.as_dict()] == [8, 9, 10, 11, 12]
+    assert str(bar_series) == 'BTCUSDT 60 - 5 bars'
+
+
+def test_constructor_sorts_bars():
+    bar_series = BarSeries('BTCUSDT', '60', {ts: _bar(ts) for ts in (5, 1, 7, 3, 2, 6)})
+
+    assert _ts(bar_series) == [2, 3, 5, 6, 7]
+
+
+def test_get_by_index():
+    bar_series = BarSeries('BTCUSDT', '60')
+    for ts in range(1, 8):
+        bar_series.add_bar(_bar(ts))
+
+    assert [bar_series.get_by_index(i).ts for i in range(5)] == [3, 4, 5, 6, 7]
+    assert [bar_series.get_by_index(i).ts for i in range(-1, -6, -1)] == [7, 6, 5, 4, 3]
+    assert bar_series.get_by_index(5) is None
+    with pytest.raises(IndexError):
+        bar_series.get_by_index(-6)
+    assert BarSeries('BTCUSDT', '60').get_by_index(0) is None
+
+
+def test_replace_newest():
+    bar_series = BarSeries('BTCUSDT', '60')
+    bar_series.replace_newest(_bar(1))
+    assert _ts(bar_series) == [1]
+    bar_series.replace_newest(_bar(2))
+    assert _ts(bar_series) == [2]
+
+    for ts in range(3, 9):
+        bar_series.add_bar(_bar(ts))
+    assert _ts(bar_series) == [4, 5, 6, 7, 8]
+
+    # same timestamp, updated in place
+    bar_series.replace_newest(_bar(8, price=20.0))
+    assert _ts(bar_series) == [4, 5, 6, 7, 8]
+    assert bar_series.get_newest().c == 20.0
+    # a newer timestamp moves the newest bar forward without evicting
+    bar_series.replace_newest(_bar(9))
+    assert _ts(bar_series) == [4, 5, 6, 7, 9]
+    # an older one than the previous bar lands in timestamp order
+    bar_series.replace_newest(_bar(6.5))
+    assert _ts(bar_series) == [4, 5, 6, 6.5, 7]
+
+
+def test_late_and_duplicate_timestamps():
+    bar_series = BarSeries('BTCUSDT', '60')
+    for ts in (10, 20, 30, 40, 50):
+        bar_series.add_bar(_bar(ts))
+
+    # duplicate replaces the bar at that timestamp
+    bar_series.add_bar(_bar(30, price=99.0))
+    assert _ts(bar_series) == [10, 20, 30, 40, 50]
+    assert bar_series.bars[30].c == 99.0
+    # late bar evicts the oldest and is kept in order
+    bar_series.add_bar(_bar(35))
+    assert _ts(bar_series) == [20, 30, 35, 40, 50]
+    assert bar_series.get_newest().ts == 50
+    # appending after a rebuild still works
+    bar_series.add_bar(_bar(60))
+    assert _ts(bar_series) == [30, 35, 40, 50, 60]
+
+
+def test_strat_candles():
+    bar_series = BarSeries('BTCUSDT', '60')
+    for ts in range(1, 3):
+        bar_series.add_bar(_bar(ts))
+    assert bar_series.strat_candles() == (None, None)
+
+    for ts in range(3, 9):
+        bar_series.add_bar(_bar(ts))
+    target_bar, trigger_bar = bar_series.strat_candles()
+    assert (target_bar.ts, trigger_bar.ts) == (6, 7)
+
+
+def test_bars_is_a_fresh_dict():
+    bar_series = BarSeries('BTCUSDT', '60')
+    for ts in range(1, 4):
+        bar_series.add_bar(_bar(ts))
+
+    bars = bar_series.bars
+    bars.pop(1)
+    bars[10] = _bar(10)
+
+    assert bar_series.bars is not bars
+    assert _ts(bar_series) == [1, 2, 3]
+
+
+def _second_bars(start: datetime, count: int, seed: int = 3):
+    rng = random.Random(seed)
+    ts, price = start.timestamp(), 100.0
+    for _ in range(count):
+        if rng.random() < 0.03:
+            # late bar from before the newest bucket of the short timeframes
+            late_ts = ts - rng.uniform(60, 7_200)
+            yield Bar(ts=late_ts, o=price, h=price + 1, l=price - 1, c=price, v=1.0)
+        ts += rng.choice([1, 1, 5, 60, 600, 3_600, 20_000])
+        o = price
+        price = round(price + rng.uniform(-1, 1), 2)
+        yield Bar(ts=ts, o=o, h=max(o, price) + rng.uniform(0, 0.5), l=min(o, price) - rng.uniform(0, 0.5), c=price,
+                  v=rng.uniform(0, 3))
+
+
+@pytest.mark.parametrize('boundaries, make_time_buckets', [
+    (crypto_bucket_boundaries, make_crypto_time_buckets),
+    (stock_bucket_boundaries, make_stock_time_buckets),
+])
+def test_aggregator_matches_per_timeframe_fold(mocker, boundaries, make_time_buckets):
+    r = mocker.Mock()
+    r.json.return_value.get.return_value = None
+    boundaries = boundaries()
+    aggregate_timeframes = build_timeframe_aggregator(r, 'barHistory:test:', boundaries)
+
+    state = None
+    expected = {tf: DictBarSeries() for tf in boundaries.timeframes}
+    # crosses a DST change, month, quarter and year ends
+    for bar in _second_bars(datetime(2023, 10, 28, tzinfo=timezone.utc), 3_000):
+        state, by_tf = aggregate_timeframes(state, ('BTCUSDT', bar))
+
+        buckets = make_time_buckets(datetime.fromtimestamp(bar.ts, tz=timezone.utc))
+        for tf, bar_series in expected.items():
+            update_bar_series(bar_series, buckets[tf].timestamp(), bar.copy())
+        assert by_tf == {tf: bar_series.as_dict() for tf, bar_series in expected.items()}
+
+    assert datetime.fromtimestamp(bar.ts, tz=timezone.utc) > datetime(2024, 1, 2, tzinfo=timezone.utc)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from dataflows.symbols import SymbolInfo, SymbolRegistry
+from stratbot.scanner.models.symbols import SymbolRec, SymbolType
+
+
+def _symbolrecs(*symbols: str) -> list[SymbolRec]:
+    return [SymbolRec(symbol=symbol, symbol_type=SymbolType.STOCK, is_index=symbol == 'SPY') for symbol in symbols]
+
+
+def test_refresh_swaps_in_new_symbols(mocker):
+    query = mocker.patch.object(SymbolRec.objects, 'filter', return_value=_symbolrecs('AAPL', 'SPY'))
+    registry = SymbolRegistry(symbol_type='stock', skip_discord_alerts=False)
+    assert 'AAPL' not in registry and registry.get('AAPL') is None
+
+    registry.refresh()
+    query.assert_called_once_with(symbol_type='stock', skip_discord_alerts=False)
+    assert len(registry) == 2
+    assert 'AAPL' in registry and 'MSFT' not in registry
+    spy = registry.get('SPY')
+    assert spy == SymbolInfo.from_symbolrec(_symbolrecs('SPY')[0])
+    assert spy.is_index and not spy.is_crypto
+    info, symbols = registry.info, registry.symbols
+
+    # SPY dropped, MSFT added
+    query.return_value = _symbolrecs('AAPL', 'MSFT')
+    registry.refresh()
+    assert registry.symbols == {'AAPL', 'MSFT'}
+    assert registry.get('SPY') is None and 'SPY' not in registry
+    assert registry.get('MSFT').symbol == 'MSFT'
+    # readers holding the previous collections still see a complete registry
+    assert set(info) == symbols == {'AAPL', 'SPY'}
+
+
+def test_failed_refresh_keeps_the_previous_symbols(mocker):
+    query = mocker.patch.object(SymbolRec.objects, 'filter', return_value=_symbolrecs('AAPL'))
+    mocker.patch('dataflows.symbols.connection')
+    registry = SymbolRegistry(refresh_interval=0.01).start()
+    try:
+        assert 'AAPL' in registry
+        query.side_effect = RuntimeError('database is gone')
+        registry._stop.wait(0.05)
+        assert 'AAPL' in registry
+    finally:
+        registry.stop()
+    assert query.call_count > 1
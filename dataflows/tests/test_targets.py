@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from dataflows.bars import Bar, BarSeries
+from dataflows.targets import MagnitudeLadder, MagnitudeLadders
+
+
+def _rows(n: int, seed: int = 5) -> list[tuple[float, float, float]]:
+    # on a 0.5 grid so equal highs and lows are common
+    rng = random.Random(seed)
+    price, rows = 100.0, []
+    for i in range(n):
+        price = max(5.0, price + rng.choice([-1.5, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5]))
+        rows.append((float(i), price + rng.choice([0.0, 0.5, 1.0]), price - rng.choice([0.0, 0.5, 1.0])))
+    return rows
+
+
+def walk_targets(rows, target: float, direction: int, limit: int = 5) -> list[float]:
+    """
+    The newest-first walk over every price record beyond the target that `scan_setups`
+    did before the ladders.
+    """
+    targets, current = [], target
+    for _, high, low in reversed(rows):
+        level = high if direction == 1 else low
+        if level * direction > current * direction:
+            targets.append(level)
+            current = level
+    return targets[:limit]
+
+
+def _series(symbol: str, tf: str, rows) -> BarSeries:
+    bar_series = BarSeries(symbol, tf)
+    for ts, high, low in rows:
+        bar_series.add_bar(Bar(ts=ts, o=low, h=high, l=low, c=high, v=1.0))
+    return bar_series
+
+
+@pytest.mark.parametrize('limit', [1, 5, 50])
+def test_targets_match_the_newest_first_walk(limit):
+    rows = _rows(2_000)
+    ladder = MagnitudeLadder('TEST', 'D')
+    ladder.extend(rows)
+
+    highs = sorted({high for _, high, _ in rows})
+    lows = sorted({low for _, _, low in rows})
+    # every level as a target, so targets equal to a level are covered too
+    for target in highs + [highs[0] - 1, highs[-1] + 1, highs[len(highs) // 2] + 0.25]:
+        assert ladder.targets(target, 1, limit=limit) == walk_targets(rows, target, 1, limit=limit)
+    for target in lows + [lows[0] - 1, lows[-1] + 1, lows[len(lows) // 2] - 0.25]:
+        assert ladder.targets(target, -1, limit=limit) == walk_targets(rows, target, -1, limit=limit)
+
+
+def test_equal_levels():
+    ladder = MagnitudeLadder('TEST', 'D')
+    ladder.extend([(1.0, 12.0, 8.0), (2.0, 12.0, 8.0), (3.0, 11.0, 9.0), (4.0, 11.0, 9.0), (5.0, 10.0, 10.0)])
+
+    assert ladder.highs == [12.0, 11.0, 10.0]
+    assert ladder.lows == [8.0, 9.0, 10.0]
+    assert ladder.targets(10.0, 1) == [11.0, 12.0]
+    assert ladder.targets(11.0, 1) == [12.0]
+    assert ladder.targets(10.0, -1) == [9.0, 8.0]
+
+
+def test_push_ignores_old_bars():
+    ladder = MagnitudeLadder('TEST', 'D')
+    ladder.push(2.0, 10.0, 5.0)
+    ladder.push(2.0, 20.0, 1.0)
+    ladder.push(1.0, 20.0, 1.0)
+
+    assert (ladder.highs, ladder.lows, ladder.last_ts) == ([10.0], [5.0], 2.0)
+
+
+def test_update_skips_the_open_bar():
+    rows = _rows(8)
+    ladder = MagnitudeLadder('TEST', 'D')
+    ladder.extend(rows[:3])
+
+    bar_series = _series('TEST', 'D', rows[3:6])
+    ladder.update(bar_series)
+    assert ladder.last_ts == rows[4][0]
+
+    expected = MagnitudeLadder('TEST', 'D')
+    expected.extend(rows[:5])
+    assert (ladder.highs, ladder.lows) == (expected.highs, expected.lows)
+
+    # the open bar changing doesn't touch the ladder, it closing does
+    bar_series.replace_newest(Bar(ts=rows[5][0], o=1.0, h=1_000.0, l=0.5, c=1.0, v=1.0))
+    ladder.update(bar_series)
+    assert ladder.last_ts == rows[4][0]
+    bar_series.add_bar(Bar(ts=rows[6][0], o=1.0, h=1.0, l=1.0, c=1.0, v=1.0))
+    ladder.update(bar_series)
+    assert ladder.last_ts == rows[5][0]
+    assert ladder.highs == [1_000.0]
+
+
+def test_ladders_build_from_history_before_the_series():
+    rows = _rows(50)
+    calls = []
+
+    def load_history(symbol, tf, before):
+        calls.append((symbol, tf, before))
+        return [row for row in rows if row[0] < before]
+
+    ladders = MagnitudeLadders(load_history)
+    bar_series = _series('TEST', 'D', rows[45:])
+    ladder = ladders.get(bar_series)
+
+    # the series' oldest bar is the cutoff, and everything but its open bar is pushed
+    assert calls == [('TEST', 'D', rows[45][0])]
+    expected = MagnitudeLadder('TEST', 'D')
+    expected.extend(rows[:-1])
+    assert (ladder.highs, ladder.lows, ladder.last_ts) == (expected.highs, expected.lows, rows[-2][0])
+
+    assert ladders.get(bar_series) is ladder
+    assert len(calls) == 1 and len(ladders) == 1
+
+    # an empty series reads the whole history
+    ladders.get(BarSeries('OTHER', 'D'))
+    assert calls[-1] == ('OTHER', 'D', float('inf'))
+
+
+def test_ladders_update_only_built_ladders():
+    rows = _rows(10)
+    ladders = MagnitudeLadders(lambda symbol, tf, before: [])
+    daily = _series('TEST', 'D', rows[:3])
+    ladder = ladders.get(daily)
+
+    ladders.update({'D': _series('TEST', 'D', rows[:5]), '60': _series('TEST', '60', rows[:5])})
+    assert ladder.last_ts == rows[3][0]
+    assert len(ladders) == 1
+
+
+def test_ladders_do_not_cache_a_missing_history():
+    histories = {'TEST': None}
+    ladders = MagnitudeLadders(lambda symbol, tf, before: histories[symbol])
+    bar_series = _series('TEST', 'D', _rows(3))
+
+    assert ladders.get(bar_series) is None
+    assert len(ladders) == 0
+
+    histories['TEST'] = []
+    assert ladders.get(bar_series) is not None
+    assert len(ladders) == 1
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from dataflows.timeframe_ops import (
+    crypto_bucket_boundaries,
+    make_crypto_time_buckets,
+    make_stock_time_buckets,
+    stock_bucket_boundaries,
+)
+
+
+SPANS = {
+    # DST starts and ends in New York
+    'dst_start': (datetime(2024, 3, 8, tzinfo=timezone.utc), datetime(2024, 3, 12, tzinfo=timezone.utc)),
+    'dst_end': (datetime(2024, 11, 1, tzinfo=timezone.utc), datetime(2024, 11, 5, tzinfo=timezone.utc)),
+    # month (leap day), quarter and year rollovers
+    'month': (datetime(2024, 2, 28, 18, tzinfo=timezone.utc), datetime(2024, 3, 1, 6, tzinfo=timezone.utc)),
+    'quarter': (datetime(2024, 6, 30, 18, tzinfo=timezone.utc), datetime(2024, 7, 1, 6, tzinfo=timezone.utc)),
+    'year': (datetime(2023, 12, 31, 18, tzinfo=timezone.utc), datetime(2024, 1, 1, 6, tzinfo=timezone.utc)),
+}
+
+
+def _timestamps(start: datetime, end: datetime, step: timedelta = timedelta(seconds=97)):
+    while start < end:
+        yield start.timestamp()
+        start += step
+
+
+@pytest.mark.parametrize('span', SPANS)
+@pytest.mark.parametrize('boundaries, make_time_buckets', [
+    (crypto_bucket_boundaries, make_crypto_time_buckets),
+    (stock_bucket_boundaries, make_stock_time_buckets),
+])
+def test_buckets_match_floor_functions(span, boundaries, make_time_buckets):
+    boundaries = boundaries()
+
+    for ts in _timestamps(*SPANS[span]):
+        expected = make_time_buckets(datetime.fromtimestamp(ts, tz=timezone.utc))
+        assert boundaries.buckets(ts) == {
+            tf: expected[tf].timestamp() for tf in boundaries.timeframes
+        }, datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def test_buckets_are_reused_within_a_bucket():
+    boundaries = crypto_bucket_boundaries()
+    floor, next_start = boundaries.timeframes['D']
+    floored = []
+    boundaries.timeframes['D'] = (lambda dt: floored.append(dt) or floor(dt), next_start)
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for ts in _timestamps(start, start + timedelta(days=2), step=timedelta(minutes=1)):
+        boundaries.buckets(ts)
+
+    assert floored == [start, start + timedelta(days=1)]
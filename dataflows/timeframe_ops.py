@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta, timezone
+from typing import Callable
 import math
 
 import pytz
@@ -93,3 +94,93 @@ def make_crypto_time_buckets(dt: datetime) -> dict:
         'Q': floor_datetime_variable(dt, interval='Q'),
         'Y': floor_datetime_variable(dt, interval='Y'),
     }
+
+
+def next_datetime_variable(dt: datetime, interval: str) -> datetime:
+    """
+    The start of the month (M), quarter (Q) or year (Y) after the one starting at `dt`.
+    """
+    months = {'M': 1, 'Q': 3, 'Y': 12}[interval]
+    month = dt.month - 1 + months
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+def _next_datetime_mixed(dt: datetime, delta: timedelta) -> datetime:
+    """
+    Upper bound of the `floor_datetime_mixed` bucket starting at `dt`. Intraday buckets are
+    counted from the start of the market day, so they also end at the next market midnight.
+    """
+    if delta >= timedelta(days=1):
+        return dt + delta
+    market_tz = pytz.timezone("America/New_York")
+    next_day = dt.astimezone(market_tz).date() + timedelta(days=1)
+    next_midnight = market_tz.localize(datetime(next_day.year, next_day.month, next_day.day))
+    return min(dt + delta, next_midnight)
+
+
+class BucketBoundaries:
+    """
+    Bucket starts for a set of timeframes. The [start, end) boundaries of the current
+    bucket are kept per timeframe, so the floor functions only run when a timestamp
+    crosses into a new bucket instead of once per bar and timeframe.
+    """
+    def __init__(self, timeframes: dict[str, tuple[Callable[[datetime], datetime], Callable[[datetime], datetime]]]):
+        self.timeframes = timeframes
+        self._boundaries: dict[str, tuple[float, float]] = {}
+
+    def buckets(self, ts: float) -> dict[str, float]:
+        buckets = {}
+        dt = None
+        for tf, (floor, next_start) in self.timeframes.items():
+            boundaries = self._boundaries.get(tf)
+            if boundaries is None or not boundaries[0] <= ts < boundaries[1]:
+                dt = dt or datetime.fromtimestamp(ts, tz=timezone.utc)
+                start = floor(dt)
+                boundaries = self._boundaries[tf] = (start.timestamp(), next_start(start).timestamp())
+            buckets[tf] = boundaries[0]
+        return buckets
+
+
+def _fixed(delta: timedelta):
+    return lambda dt: floor_datetime_fixed(dt, delta=delta), lambda dt: dt + delta
+
+
+def _variable(interval: str):
+    return lambda dt: floor_datetime_variable(dt, interval=interval), lambda dt: next_datetime_variable(dt, interval)
+
+
+def _mixed(delta: timedelta, offset: timedelta = timedelta(0)):
+    return (
+        lambda dt: floor_datetime_mixed(dt, delta=delta, offset=offset),
+        lambda dt: _next_datetime_mixed(dt, delta),
+    )
+
+
+def crypto_bucket_boundaries() -> BucketBoundaries:
+    return BucketBoundaries({
+        '15': _fixed(timedelta(minutes=15)),
+        '30': _fixed(timedelta(minutes=30)),
+        '60': _fixed(timedelta(minutes=60)),
+        '4H': _fixed(timedelta(hours=4)),
+        '6H': _fixed(timedelta(hours=6)),
+        '12H': _fixed(timedelta(hours=12)),
+        'D': _fixed(timedelta(days=1)),
+        'W': _fixed(timedelta(weeks=1)),
+        'M': _variable('M'),
+        'Q': _variable('Q'),
+        'Y': _variable('Y'),
+    })
+
+
+def stock_bucket_boundaries() -> BucketBoundaries:
+    return BucketBoundaries({
+        '15': _mixed(timedelta(minutes=15)),
+        '30': _mixed(timedelta(minutes=30)),
+        '60': _mixed(timedelta(minutes=60), offset=timedelta(minutes=30)),
+        '4H': _mixed(timedelta(hours=4), offset=timedelta(hours=9, minutes=30)),
+        'D': _mixed(timedelta(days=1)),
+        'W': _mixed(timedelta(weeks=1)),
+        'M': _variable('M'),
+        'Q': _variable('Q'),
+        'Y': _variable('Y'),
+    })
@@ -0,0 +1,274 @@
+"""
+Asynchronous delivery of Discord webhook messages.
+
+`DiscordDispatcher.submit` only queues an embed and returns, so alerts built inside
+bytewax steps and Celery tasks no longer wait on `DiscordWebhook.execute()`. Messages
+are sent from an event loop on a background thread, one sender per webhook. Each sender
+waits out its webhook's rate limit bucket, including the `retry_after` of a 429, and
+coalesces the embeds queued for its webhook into one request (up to 10).
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any, Optional, Union
+
+import aiohttp
+from discord_webhook import DiscordEmbed
+
+
+log = logging.getLogger(__name__)
+
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_CONTENT_LENGTH = 2000
+
+
+@dataclass
+class DiscordMessage:
+    url: str
+    embed: dict[str, Any]
+    content: str = ''
+    attempts: int = 0
+
+
+@dataclass
+class DispatchStatistics:
+    submitted: int = 0
+    dropped: int = 0
+    requests: int = 0
+    delivered: int = 0
+    rate_limited: int = 0
+    failed: int = 0
+
+
+class RateLimitBucket:
+    """
+    When a webhook may be called next, from the `X-RateLimit-*` headers of its last
+    response or the `retry_after` of a 429.
+    """
+
+    def __init__(self):
+        self.blocked_until = 0.0
+
+    def delay(self) -> float:
+        return max(0.0, self.blocked_until - monotonic())
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, monotonic() + seconds)
+
+    def update(self, headers) -> None:
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        if remaining is not None and reset_after is not None and int(remaining) == 0:
+            self.block(float(reset_after))
+
+
+def embed_to_dict(embed: Union[DiscordEmbed, dict[str, Any]]) -> dict[str, Any]:
+    if isinstance(embed, DiscordEmbed):
+        embed = embed.__dict__
+    return {key: value for key, value in embed.items() if value is not None}
+
+
+class DiscordDispatcher:
+    """
+    Bounded, rate limited and batching sender for Discord webhooks. At most `max_queue`
+    messages are waiting or in flight, `submit` drops (and counts) anything past that
+    rather than block the caller. Server errors, timeouts and other exceptions are retried
+    `max_retries` times with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 10_000,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        timeout: float = 10.0,
+    ):
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.stats = DispatchStatistics()
+
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        # Only touched on the dispatcher's event loop.
+        self._pending: dict[str, deque[DiscordMessage]] = {}
+        self._senders: dict[str, asyncio.Task] = {}
+        self._buckets: dict[str, RateLimitBucket] = {}
+        self._global_bucket = RateLimitBucket()
+
+    def submit(self, url: str, embed: Union[DiscordEmbed, dict[str, Any]], content: str = '') -> bool:
+        """
+        Queue `embed` (with an optional `content` line, e.g. role pings) for `url`.
+        Returns False if the queue is full and the message was dropped.
+        """
+        message = DiscordMessage(url=url, embed=embed_to_dict(embed), content=content or '')
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self.stats.dropped += 1
+                log.warning(f'discord dispatch queue full ({self.max_queue}), dropping message for {url}')
+                return False
+            self._queued += 1
+            self.stats.submitted += 1
+            self._idle.clear()
+        self._start()
+        self._loop.call_soon_threadsafe(self._enqueue, message)
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every submitted message has been delivered or given up on.
+        """
+        return self._idle.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        if not self.flush(timeout):
+            log.warning(f'discord dispatcher closed with {self._queued} messages undelivered')
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            thread = threading.Thread(target=self._run, args=(loop, ready), name='discord-dispatcher', daemon=True)
+            thread.start()
+            ready.wait()
+            self._loop, self._thread = loop, thread
+
+    def _run(self, loop: asyncio.AbstractEventLoop, ready: threading.Event) -> None:
+        asyncio.set_event_loop(loop)
+        self._session = loop.run_until_complete(self._create_session())
+        ready.set()
+        loop.run_forever()
+
+    async def _create_session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def _shutdown(self) -> None:
+        senders = list(self._senders.values())
+        for task in senders:
+            task.cancel()
+        await asyncio.gather(*senders, return_exceptions=True)
+        await self._session.close()
+
+    def _enqueue(self, message: DiscordMessage) -> None:
+        self._pending.setdefault(message.url, deque()).append(message)
+        if message.url not in self._senders:
+            self._senders[message.url] = asyncio.create_task(self._send_pending(message.url))
+
+    def _done(self, count: int) -> None:
+        with self._lock:
+            self._queued -= count
+            if not self._queued:
+                self._idle.set()
+
+    async def _send_pending(self, url: str) -> None:
+        pending = self._pending[url]
+        bucket = self._buckets.setdefault(url, RateLimitBucket())
+        batch: list[DiscordMessage] = []
+        try:
+            while pending:
+                # Also yields once when not rate limited, so messages submitted together
+                # go out in the same request.
+                await asyncio.sleep(max(bucket.delay(), self._global_bucket.delay()))
+                batch = self._take_batch(pending)
+                if await self._post(url, batch, bucket):
+                    self._done(len(batch))
+                else:
+                    pending.extendleft(reversed(batch))
+                batch = []
+        except Exception:
+            log.exception(f'discord sender for {url} failed')
+        finally:
+            # Cancelled on shutdown or failed, whatever is left is given up on so
+            # `flush` doesn't wait for it.
+            given_up = len(batch) + len(pending)
+            if given_up:
+                pending.clear()
+                self.stats.failed += given_up
+                self._done(given_up)
+            del self._senders[url]
+
+    @staticmethod
+    def _take_batch(pending: deque[DiscordMessage]) -> list[DiscordMessage]:
+        batch = [pending.popleft()]
+        content_length = len(batch[0].content)
+        while pending and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+            content = pending[0].content
+            if content and content_length + len(content) + 1 > MAX_CONTENT_LENGTH:
+                break
+            content_length += len(content) + 1 if content else 0
+            batch.append(pending.popleft())
+        return batch
+
+    async def _post(self, url: str, batch: list[DiscordMessage], bucket: RateLimitBucket) -> bool:
+        """
+        Send `batch` as one message. Returns False if it should be sent again.
+        """
+        payload: dict[str, Any] = {'embeds': [message.embed for message in batch]}
+        if content := '\n'.join(message.content for message in batch if message.content):
+            payload['content'] = content
+
+        self.stats.requests += 1
+        try:
+            async with self._session.post(url, json=payload) as response:
+                bucket.update(response.headers)
+                if response.status == 429:
+                    data = await response.json(content_type=None)
+                    retry_after = float(data.get('retry_after') or response.headers.get('Retry-After') or 1.0)
+                    self.stats.rate_limited += 1
+                    log.info(f'discord webhook rate limited, retrying {len(batch)} embeds in {retry_after}s')
+                    (self._global_bucket if data.get('global') else bucket).block(retry_after)
+                    return False
+                if response.status < 500:
+                    if response.status >= 400:
+                        self.stats.failed += len(batch)
+                        log.error(
+                            f'discord webhook rejected {len(batch)} embeds: {response.status} {await response.text()}'
+                        )
+                    else:
+                        self.stats.delivered += len(batch)
+                    return True
+                error = f'status {response.status}'
+        except Exception as e:
+            # Connection errors and timeouts, but also anything unexpected (a bad
+            # payload, an unparseable 429), are retried and eventually given up on.
+            error = repr(e)
+
+        attempt = max(message.attempts for message in batch) + 1
+        if attempt > self.max_retries:
+            self.stats.failed += len(batch)
+            log.error(f'discord webhook failed after {self.max_retries} retries, dropping {len(batch)} embeds: {error}')
+            return True
+        for message in batch:
+            message.attempts = attempt
+        bucket.block(self.backoff * 2 ** (attempt - 1))
+        log.warning(f'discord webhook error ({error}), retry {attempt}/{self.max_retries}')
+        return False
+
+
+discord_dispatcher = DiscordDispatcher()
+atexit.register(discord_dispatcher.close)
@@ -9,6 +9,7 @@ from model_utils.fields import AutoCreatedField, AutoLastModifiedField
 
 from stratbot.scanner.models.symbols import SymbolRec, Setup
 from stratbot.users.models import User
+from .integrations.discord.dispatchers import discord_dispatcher
 
 log = logging.getLogger(__name__)
 
@@ -456,38 +457,32 @@ class DiscordAlert(SetupAlert):
         # todo: remove channel check in the future?? used to block dupe mag alerts on dang channels
         if self.setup.hit_magnitude and channel in ['stock', 'crypto']:
             url = self._create_url(self.MAGNITUDE_CHANNELS[channel])
-            webhook = DiscordWebhook(url=url, embeds=[embed])
-            r = webhook.execute()
+            discord_dispatcher.submit(url, embed)
             return
 
         push_role_header = self._alert_header(channel, self.setup.tf)
         url = self._create_url(webhook_channel_map[channel])
-        webhook = DiscordWebhook(url=url, content=push_role_header, embeds=[embed])
-        r = webhook.execute()
+        discord_dispatcher.submit(url, embed, content=push_role_header)
 
         if channel in ['stock', 'crypto']:
             if self.setup.priority in [1, 2]:
                 url = self._create_url(self.PRIORITY_CHANNELS[channel])
                 push_role_header = self._alert_header(channel, 'PRIORITY')
-                webhook = DiscordWebhook(url=url, content=push_role_header, embeds=[embed])
-                r = webhook.execute()
+                discord_dispatcher.submit(url, embed, content=push_role_header)
 
             if 'P3' in self.setup.pattern:
                 url = self._create_url(self.SSS50_CHANNELS[channel])
                 push_role_header = self._alert_header(channel, 'SSS50')
-                webhook = DiscordWebhook(url=url, content=push_role_header, embeds=[embed])
-                r = webhook.execute()
+                discord_dispatcher.submit(url, embed, content=push_role_header)
 
             if self.symbolrec.is_index or self.symbolrec.is_sector:
                 url = self._create_url(self.STOCKS_INDEX_CHANNEL)
                 push_role_header = self._alert_header(channel, 'PRIORITY')
-                webhook = DiscordWebhook(url=url, content=push_role_header, embeds=[embed])
-                r = webhook.execute()
+                discord_dispatcher.submit(url, embed, content=push_role_header)
 
             partial_url = self.CRYPTO_ALL if self.symbolrec.is_crypto else self.STOCKS_ALL
             url = self._create_url(partial_url)
-            webhook = DiscordWebhook(url=url, embeds=[embed])
-            r = webhook.execute()
+            discord_dispatcher.submit(url, embed)
 
 
 class DiscordGappersAlert:
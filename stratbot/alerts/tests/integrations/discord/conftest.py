@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+import pytest
+from aiohttp import web
+
+
+@dataclass
+class DiscordStub:
+    """
+    State of the local stand-in for Discord webhooks. `responses` is a queue of
+    `(status, body)` to send instead of a 204, for rate limit and error cases, and
+    `delay` is how long each request takes.
+    """
+    base_url: str = ""
+    requests: list[tuple[str, dict]] = field(default_factory=list)
+    responses: deque = field(default_factory=deque)
+    delay: float = 0.0
+
+    def url(self, webhook: str) -> str:
+        return f"{self.base_url}/api/webhooks/{webhook}"
+
+    def embeds(self, webhook: str) -> list[dict]:
+        return [
+            embed
+            for path, payload in self.requests
+            if path.endswith(f"/{webhook}")
+            for embed in payload["embeds"]
+        ]
+
+
+@pytest.fixture
+def discord_stub():
+    stub = DiscordStub()
+
+    async def execute_webhook(request: web.Request) -> web.Response:
+        await asyncio.sleep(stub.delay)
+        if stub.responses:
+            status, body = stub.responses.popleft()
+            return web.json_response(body, status=status)
+        stub.requests.append((request.path, await request.json()))
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post("/api/webhooks/{webhook}", execute_webhook)
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    stub.base_url = f"http://127.0.0.1:{port}"
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield stub
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from time import monotonic
+
+import pytest
+from discord_webhook import DiscordEmbed
+
+from stratbot.alerts.integrations.discord.dispatchers import DiscordDispatcher, MAX_EMBEDS_PER_MESSAGE
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = DiscordDispatcher(backoff=0.05, timeout=2.0)
+    yield dispatcher
+    dispatcher.close()
+
+
+def test_coalesces_embeds_per_webhook(discord_stub, dispatcher):
+    discord_stub.delay = 0.05
+    for i in range(25):
+        dispatcher.submit(discord_stub.url("crypto"), DiscordEmbed(title=f"crypto {i}"), content=f"ping {i}")
+    dispatcher.submit(discord_stub.url("stock"), {"title": "stock 0", "description": None})
+
+    assert dispatcher.flush(timeout=5)
+    titles = [embed["title"] for embed in discord_stub.embeds("crypto")]
+    assert titles == [f"crypto {i}" for i in range(25)]
+    assert discord_stub.embeds("stock") == [{"title": "stock 0"}]
+
+    crypto_requests = [payload for path, payload in discord_stub.requests if path.endswith("/crypto")]
+    assert len(crypto_requests) < 25
+    assert all(len(payload["embeds"]) <= MAX_EMBEDS_PER_MESSAGE for payload in crypto_requests)
+    assert crypto_requests[0]["content"].startswith("ping 0")
+    assert dispatcher.stats.delivered == 26
+
+
+def test_submit_does_not_wait_on_http(discord_stub, dispatcher):
+    discord_stub.delay = 0.2
+    start = monotonic()
+    for i in range(5):
+        dispatcher.submit(discord_stub.url(f"hook{i}"), {"title": str(i)})
+    assert monotonic() - start < 0.1
+    assert dispatcher.flush(timeout=5)
+    assert dispatcher.stats.delivered == 5
+
+
+def test_honours_retry_after(discord_stub, dispatcher):
+    discord_stub.responses.append(
+        (429, {"message": "You are being rate limited.", "retry_after": 0.3, "global": False})
+    )
+    start = monotonic()
+    dispatcher.submit(discord_stub.url("crypto"), {"title": "first"})
+
+    assert dispatcher.flush(timeout=5)
+    assert monotonic() - start >= 0.3
+    assert [embed["title"] for embed in discord_stub.embeds("crypto")] == ["first"]
+    assert dispatcher.stats.rate_limited == 1
+    assert dispatcher.stats.requests == 2
+
+
+def test_retries_server_errors_then_gives_up(discord_stub, dispatcher):
+    discord_stub.responses.extend([(502, {})] * 2)
+    dispatcher.submit(discord_stub.url("crypto"), {"title": "retried"})
+    assert dispatcher.flush(timeout=5)
+    assert discord_stub.embeds("crypto") == [{"title": "retried"}]
+
+    discord_stub.responses.extend([(500, {})] * (dispatcher.max_retries + 1))
+    dispatcher.submit(discord_stub.url("stock"), {"title": "lost"})
+    assert dispatcher.flush(timeout=5)
+    assert discord_stub.embeds("stock") == []
+    assert dispatcher.stats.failed == 1
+
+
+def test_gives_up_on_unexpected_errors(discord_stub, dispatcher):
+    # not JSON serializable, `session.post` raises a TypeError
+    dispatcher.submit(discord_stub.url("crypto"), {"title": object()})
+    dispatcher.submit(discord_stub.url("stock"), {"title": "delivered"})
+
+    assert dispatcher.flush(timeout=5)
+    assert discord_stub.embeds("stock") == [{"title": "delivered"}]
+    assert dispatcher.stats.failed == 1
+    assert dispatcher.stats.delivered == 1
+
+
+def test_drops_when_queue_is_full(discord_stub):
+    discord_stub.delay = 0.1
+    dispatcher = DiscordDispatcher(max_queue=5)
+    try:
+        accepted = [dispatcher.submit(discord_stub.url("crypto"), {"title": str(i)}) for i in range(8)]
+        assert accepted == [True] * 5 + [False] * 3
+        assert dispatcher.flush(timeout=5)
+        assert len(discord_stub.embeds("crypto")) == 5
+        assert dispatcher.stats.dropped == 3
+    finally:
+        dispatcher.close()
+
+
+def test_load_with_rate_limits(discord_stub, dispatcher):
+    webhooks = [f"hook{i}" for i in range(5)]
+    for _ in range(3):
+        discord_stub.responses.append((429, {"retry_after": 0.05, "global": False}))
+    for i in range(500):
+        webhook = webhooks[i % len(webhooks)]
+        dispatcher.submit(discord_stub.url(webhook), {"title": f"{webhook} {i}"}, content="@role")
+
+    assert dispatcher.flush(timeout=10)
+    for webhook in webhooks:
+        titles = [embed["title"] for embed in discord_stub.embeds(webhook)]
+        assert titles == [f"{webhook} {i}" for i in range(500) if i % len(webhooks) == webhooks.index(webhook)]
+    assert dispatcher.stats.delivered == 500
+    assert dispatcher.stats.rate_limited == 3
+    assert dispatcher.stats.requests < 500
@@ -1,9 +1,9 @@
 import logging
-from collections import OrderedDict, defaultdict
-from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from datetime import datetime, timezone
 
 from stratbot.scanner.integrations.consumer import BaseConsumer
-from stratbot.scanner.models.symbols import SymbolRec, SymbolType
+from stratbot.scanner.models.symbols import SymbolType
 from .exchange import ID as EXCHANGE_ID
 
 
@@ -23,20 +23,11 @@ class AlpacaQuoteConsumer(BaseConsumer):
             EXCHANGE_ID,
             f'^{EXCHANGE_ID}.prices',
             f'alpaca-price-consumer',
+            track_quotes=True,
         )
-        self.symbolrecs = SymbolRec.objects.filter(symbol_type=self.symbol_type)
-        self.quotes = defaultdict(float)
-        self.last_update = datetime.now(tz=timezone.utc)
 
     async def process_message(self, symbol, msg):
-        try:
-            self.quotes[symbol] = msg
-        except (KeyError, IndexError):
-            return
-
-        if datetime.now(tz=timezone.utc) - self.last_update > timedelta(seconds=1):
-            await self._bulk_update_quotes()
-            self.last_update = datetime.now(tz=timezone.utc)
+        self.quote_book.update(symbol, msg)
 
 
 class AlpacaCandleConsumer(BaseConsumer):
@@ -46,17 +37,17 @@ class AlpacaCandleConsumer(BaseConsumer):
             EXCHANGE_ID,
             f'^{EXCHANGE_ID}.bars',
             'alpaca-candle-consumer',
+            write_behind=True,
         )
 
-    async def process_message(self, symbol, msg):
-        log.debug(f'{symbol}: {msg}')
-
-        if symbol not in self.symbols:
-            return
+    async def process_batch(self, batch):
+        for symbol, msg in batch:
+            if symbol not in self.symbols:
+                continue
 
-        if bar := await self.handle_tf_aggregate(msg):
-            historical_bar = self._convert_to_historial_format(bar)
-            await self.bar_to_timescale(historical_bar, self.symbol_type)
+            if bar := await self.handle_tf_aggregate(msg):
+                historical_bar = self._convert_to_historial_format(bar)
+                self.bar_to_timescale(historical_bar, self.symbol_type)
 
     @staticmethod
     async def handle_tf_aggregate(msg) -> dict:
@@ -1,10 +1,14 @@
 import asyncio
 import json
+import random
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import logging
-from time import perf_counter
+from time import monotonic, perf_counter
+from typing import AsyncIterator, Optional
 import pytz
 
+import aiohttp
 import pandas as pd
 import websockets
 from binance.um_futures import UMFutures
@@ -14,7 +18,7 @@ from stratbot.scanner.integrations.websockets_bridge import WebsocketBridge
 from stratbot.scanner.models.symbols import SymbolType
 from stratbot.scanner.models.timeframes import Timeframe
 from . import exchange
-from .clients import client
+from .clients import client, proxies
 
 
 log = logging.getLogger(__name__)
@@ -133,11 +137,179 @@ class BinanceBridge:
         return df
 
 
+class WeightRateLimiter:
+    """
+    Token bucket over Binance request weight. `limit` weight refills evenly over each
+    minute, and the `X-MBX-USED-WEIGHT-1M` header the server sends back is used to
+    catch up when other processes share the same IP.
+    """
+
+    def __init__(self, limit: int, period: float = 60.0):
+        self.limit = limit
+        self.rate = limit / period
+        self.tokens = float(limit)
+        self.updated_at = monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, weight: int) -> None:
+        async with self._lock:
+            self._refill()
+            while self.tokens < weight:
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= weight
+
+    def observe(self, used_weight: int) -> None:
+        self._refill()
+        self.tokens = min(self.tokens, self.limit - used_weight)
+
+
+class BinanceKlineFetcher:
+    """
+    Fetches continuous klines over one shared `aiohttp` session, at most
+    `max_concurrency` requests in flight and within the request weight budget.
+    Throttled (429/418), server side (5xx) and connection errors are retried with
+    exponential backoff, honouring `Retry-After` when the server sends one.
+    """
+    KLINES_PATH = '/fapi/v1/continuousKlines'
+    KLINES_LIMIT = 1000
+
+    def __init__(
+            self,
+            session: aiohttp.ClientSession,
+            rate_limiter: WeightRateLimiter,
+            max_concurrency: int,
+            max_retries: int,
+            backoff: float,
+            proxy: Optional[str] = None,
+    ):
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.proxy = proxy
+        self.num_requests = 0
+        self.num_retries = 0
+
+    @staticmethod
+    def request_weight(limit: int) -> int:
+        # https://binance-docs.github.io/apidocs/futures/en/#continuous-contract-kline-candlestick-data
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        if limit <= 1000:
+            return 5
+        return 10
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * 2 ** attempt * (1 + random.random() / 2)
+
+    async def fetch(self, symbol: str, tf: Timeframe, start_date_ms: int, end_date_ms: int) -> list:
+        params = {
+            'pair': symbol,
+            'contractType': 'PERPETUAL',
+            'interval': exchange.INTERVALS[tf],
+            'startTime': start_date_ms,
+            'endTime': end_date_ms,
+            'limit': self.KLINES_LIMIT,
+        }
+        weight = self.request_weight(self.KLINES_LIMIT)
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire(weight)
+                self.num_requests += 1
+                retry_after = None
+                try:
+                    async with self.session.get(self.KLINES_PATH, params=params, proxy=self.proxy) as response:
+                        if (used_weight := response.headers.get('X-MBX-USED-WEIGHT-1M')) is not None:
+                            self.rate_limiter.observe(int(used_weight))
+                        if response.status in (418, 429) or response.status >= 500:
+                            retry_after = response.headers.get('Retry-After')
+                            error = f'HTTP {response.status}'
+                        else:
+                            response.raise_for_status()
+                            klines = await response.json(loads=orjson.loads)
+                            return [kline_to_aggs(row) for row in klines]
+                except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                    error = repr(e)
+
+                if attempt == self.max_retries:
+                    raise RuntimeError(f'Binance: {symbol} [{tf}] klines failed after {attempt + 1} attempts: {error}')
+                delay = self._retry_delay(attempt, retry_after)
+                self.num_retries += 1
+                log.warning(f'Binance: {symbol} [{tf}] klines {error}, retrying in {delay:.2f}s')
+                await asyncio.sleep(delay)
+
+
 class AsyncBinanceBridge:
-    def __init__(self, client: UMFutures):
+    BASE_URL = 'https://fapi.binance.com'
+    # The futures API allows 2400 request weight per minute per IP, leave headroom for
+    # the synchronous client and websockets sharing it.
+    WEIGHT_LIMIT_PER_MINUTE = 2000
+    MAX_CONCURRENCY = 20
+    MAX_RETRIES = 5
+    BACKOFF = 0.5
+    TIMEOUT = 30
+
+    def __init__(
+            self,
+            client: UMFutures,
+            base_url: str = None,
+            proxy: Optional[str] = None,
+            max_concurrency: int = None,
+            weight_limit: int = None,
+            max_retries: int = None,
+            backoff: float = None,
+    ):
         super().__init__()
         self.client = client
         self.exchange_id = exchange.ID
+        self.base_url = base_url or self.BASE_URL
+        self.proxy = proxy
+        self.max_concurrency = max_concurrency or self.MAX_CONCURRENCY
+        self.weight_limit = weight_limit or self.WEIGHT_LIMIT_PER_MINUTE
+        self.max_retries = self.MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = self.BACKOFF if backoff is None else backoff
+        self._fetcher: Optional[BinanceKlineFetcher] = None
+
+    @asynccontextmanager
+    async def kline_fetcher(self) -> AsyncIterator[BinanceKlineFetcher]:
+        """
+        Session, semaphore and rate limiter are bound to the running event loop, so
+        they're created per scope. Nested scopes (`historical` inside
+        `bulk_query_historical`) share the outer one, so concurrent top level queries
+        should be batched through `bulk_query_historical`.
+        """
+        if self._fetcher is not None:
+            yield self._fetcher
+            return
+
+        timeout = aiohttp.ClientTimeout(total=self.TIMEOUT)
+        async with aiohttp.ClientSession(base_url=self.base_url, timeout=timeout) as session:
+            self._fetcher = BinanceKlineFetcher(
+                session,
+                WeightRateLimiter(self.weight_limit),
+                max_concurrency=self.max_concurrency,
+                max_retries=self.max_retries,
+                backoff=self.backoff,
+                proxy=self.proxy,
+            )
+            try:
+                yield self._fetcher
+            finally:
+                self._fetcher = None
 
     async def _fetch_aggs(
             self,
@@ -147,16 +319,8 @@ class AsyncBinanceBridge:
             end_date_ms: int
     ) -> list:
 
-        klines = self.client.continuous_klines(
-            symbol,
-            'PERPETUAL',
-            interval=exchange.INTERVALS[tf],
-            startTime=start_date_ms,
-            endTime=end_date_ms,
-            limit=1000
-        )
-        aggs = [kline_to_aggs(row) for row in klines]
-        return aggs
+        async with self.kline_fetcher() as fetcher:
+            return await fetcher.fetch(symbol, tf, start_date_ms, end_date_ms)
 
     async def historical(
             self,
@@ -170,28 +334,46 @@ class AsyncBinanceBridge:
         end_date = end_date or datetime.utcnow().replace(tzinfo=pytz.utc)
         end_date = end_date.replace(tzinfo=pytz.utc)
         chunks = build_datetime_index(start_date, end_date, tf)
-        aggs = []
-        for chunk in chunks:
-            start_date_ms, end_date_ms = [int(dt.timestamp() * 1000) for dt in chunk]
-            agg = await self._fetch_aggs(symbol, tf, start_date_ms, end_date_ms)
-            aggs.append(agg)
-
-        #     tasks.append(self._query_historical(symbol, timeframe, start_date_ms, end_date_ms))
-        # results = await asyncio.gather(*tasks)
-        # aggs = [item for sublist in results for item in sublist]
+        async with self.kline_fetcher():
+            tasks = []
+            for chunk in chunks:
+                start_date_ms, end_date_ms = [int(dt.timestamp() * 1000) for dt in chunk]
+                tasks.append(self._fetch_aggs(symbol, tf, start_date_ms, end_date_ms))
+            results = await asyncio.gather(*tasks)
+        aggs = [agg for chunk_aggs in results for agg in chunk_aggs]
         df = aggs_to_df(symbol, aggs)
         logging.info(f'Binance: {symbol} [{tf}] queried, {len(aggs)} records')
         return symbol, df
 
-    async def bulk_query_historical(self, historical_map: list[tuple[str, Timeframe, datetime]]):
+    async def bulk_query_historical(
+            self,
+            historical_map: list[tuple[str, Timeframe, datetime]]
+    ) -> list[tuple[str, pd.DataFrame]]:
+        """
+        Query every `(symbol, timeframe, start_date)` of `historical_map` concurrently.
+        A query that fails (after its retries) is logged and left out, the rest are
+        returned in `historical_map` order.
+        """
         s = perf_counter()
-        tasks = []
-        for symbol, timeframe, start_date in historical_map:
-            tasks.append(self.historical(symbol, tf=timeframe, start_date=start_date))
-        results = await asyncio.gather(*tasks)
+        async with self.kline_fetcher() as fetcher:
+            tasks = []
+            for symbol, timeframe, start_date in historical_map:
+                tasks.append(self.historical(symbol, tf=timeframe, start_date=start_date))
+            results = await asyncio.gather(*tasks, return_exceptions=True)
         elapsed = perf_counter() - s
-        log.info(f'Binance: {len(historical_map)} symbols queried in {elapsed * 1000:.4f} ms ({elapsed:.2f} s)')
-        return results
+
+        succeeded = []
+        for (symbol, timeframe, start_date), result in zip(historical_map, results):
+            if isinstance(result, Exception):
+                log.error(f'Binance: {symbol} [{timeframe}] from {start_date} failed: {result!r}')
+                continue
+            succeeded.append(result)
+        log.info(
+            f'Binance: {len(historical_map)} symbols queried in {elapsed * 1000:.4f} ms ({elapsed:.2f} s), '
+            f'{len(historical_map) - len(succeeded)} failed, '
+            f'{fetcher.num_requests} requests, {fetcher.num_retries} retries'
+        )
+        return succeeded
 
     def quotes(self) -> dict:
         return {rec['symbol']: float(rec['price']) for rec in self.client.ticker_price()}
@@ -288,4 +470,4 @@ class BinanceWebsocketBridge(WebsocketBridge):
 
 
 binance_bridge = BinanceBridge(client)
-async_binance_bridge = AsyncBinanceBridge(client)
+async_binance_bridge = AsyncBinanceBridge(client, proxy=proxies.get('https'))
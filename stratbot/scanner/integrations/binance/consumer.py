@@ -1,6 +1,5 @@
 import logging
 from collections import OrderedDict
-from datetime import datetime, timedelta, timezone
 from time import perf_counter
 
 import pandas as pd
@@ -20,15 +19,11 @@ class BinanceQuoteConsumer(BaseConsumer):
             EXCHANGE_ID,
             'BINANCE.markPriceUpdate',
             f'binance-quote-consumer',
+            track_quotes=True,
         )
-        self.last_update = datetime.now(tz=timezone.utc)
 
     async def process_message(self, symbol, msg):
-        quote = msg.get('p')
-        self.quotes[symbol] = quote
-        if datetime.now(tz=timezone.utc) - self.last_update > timedelta(seconds=1):
-            await self._bulk_update_quotes()
-            self.last_update = datetime.now(tz=timezone.utc)
+        self.quote_book.update(symbol, msg.get('p'))
 
 
 class BinanceCandleConsumer(BaseConsumer):
@@ -38,17 +33,15 @@ class BinanceCandleConsumer(BaseConsumer):
             EXCHANGE_ID,
             'BINANCE.continuous_kline1m',
             'binance-candle-consumer',
+            write_behind=True,
         )
 
-    async def process_message(self, key, msg):
-        if bar := await self.handle_tf_aggregate(msg):
-            if bar.get('kline_closed'):
-                historical_bar = self._to_historical_format(bar)
-                await self.bar_to_timescale(historical_bar, self.symbol_type)
-                # self.bar_queue.append(bar)
-        # if datetime.now() - self.last_update > timedelta(seconds=1):
-        #     await self._bulk_update_db()
-        #     self.last_update = datetime.utcnow()
+    async def process_batch(self, batch):
+        for key, msg in batch:
+            if bar := await self.handle_tf_aggregate(msg):
+                if bar.get('kline_closed'):
+                    historical_bar = self._to_historical_format(bar)
+                    self.bar_to_timescale(historical_bar, self.symbol_type)
 
     @staticmethod
     async def handle_tf_aggregate(msg) -> OrderedDict:
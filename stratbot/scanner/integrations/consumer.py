@@ -1,35 +1,192 @@
+import asyncio
 import logging
-from datetime import time, datetime, timedelta
+from dataclasses import dataclass
+from datetime import time, datetime
+from datetime import timezone as dt_timezone
 from time import perf_counter
+from typing import Optional
 
-import pandas as pd
 import pytz
 from asgiref.sync import sync_to_async
 from confluent_kafka import Consumer
 from django.conf import settings
-from django.db import IntegrityError, OperationalError
+from django.db import DataError, IntegrityError, OperationalError, models
 from django.utils import timezone
 from orjson import orjson
 
 from stratbot.scanner.models.symbols import SymbolType, SymbolRec
 from stratbot.scanner.models.pricerecs import StockPriceRec, CryptoPriceRec
+from stratbot.scanner.ops.quotes import QuoteBook
 
 log = logging.getLogger(__name__)
 
+NEW_YORK = pytz.timezone('America/New_York')
+
+
+@dataclass
+class WriteBehindStatistics:
+    rows_buffered: int = 0
+    rows_flushed: int = 0
+    rows_dropped: int = 0
+    flushes: int = 0
+    failed_flushes: int = 0
+    flush_seconds: float = 0.0
+
+    def __str__(self) -> str:
+        avg_ms = self.flush_seconds / self.flushes * 1000 if self.flushes else 0.0
+        return (
+            f'buffered {self.rows_buffered} rows, flushed {self.rows_flushed} in {self.flushes} flushes '
+            f'({self.failed_flushes} failed, {self.rows_dropped} rows dropped), {avg_ms:.2f} ms/flush'
+        )
+
+
+class WriteBehindBuffer:
+    """
+    Price records waiting to be inserted into `model`. The buffer is due for a flush once
+    it holds `max_rows` rows or its oldest row is `max_age` seconds old, and a flush
+    writes them all with one `bulk_create`. Existing rows (same unique key) are skipped.
+
+    If the database is unavailable the rows stay buffered, and the next flush waits
+    `min_retry_delay` seconds, doubling up to `max_retry_delay` while it keeps failing.
+    The buffer is `full` at `max_buffered` rows, and the consumer stops fetching until it
+    drains. A row the database rejects (bad data, a constraint) is found by splitting the
+    batch and dropped, so it doesn't hold up the rest.
+    """
+
+    def __init__(
+        self,
+        model: type[models.Model],
+        max_rows: int = 1000,
+        max_age: float = 1.0,
+        max_buffered: int = 50_000,
+        min_retry_delay: float = 0.5,
+        max_retry_delay: float = 30.0,
+    ):
+        self.model = model
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.max_buffered = max_buffered
+        self.min_retry_delay = min_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.stats = WriteBehindStatistics()
+        self._rows: list[dict] = []
+        self._oldest: Optional[float] = None
+        self._retry_delay = 0.0
+        self._retry_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, row: dict) -> None:
+        if not self._rows:
+            self._oldest = perf_counter()
+        self._rows.append(row)
+        self.stats.rows_buffered += 1
+
+    def full(self) -> bool:
+        return len(self._rows) >= self.max_buffered
+
+    def due(self) -> bool:
+        if not self._rows:
+            return False
+        now = perf_counter()
+        if self._retry_at is not None and now < self._retry_at:
+            return False
+        return len(self._rows) >= self.max_rows or now - self._oldest >= self.max_age
+
+    def flush(self) -> bool:
+        """
+        Insert the buffered rows. Returns False, keeping them and backing off, if the
+        database is unavailable.
+        """
+        if not self._rows:
+            return True
+        s = perf_counter()
+        rows = self._rows
+        try:
+            dropped = self._insert(rows)
+        except OperationalError as e:
+            self.stats.failed_flushes += 1
+            self._retry_delay = min(max(self._retry_delay * 2, self.min_retry_delay), self.max_retry_delay)
+            self._retry_at = perf_counter() + self._retry_delay
+            log.error(
+                f'{self.model.__name__}: failed to flush {len(rows)} rows, retrying in {self._retry_delay:.1f} s: {e}'
+            )
+            return False
+        self._rows = []
+        self._oldest = None
+        self._retry_delay = 0.0
+        self._retry_at = None
+        self.stats.flushes += 1
+        self.stats.rows_flushed += len(rows) - dropped
+        self.stats.rows_dropped += dropped
+        self.stats.flush_seconds += perf_counter() - s
+        return True
+
+    def _insert(self, rows: list[dict]) -> int:
+        """
+        `bulk_create` `rows`, splitting them in halves while the database rejects them
+        until the bad rows are isolated and dropped. Returns the number dropped. Halves
+        written before an `OperationalError` are skipped as existing rows on the retry.
+        """
+        try:
+            self.model.objects.bulk_create([self.model(**row) for row in rows], ignore_conflicts=True)
+        except (DataError, IntegrityError) as e:
+            if len(rows) == 1:
+                log.error(f'{self.model.__name__}: dropping {rows[0]}: {e}')
+                return 1
+            middle = len(rows) // 2
+            return self._insert(rows[:middle]) + self._insert(rows[middle:])
+        return 0
+
 
 class BaseConsumer:
-    def __init__(self, symbol_type: SymbolType, exchange_id: str, topic: str, group_id: str):
+    """
+    Consumes `topic` in batches of up to `batch_size` messages, waiting at most
+    `batch_timeout` seconds for a batch to fill, and hands each decoded batch to
+    `process_batch`.
+
+    With `write_behind`, price records are collected in a `WriteBehindBuffer` instead of
+    being inserted one by one. Offsets are then committed by hand, and only once every
+    consumed message's rows have been flushed, so a crash replays the unflushed bars
+    instead of losing them. While the buffer is full the assigned partitions are paused,
+    and they're still polled so the consumer keeps its place in the group.
+
+    With `track_quotes`, `process_message` records prices in a `QuoteBook` and the
+    changed ones are written every `quote_flush_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        symbol_type: SymbolType,
+        exchange_id: str,
+        topic: str,
+        group_id: str,
+        batch_size: int = 500,
+        batch_timeout: float = 0.1,
+        write_behind: bool = False,
+        track_quotes: bool = False,
+        quote_flush_interval: float = 1.0,
+    ):
         self.symbol_type = symbol_type
         self.exchange_id = exchange_id
         self.topic = topic
         self.group_id = group_id
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.write_behind = write_behind
         self._set_consumer()
 
         self.symbolrecs = SymbolRec.objects.filter(symbol_type=self.symbol_type)
         self.symbols = set(self.symbolrecs.values_list('symbol', flat=True))
         self.pricerec_model = StockPriceRec if symbol_type == SymbolType.STOCK else CryptoPriceRec
+        self.buffer = WriteBehindBuffer(self.pricerec_model) if write_behind else None
+        self.quote_book = QuoteBook(self.symbol_type, self.symbols) if track_quotes else None
+        self.quote_flush_interval = quote_flush_interval
         self.last_symbol_refresh = timezone.now()
-        self.quotes = {}
+        self._last_quote_flush = perf_counter()
+        self._uncommitted = 0
+        self._paused = False
 
     def _set_consumer(self):
         conf = {
@@ -39,72 +196,106 @@ class BaseConsumer:
             'sasl.username': settings.REDPANDA_USERNAME,
             'sasl.password': settings.REDPANDA_PASSWORD,
             'group.id': self.group_id,
-            'auto.offset.reset': 'latest'
+            'auto.offset.reset': 'latest',
+            'enable.auto.commit': not self.write_behind,
         }
         self.consumer = Consumer(**conf)
 
     @sync_to_async
-    def _save_pricerec_to_db(self, parsed_bar):
-        try:
-            self.pricerec_model.objects.create(**parsed_bar)
-        except (IntegrityError, OperationalError):
-            pass
+    def _flush_buffer(self) -> bool:
+        return self.buffer.flush()
 
     @sync_to_async
-    def _bulk_update_quotes(self):
-        for symbolrec in self.symbolrecs:
-            if symbolrec.symbol not in self.quotes:
-                continue
-            symbolrec.price = self.quotes[symbolrec.symbol]
-            symbolrec.as_of = timezone.now()
-        SymbolRec.objects.bulk_update(self.symbolrecs, ['price', 'as_of'])
-        log.info(f'{self.exchange_id}: updated {len(self.quotes)} {self.symbol_type} quotes')
-        self.quotes = {}
-
-    async def bar_to_timescale(self, bar, symbol_type: SymbolType):
-        # timestamp = datetime.fromtimestamp(bar['timestamp'] / 1000.0)
-        # if timestamp < datetime.now() - timedelta(hours=1):
-        #     return
-        s = perf_counter()
-        bar['time'] = pd.to_datetime(bar['timestamp'], unit='ms', utc=True)
-        dt = bar['time'].tz_convert(pytz.timezone('America/New_York'))
-        rth = time(9, 30) <= dt.time() < time(16, 0)
-        if symbol_type == SymbolType.STOCK and not rth:
-            logging.debug(f'bar_to_timescale: skipping {bar["symbol"]}, outside of RTH')
-            return
+    def _flush_quotes(self) -> int:
+        return self.quote_book.flush()
+
+    def bar_to_timescale(self, bar, symbol_type: SymbolType) -> bool:
+        """
+        Buffer a bar (`timestamp` in ms) as a price record. Returns False if it was
+        skipped, stock bars outside regular trading hours aren't kept.
+        """
+        bar['time'] = datetime.fromtimestamp(bar.pop('timestamp') / 1000.0, tz=dt_timezone.utc)
+        if symbol_type == SymbolType.STOCK:
+            dt = bar['time'].astimezone(NEW_YORK)
+            if not time(9, 30) <= dt.time() < time(16, 0):
+                log.debug(f'bar_to_timescale: skipping {bar["symbol"]}, outside of RTH')
+                return False
         if symbol_type == SymbolType.CRYPTO:
             bar['exchange'] = self.exchange_id
-
-        del bar['timestamp']
-        symbol = bar.get('symbol')
-        await self._save_pricerec_to_db(bar)
-        elapsed = perf_counter() - s
-        log.info(f'write timeseries bar for [{symbol}] in {elapsed * 1000:.4f} ms ({elapsed:.2f} s)')
+        self.buffer.add(bar)
+        return True
 
     @staticmethod
-    async def handle_message(msg):
-        key = msg.key().decode('utf-8') if msg.key() else None
-        # value = msg.value().decode('utf-8')
-        # value_json = json.loads(value)
-        value = orjson.loads(msg.value())
-        log.debug(f'{key=}: {value}')
-        return key, value
+    def decode_messages(msgs) -> list[tuple]:
+        batch = []
+        for msg in msgs:
+            if msg.error():
+                log.error('{}'.format(msg.error()))
+                continue
+            key = msg.key().decode('utf-8') if msg.key() else None
+            batch.append((key, orjson.loads(msg.value())))
+        return batch
+
+    async def process_batch(self, batch: list[tuple]):
+        for key, value in batch:
+            await self.process_message(key, value)
 
     async def process_message(self, key, msg):
         ...
 
+    async def flush(self) -> None:
+        """
+        Write the changed quotes every `quote_flush_interval` seconds. Flush the
+        write-behind buffer if it's due, then commit the consumed offsets once nothing
+        consumed is still waiting to be written.
+        """
+        if self.quote_book is not None and perf_counter() - self._last_quote_flush >= self.quote_flush_interval:
+            self._last_quote_flush = perf_counter()
+            if await self._flush_quotes():
+                log.info(f'{self.exchange_id}: {self.quote_book.stats}')
+        if self.buffer is None:
+            return
+        if self.buffer.due():
+            s = perf_counter()
+            rows = len(self.buffer)
+            if await self._flush_buffer():
+                elapsed = perf_counter() - s
+                log.info(f'wrote {rows} {self.symbol_type} bars in {elapsed * 1000:.4f} ms ({elapsed:.2f} s)')
+        if not self.buffer and self._uncommitted:
+            self.consumer.commit(asynchronous=False)
+            self._uncommitted = 0
+
+    def pause_while_full(self) -> None:
+        """
+        Pause the assigned partitions while the write-behind buffer is full, again on
+        every batch so partitions assigned by a rebalance are paused too, and resume them
+        once it has drained.
+        """
+        if self.buffer is None:
+            return
+        if self.buffer.full():
+            if not self._paused:
+                log.warning(f'{self.exchange_id}: {len(self.buffer)} bars buffered, pausing {self.topic}')
+                self._paused = True
+            self.consumer.pause(self.consumer.assignment())
+        elif self._paused:
+            log.info(f'{self.exchange_id}: buffer drained, resuming {self.topic}')
+            self.consumer.resume(self.consumer.assignment())
+            self._paused = False
+
+    async def consume_batch(self) -> int:
+        self.pause_while_full()
+        msgs = await asyncio.to_thread(self.consumer.consume, self.batch_size, self.batch_timeout)
+        self._uncommitted += len(msgs)
+        if batch := self.decode_messages(msgs):
+            await self.process_batch(batch)
+        await self.flush()
+        return len(msgs)
+
     async def run(self):
         log.info('Kafka Consumer has been initiated...')
         available_topics = self.consumer.list_topics().topics
         log.info(f'Available topics to consume: {len(available_topics)}')
         self.consumer.subscribe([self.topic])
         while True:
-            msg = self.consumer.poll(0.001)
-            if msg is None:
-                continue
-            if msg.error():
-                log.error('{}'.format(msg.error()))
-                continue
-            else:
-                key, value = await self.handle_message(msg)
-                await self.process_message(key, value)
+            await self.consume_batch()
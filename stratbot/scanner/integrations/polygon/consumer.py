@@ -1,6 +1,5 @@
 import logging
 from collections import OrderedDict
-from datetime import datetime, timedelta, timezone
 
 from stratbot.scanner.integrations.consumer import BaseConsumer
 from stratbot.scanner.models.symbols import SymbolType
@@ -16,15 +15,11 @@ class PolygonQuoteConsumer(BaseConsumer):
             EXCHANGE_ID,
             f'{EXCHANGE_ID}.FMV',
             f'polygon-quote-consumer',
+            track_quotes=True,
         )
-        self.last_update = datetime.now(tz=timezone.utc)
 
     async def process_message(self, symbol, msg):
-        quote = msg.get('fmv')
-        self.quotes[symbol] = quote
-        if datetime.now() - self.last_update > timedelta(seconds=1):
-            await self._bulk_update_quotes()
-            self.last_update = datetime.utcnow()
+        self.quote_book.update(symbol, msg.get('fmv'))
 
 
 class PolygonCandleConsumer(BaseConsumer):
@@ -37,13 +32,14 @@ class PolygonCandleConsumer(BaseConsumer):
             EXCHANGE_ID,
             f'{EXCHANGE_ID}.AM',
             'polygon-candle-consumer',
+            write_behind=True,
         )
 
     async def process_message(self, symbol, msg):
         log.debug(f'{symbol}: {msg}')
         if bar := await self.handle_tf_aggregate(msg):
             historical_bar = self._convert_to_historial_format(bar)
-            await self.bar_to_timescale(historical_bar, self.symbol_type)
+            self.bar_to_timescale(historical_bar, self.symbol_type)
 
     @staticmethod
     async def handle_tf_aggregate(msg) -> OrderedDict:
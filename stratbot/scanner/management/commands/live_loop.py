@@ -24,6 +24,22 @@ class Command(BaseCommand):
             action="store_true",
             help="Run the loop for crypto.",
         )
+        parser.add_argument(
+            "--columnar",
+            action="store_true",
+            help="Evaluate setups in one batched pass instead of one at a time.",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Refresh symbols and setups from deltas instead of full rebuilds.",
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=1,
+            help="Partition symbols across this many worker processes.",
+        )
 
     def handle(self, *args, **options):
         run_stocks = options.get("stocks")
@@ -33,11 +49,20 @@ class Command(BaseCommand):
                 "Must provide exactly one of --stocks or --crypto when running this "
                 "command."
             )
+        num_shards = options["shards"]
+        if num_shards < 1:
+            raise CommandError("--shards must be at least 1.")
+
+        loop_kwargs = {
+            "columnar": bool(options.get("columnar")),
+            "incremental": bool(options.get("incremental")),
+            "num_shards": num_shards,
+        }
 
         loop: StocksLoop | CryptoLoop
         if run_stocks:
-            loop = StocksLoop()
+            loop = StocksLoop(**loop_kwargs)
         else:
-            loop = CryptoLoop()
+            loop = CryptoLoop(**loop_kwargs)
 
         loop.run()
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("scanner", "0014_symbolrec_is_etf"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="setup",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name="Updated At"),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("scanner", "0015_setup_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="livelooprun",
+            name="num_quotes",
+            field=models.PositiveIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="livelooprun",
+            name="quotes_refresh_duration",
+            field=models.FloatField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="livelooprun",
+            name="quotes_version",
+            field=models.PositiveBigIntegerField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("scanner", "0016_livelooprun_quotes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="livelooprun",
+            name="market_snapshot_fetch_duration",
+            field=models.FloatField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="livelooprun",
+            name="market_snapshot_hits",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="livelooprun",
+            name="market_snapshot_misses",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="livelooprun",
+            name="market_snapshot_symbols",
+            field=models.PositiveIntegerField(blank=True, default=None, null=True),
+        ),
+    ]
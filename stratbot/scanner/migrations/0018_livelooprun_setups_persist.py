@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("scanner", "0017_livelooprun_market_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="livelooprun",
+            name="num_negated_reasons_written",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="livelooprun",
+            name="setups_persist_duration",
+            field=models.FloatField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -1,8 +1,11 @@
 import logging
+import time as time_module
+from dataclasses import dataclass
 from datetime import datetime, timedelta, time
 from functools import cached_property
-from typing import Final
+from typing import Final, Optional
 
+import numpy as np
 import pytz
 from django.core.cache import caches
 import pandas as pd
@@ -16,6 +19,84 @@ logger = logging.getLogger(__name__)
 
 MARKET_TIMEZONE: Final = pytz.timezone("America/New_York")
 
+Session = tuple[pd.Timestamp, pd.Timestamp]
+
+
+def _to_ns(dt: datetime) -> int:
+    # Naive datetimes are UTC, the same as `datetime.utcnow()` callers expect.
+    return pd.Timestamp(dt).value
+
+
+def _from_ns(value: int) -> pd.Timestamp:
+    return pd.Timestamp(value, tz=pytz.UTC)
+
+
+@dataclass(frozen=True)
+class SessionIndex:
+    """
+    Open and close times of one schedule as sorted int64 (UTC epoch ns) arrays, so
+    session lookups are a binary search instead of a boolean mask over the schedule.
+    """
+    opens: np.ndarray
+    closes: np.ndarray
+
+    @classmethod
+    def from_schedule(
+        cls,
+        df: pd.DataFrame,
+        open_column: str = 'market_open',
+        close_column: str = 'market_close',
+    ) -> 'SessionIndex':
+        # Resampled schedules have NaT rows for periods without a session.
+        df = df[[open_column, close_column]].dropna().sort_values(open_column)
+        return cls(
+            opens=pd.DatetimeIndex(df[open_column]).as_unit('ns').asi8.copy(),
+            closes=pd.DatetimeIndex(df[close_column]).as_unit('ns').asi8.copy(),
+        )
+
+    def __len__(self) -> int:
+        return len(self.opens)
+
+    def _session(self, i: int) -> Session:
+        return _from_ns(self.opens[i]), _from_ns(self.closes[i])
+
+    def next_session_after(self, dt: datetime, inclusive: bool = False) -> Optional[Session]:
+        """
+        First session opening after `dt` (or at `dt` when `inclusive`).
+        """
+        i = np.searchsorted(self.opens, _to_ns(dt), side='left' if inclusive else 'right')
+        return self._session(i) if i < len(self.opens) else None
+
+    def next_open_after(self, dt: datetime, inclusive: bool = False) -> Optional[pd.Timestamp]:
+        session = self.next_session_after(dt, inclusive=inclusive)
+        return session[0] if session else None
+
+    def last_session_before(self, dt: datetime) -> Optional[Session]:
+        """
+        Last session that opened strictly before `dt`, whether or not it has closed.
+        """
+        i = np.searchsorted(self.opens, _to_ns(dt), side='left') - 1
+        return self._session(i) if i >= 0 else None
+
+    def session_containing(self, dt: datetime) -> Optional[Session]:
+        """
+        Session with `open <= dt <= close`.
+        """
+        ns = _to_ns(dt)
+        i = np.searchsorted(self.opens, ns, side='right') - 1
+        if i >= 0 and ns <= self.closes[i]:
+            return self._session(i)
+        return None
+
+    def is_open(self, dt: datetime) -> bool:
+        """
+        Whether `dt` falls in a session, with the close excluded like
+        `pandas_market_calendars`' `open_at_time`.
+        """
+        ns = _to_ns(dt)
+        i = np.searchsorted(self.opens, ns, side='right') - 1
+        return bool(i >= 0 and ns < self.closes[i])
+
 
 class ExchangeCalendar:
     """
@@ -36,6 +117,10 @@ class ExchangeCalendar:
         Timeframe.YEARS_1,
     }
 
+    # How often a process checks whether `cache_schedules` has published new schedules
+    # since its session indexes were built.
+    SESSION_INDEX_CHECK_INTERVAL: Final = timedelta(minutes=5)
+
     def __init__(self, exchange_name: str = 'NYSE', start_date: datetime = None, end_date: datetime = None):
         self.cache = caches['markets']
         self.exchange_name = exchange_name
@@ -43,6 +128,9 @@ class ExchangeCalendar:
         self.schedule_cache_key = f'{self.exchange_name}_SCHEDULE'
         self.start_date = start_date or datetime.now() - timedelta(days=14)
         self.end_date = end_date or self.start_date + timedelta(days=365)
+        self._session_indexes: dict[tuple[str, bool], SessionIndex] = {}
+        self._session_indexes_version = None
+        self._session_indexes_checked_at = None
 
     def __repr__(self):
         return f'<{self.__class__.__name__}: {self.exchange_name}>'
@@ -84,6 +172,30 @@ class ExchangeCalendar:
         for timeframe in self.SCHEDULE_TIMEFRAMES:
             schedule = self.schedule(timeframe, from_cache=False)
             self._cache_schedule(schedule, timeframe)
+        # Other processes rebuild their session indexes when they see a new version.
+        self.cache.set(f'{self.schedule_cache_key}:version', time_module.time_ns(), timeout=None)
+        self._session_indexes.clear()
+
+    def session_index(self, timeframe: str, only_rth: bool = True) -> SessionIndex:
+        """
+        In-process `SessionIndex` for a schedule, built from the cached schedule on first
+        use and rebuilt after `cache_schedules` runs (checked every
+        `SESSION_INDEX_CHECK_INTERVAL`).
+        """
+        now = time_module.monotonic()
+        checked_at = self._session_indexes_checked_at
+        if checked_at is None or now - checked_at >= self.SESSION_INDEX_CHECK_INTERVAL.total_seconds():
+            self._session_indexes_checked_at = now
+            version = self.cache.get(f'{self.schedule_cache_key}:version')
+            if version != self._session_indexes_version:
+                self._session_indexes_version = version
+                self._session_indexes.clear()
+
+        key = (timeframe, only_rth)
+        if (index := self._session_indexes.get(key)) is None:
+            columns = ('market_open', 'market_close') if only_rth else ('pre', 'post')
+            index = self._session_indexes[key] = SessionIndex.from_schedule(self.schedule(timeframe), *columns)
+        return index
 
     def schedule(self, timeframe: str, from_cache: bool = True) -> pd.DataFrame:
         assert timeframe in self.SCHEDULE_TIMEFRAMES
@@ -144,7 +256,7 @@ class ExchangeCalendar:
             )
             if is_weekend or not_market_hours:
                 return False
-            is_open = self.calendar.open_at_time(self.schedule(Timeframe.DAYS_1), dt, only_rth=only_rth)
+            is_open = self.session_index(Timeframe.DAYS_1, only_rth=only_rth).is_open(dt)
         except (IndexError, ValueError):
             is_open = False
         return is_open
@@ -158,7 +270,7 @@ class ExchangeCalendar:
         ny_time = dt.astimezone(pytz.timezone('America/New_York')).time()
         premarket_hours = time(4, 0) <= ny_time < time(9, 30)
         if premarket_hours:
-            is_open = self.calendar.open_at_time(self.schedule(Timeframe.DAYS_1), dt, only_rth=False)
+            is_open = self.session_index(Timeframe.DAYS_1, only_rth=False).is_open(dt)
             return is_open
         return False
 
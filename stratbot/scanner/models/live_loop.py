@@ -43,6 +43,15 @@ class LiveLoopRun(models.Model):
         blank=True, null=True, default=None
     )
     num_price_records = models.PositiveIntegerField(blank=True, null=True, default=None)
+    quotes_refresh_duration = models.FloatField(blank=True, null=True, default=None)
+    num_quotes = models.PositiveIntegerField(blank=True, null=True, default=None)
+    quotes_version = models.PositiveBigIntegerField(blank=True, null=True, default=None)
+    market_snapshot_fetch_duration = models.FloatField(blank=True, null=True, default=None)
+    market_snapshot_symbols = models.PositiveIntegerField(blank=True, null=True, default=None)
+    market_snapshot_hits = models.PositiveBigIntegerField(default=0)
+    market_snapshot_misses = models.PositiveBigIntegerField(default=0)
+    setups_persist_duration = models.FloatField(blank=True, null=True, default=None)
+    num_negated_reasons_written = models.PositiveBigIntegerField(default=0)
     num_setups_examined = models.PositiveBigIntegerField()
     num_setups_updated = models.PositiveBigIntegerField()
     num_setups_triggered = models.PositiveBigIntegerField()
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import logging
-import pickle
 import uuid
 from dataclasses import dataclass, asdict
 from functools import cached_property
@@ -31,6 +30,8 @@ from .pricerecs import (
 from .timeframes import Timeframe, TIMEFRAMES_INTRADAY
 from v1.perf import func_timer
 from ..ops.candles.candlepair import CandlePair
+from ..ops.candles.columnar import candles_from_bytes
+from ..ops.candles.levels import CandleLevels
 
 logger = logging.getLogger(__name__)
 
@@ -306,17 +307,8 @@ class SymbolRec(models.Model):
         if tf not in self.scan_timeframes:
             raise ValueError(f'invalid timeframe. valid timeframes: {self.scan_timeframes}')
 
-        df_bytes = r.get(f'df:{self.symbol_type}:{self.symbol}:{tf}')
-        df = pickle.loads(df_bytes) if df_bytes else pd.DataFrame()
-        df.rename(columns={
-            'o': 'open',
-            'h': 'high',
-            'l': 'low',
-            'c': 'close',
-            'v': 'volume',
-        }, inplace=True)
-
-        return metrics.stratify_df(df)
+        # Cached frames are already stratified, see `ops.candles.columnar`.
+        return candles_from_bytes(r.get(f'df:{self.symbol_type}:{self.symbol}:{tf}'))
 
     @cached_property
     def one(self):
@@ -388,8 +380,9 @@ class SymbolRec(models.Model):
         tf_bars = r.json().get(f'barHistory:{self.symbol_type}:{self.symbol}')
         return {tf: bars[-1]['o'] for tf, bars in tf_bars.items() if tf in timeframes}
 
-    def tfc_state(self, timeframes: list = None) -> dict:
+    def tfc_state(self, timeframes: list = None, price: float = None) -> dict:
         timeframes = timeframes or self.tfc_timeframes
+        price = self.price if price is None else price
         opening_prices = self.opening_prices(timeframes)
         tfc_table = {}
         for tf in timeframes:
@@ -397,7 +390,7 @@ class SymbolRec(models.Model):
                 open_price = opening_prices[tf]
             except KeyError:
                 continue
-            distance_usd = self.price - open_price
+            distance_usd = price - open_price
             distance_ratio = round(distance_usd / open_price, 5)
             distance_percent = round(distance_ratio, 5)
             color = 'green' if distance_ratio > 0 else 'red' if distance_ratio < 0 else 'white'
@@ -458,26 +451,26 @@ class SymbolRec(models.Model):
         expires = timestamp + self.CANDLE_EXPIRE_DELTAS[tf]
 
         if tf in TIMEFRAMES_INTRADAY and self.exchange_calendar.is_closed(dt=expires):
-            schedule = self.exchange_calendar.schedule(Timeframe.DAYS_1)
-            mask = schedule['market_open'] > expires
-            schedule = schedule[mask].head(1)
-            expires = schedule['market_open'].iloc[0] + self.CANDLE_EXPIRE_DELTAS[tf]
+            market_open = self.exchange_calendar.session_index(Timeframe.DAYS_1).next_open_after(expires)
+            if market_open is None:
+                raise IndexError(f'no session after {expires} in the {Timeframe.DAYS_1} schedule')
+            expires = market_open + self.CANDLE_EXPIRE_DELTAS[tf]
 
         elif tf in TIMEFRAMES_INTRADAY:
             expires = expires + self.CANDLE_EXPIRE_DELTAS[tf]
 
         elif tf == Timeframe.DAYS_1:
-            schedule = self.exchange_calendar.schedule(tf)
-            mask = schedule['market_open'] >= expires
-            schedule = schedule[mask].head(1)
-            expires = schedule['market_close'].iloc[0]
+            session = self.exchange_calendar.session_index(tf).next_session_after(expires, inclusive=True)
+            if session is None:
+                raise IndexError(f'no session from {expires} in the {tf} schedule')
+            expires = session[1]
 
         elif tf in (Timeframe.WEEKS_1, Timeframe.MONTHS_1, Timeframe.QUARTERS_1, Timeframe.YEARS_1):
             expires = expires + self.CANDLE_EXPIRE_DELTAS[tf]
-            schedule = self.exchange_calendar.schedule(tf)
-            mask = schedule['market_open'] < expires
-            schedule = schedule[mask].tail(1)
-            expires = schedule['market_close'].iloc[0]
+            session = self.exchange_calendar.session_index(tf).last_session_before(expires)
+            if session is None:
+                raise IndexError(f'no session before {expires} in the {tf} schedule')
+            expires = session[1]
 
         return expires
 
@@ -488,11 +481,7 @@ class SymbolRec(models.Model):
                 return True
 
         if tf in {Timeframe.WEEKS_1, Timeframe.MONTHS_1, Timeframe.QUARTERS_1, Timeframe.YEARS_1}:
-            schedule = self.exchange_calendar.schedule(tf)
-            current_datetime = timezone.now()
-            filtered_schedule = schedule[(schedule['market_open'] <= current_datetime) & (
-                    schedule['market_close'] >= current_datetime)]
-            if not filtered_schedule.empty:
+            if self.exchange_calendar.session_index(tf).session_containing(timezone.now()) is not None:
                 return True
 
         elif self.symbol_type == SymbolType.STOCK and self.exchange_calendar.is_open():
@@ -548,8 +537,9 @@ class SymbolRec(models.Model):
             if candle_pair.trigger_candle.strat_id == '3':
                 continue
 
+            levels = CandleLevels.from_df(df)
             for direction in self.TRADE_DIRECTIONS[candle_pair.trigger_candle.strat_id]:
-                builder = SetupBuilder(self, tf, direction, df)
+                builder = SetupBuilder(self, tf, direction, df, levels=levels)
                 setup = (
                     builder
                     .with_candle_pair(candle_pair)
@@ -599,9 +589,12 @@ class SetupBuilder:
         tf: Timeframe,
         direction: int,
         df: pd.DataFrame,
+        levels: Optional[CandleLevels] = None,
     ):
         self.symbolrec = symbolrec
         self.df = df
+        # Shared by every builder on the same frame, see `SymbolRec.scan_strat_setups`.
+        self.levels = levels if levels is not None else CandleLevels.from_df(df)
         timestamp = df.iloc[-1].name
         expires = symbolrec.get_setup_expiration(tf, timestamp)
         self.setup = Setup(symbol_rec=symbolrec, tf=tf, direction=direction, timestamp=timestamp, expires=expires)
@@ -611,25 +604,7 @@ class SetupBuilder:
         self.is_valid = True
 
     def find_targets(self, target):
-        direction = self.setup.direction
-        column = self.high_or_low
-
-        condition = (self.df[column] >= target) if direction == 1 else (self.df[column] <= target)
-        filtered = self.df.loc[condition, column].sort_index(ascending=False)
-
-        potential_targets = filtered[abs((filtered - self.setup.trigger) / self.setup.trigger) >= 0.001]
-
-        targets = []
-        for value in potential_targets:
-            if targets:
-                if (direction == 1 and value <= targets[-1]) or (direction == -1 and value >= targets[-1]):
-                    continue
-            targets.append(value)
-
-            if len(targets) == 5:
-                break
-
-        return targets
+        return self.levels.targets(target, self.setup.trigger, self.setup.direction)
 
     def with_candle_pair(self, candle_pair):
         self.candle_pair = candle_pair
@@ -688,17 +663,15 @@ class SetupBuilder:
             self.setup.rr = 0.0
             return self
 
-        trigger = Decimal(str(self.setup.trigger))
-        target = Decimal(str(self.setup.targets[0]))
-        stop = self.candle_pair.stop
-
-        self.setup.rr = self.symbolrec.calculate_rr(trigger, target, stop)
+        self.setup.rr = float(metrics.risk_reward(
+            self.setup.trigger, self.setup.targets[0], float(self.candle_pair.stop)
+        ))
         if self.setup.rr < rr_min:
             self.is_valid = False
         return self
 
     def with_pmg(self):
-        _, self.setup.pmg = metrics.is_pmg(self.df, self.setup.direction, threshold=0)
+        self.setup.pmg = self.levels.pmg(self.setup.direction)
         return self
 
     def build(self):
@@ -777,6 +750,7 @@ class Setup(DirtyFieldsMixin, models.Model):
     gapped = models.BooleanField("Gapped?", default=False)
     negated = models.BooleanField("Negated", default=False)
     negated_reasons = models.ManyToManyField(NegatedReason, blank=True)
+    updated_at = models.DateTimeField("Updated At", auto_now=True, db_index=True)
     # objects = DataFrameManager()
 
     class Meta:
@@ -1,6 +1,7 @@
 from decimal import Decimal
 from dataclasses import dataclass
 
+import numpy as np
 import pandas as pd
 
 
@@ -145,6 +146,39 @@ class CandlePair:
         midprice = high - ((high - low) / 2)
         return Decimal(str(midprice))
 
+
+def prioritize_setups(
+    target_strat_id: np.ndarray,
+    trigger_strat_id: np.ndarray,
+    trigger_shape: np.ndarray,
+    trigger_green: np.ndarray,
+    trigger_red: np.ndarray,
+) -> np.ndarray:
+    """
+    `CandlePair.prioritize_setup` for many candle pairs at once. The arguments are
+    parallel arrays with one entry per pair, 0 stands in for `None`.
+    """
+    trigger_2u = trigger_strat_id == '2U'
+    trigger_2d = trigger_strat_id == '2D'
+    shooter = trigger_shape == 'shooter'
+    hammer = trigger_shape == 'hammer'
+    conditions = [
+        trigger_2u & shooter & ~trigger_green & trigger_red,
+        trigger_2d & hammer & trigger_green & ~trigger_red,
+        (target_strat_id == '1') & (trigger_strat_id == '1'),
+        trigger_2u & shooter,
+        trigger_2d & hammer,
+        trigger_2u & ~trigger_green & trigger_red,
+        trigger_2d & trigger_green & ~trigger_red,
+        trigger_2u | trigger_2d | (trigger_strat_id == '3'),
+        target_strat_id == '1',
+        trigger_strat_id == '1',
+        target_strat_id == '3',
+    ]
+    choices = [1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3]
+    return np.select(conditions, choices, default=0)
+
+
 # def candle_pair_from_dict(trigger_candle: dict, target_candle: dict) -> CandlePair:
 #     key_mapping = {
 #         'ts': 'time',
@@ -0,0 +1,136 @@
+"""
+Binary columnar encoding for candle DataFrames cached in Redis.
+
+    b"SCF1" | uint32 header length | JSON header | padding | column buffers
+
+Columns are fixed-width buffers aligned to 8 bytes, the DatetimeIndex is int64 epoch
+values and categorical (or object) columns are stored as integer codes with their
+categories in the header. Frames are written already stratified and decoded as
+`np.frombuffer` views, so they come back read-only.
+"""
+from __future__ import annotations
+
+import pickle
+from typing import Final, Optional
+
+import msgspec
+import numpy as np
+import pandas as pd
+
+from . import metrics
+
+
+MAGIC: Final = b"SCF1"
+_ALIGNMENT: Final = 8
+_PREAMBLE_SIZE: Final = len(MAGIC) + 4
+
+SHORT_COLUMN_NAMES: Final[dict[str, str]] = {
+    'o': 'open',
+    'h': 'high',
+    'l': 'low',
+    'c': 'close',
+    'v': 'volume',
+}
+
+
+def _padding(size: int) -> int:
+    return -size % _ALIGNMENT
+
+
+def dumps_df(df: pd.DataFrame) -> bytes:
+    index = df.index
+    if isinstance(index, pd.DatetimeIndex):
+        index_meta = {
+            'name': index.name,
+            'tz': str(index.tz) if index.tz is not None else None,
+            'unit': index.unit,
+        }
+        buffers = [index.asi8]
+    elif isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1:
+        index_meta = None
+        buffers = []
+    else:
+        raise TypeError(f'unsupported index type for columnar encoding: {type(index).__name__}')
+
+    columns_meta = []
+    for name, series in df.items():
+        meta = {'name': name}
+        if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object:
+            categorical = series.astype('category')
+            meta['categories'] = categorical.cat.categories.tolist()
+            values = categorical.cat.codes.to_numpy()
+        else:
+            values = series.to_numpy()
+        meta['dtype'] = values.dtype.str
+        columns_meta.append(meta)
+        buffers.append(values)
+
+    offset = 0
+    offsets = []
+    for values in buffers:
+        offsets.append(offset)
+        offset += values.nbytes + _padding(values.nbytes)
+    if index_meta is not None:
+        index_meta['offset'] = offsets.pop(0)
+    for meta, column_offset in zip(columns_meta, offsets):
+        meta['offset'] = column_offset
+
+    header = msgspec.json.encode({'rows': len(df), 'index': index_meta, 'columns': columns_meta})
+    preamble = MAGIC + len(header).to_bytes(4, 'little') + header
+    parts = [preamble, b'\0' * _padding(len(preamble))]
+    for values in buffers:
+        parts.append(np.ascontiguousarray(values).tobytes())
+        parts.append(b'\0' * _padding(values.nbytes))
+    return b''.join(parts)
+
+
+def loads_df(data: bytes) -> pd.DataFrame:
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('not a columnar encoded DataFrame')
+
+    header_size = int.from_bytes(data[len(MAGIC):_PREAMBLE_SIZE], 'little')
+    header = msgspec.json.decode(data[_PREAMBLE_SIZE:_PREAMBLE_SIZE + header_size])
+    data_start = _PREAMBLE_SIZE + header_size
+    data_start += _padding(data_start)
+    rows = header['rows']
+
+    def view(dtype: str, offset: int) -> np.ndarray:
+        return np.frombuffer(data, dtype=np.dtype(dtype), count=rows, offset=data_start + offset)
+
+    index = None
+    if (index_meta := header['index']) is not None:
+        values = view('<i8', index_meta['offset']).view(f"M8[{index_meta['unit']}]")
+        index = pd.DatetimeIndex(values, name=index_meta['name'])
+        if index_meta['tz'] is not None:
+            index = index.tz_localize('UTC').tz_convert(index_meta['tz'])
+
+    columns = {}
+    for meta in header['columns']:
+        values = view(meta['dtype'], meta['offset'])
+        if 'categories' in meta:
+            values = pd.Categorical.from_codes(values, categories=meta['categories'])
+        columns[meta['name']] = values
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def candles_to_bytes(df: pd.DataFrame) -> bytes:
+    """
+    Stratify an OHLCV frame (with either `o`/`h`/... or `open`/`high`/... columns)
+    and encode it.
+    """
+    df = df.rename(columns=SHORT_COLUMN_NAMES)
+    return dumps_df(metrics.stratify_df(df))
+
+
+def candles_from_bytes(data: Optional[bytes]) -> pd.DataFrame:
+    """
+    Decode a cached candle frame. Frames still stored as pickles by older writers are
+    renamed and stratified on the way out, the same as before.
+    """
+    if not data:
+        return pd.DataFrame()
+    if data[:len(MAGIC)] == MAGIC:
+        return loads_df(data)
+    df = pickle.loads(data)
+    df.rename(columns=SHORT_COLUMN_NAMES, inplace=True)
+    return metrics.stratify_df(df)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+
+
+TARGET_TRIGGER_TOLERANCE: float = 0.001
+
+
+def _record_levels(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Walking back from the newest candle, the values that are strictly higher than every
+    newer one, i.e. the monotonic stack of swing levels seen from the newest candle.
+    Returns the levels (increasing) and their positions in `values`.
+    """
+    newest_first = values[::-1]
+    if not len(newest_first):
+        return newest_first, np.empty(0, dtype=np.int64)
+    running_max = np.fmax.accumulate(newest_first)
+    is_record = np.concatenate(([True], newest_first[1:] > running_max[:-1]))
+    is_record &= ~np.isnan(newest_first)
+    positions = np.flatnonzero(is_record)
+    return newest_first[positions], len(values) - 1 - positions
+
+
+class CandleLevels:
+    """
+    Target and PMG lookups for one symbol and timeframe, built once per frame and shared
+    by every setup (both directions) built on it.
+
+    `targets` answers the same question as `metrics.find_targets` by binary searching
+    the swing levels and walking at most `limit` of them, `pmg` returns the run
+    lengths counted on construction.
+    """
+
+    def __init__(self, highs: np.ndarray, lows: np.ndarray):
+        self.highs = np.asarray(highs, dtype=np.float64)
+        self.lows = np.asarray(lows, dtype=np.float64)
+        self.high_levels, self.high_positions = _record_levels(self.highs)
+        # Lows are mirrored so both directions search an increasing array.
+        negated_low_levels, self.low_positions = _record_levels(-self.lows)
+        self.low_levels = -negated_low_levels
+        self.pmg_lengths = {
+            1: metrics.pmg_length(self.highs, 1),
+            -1: metrics.pmg_length(self.lows, -1),
+        }
+
+    @classmethod
+    def from_df(cls, df: pd.DataFrame) -> CandleLevels:
+        return cls(df['high'].to_numpy(), df['low'].to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.highs)
+
+    def pmg(self, direction: int) -> int:
+        return self.pmg_lengths.get(direction, 0)
+
+    def targets(self, target: float, trigger: float, direction: int, limit: int = 5) -> list[float]:
+        """
+        Up to `limit` levels past `target`, nearest first, skipping those within 0.1% of
+        `trigger`.
+        """
+        band = abs(trigger) * TARGET_TRIGGER_TOLERANCE
+        if direction == 1:
+            values, levels, sign = self.highs, self.high_levels, 1.0
+        else:
+            values, levels, sign = self.lows, -self.low_levels, -1.0
+
+        if sign * target < sign * trigger - band:
+            # Values skipped for being close to the trigger can hide levels below them
+            # from the swing stack, fall back to the full scan.
+            return metrics.find_targets(values, target, trigger, direction, limit=limit)
+
+        targets = []
+        for level in levels[np.searchsorted(levels, sign * target, side='left'):]:
+            if abs(level - sign * trigger) < band:
+                continue
+            targets.append(float(sign * level))
+            if len(targets) == limit:
+                break
+        return targets
@@ -62,6 +62,42 @@ def stratify_df(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+STRAT_CATEGORICAL_COLUMNS = ('strat_id', 'candle_shape')
+
+
+def stratify_tail(df: pd.DataFrame, tail: pd.DataFrame) -> pd.DataFrame:
+    """
+    Incremental `stratify_df`. `df` is an already stratified frame and `tail` holds raw
+    rows that were appended to it or that replace existing rows (matched on the index).
+
+    Only the rows from the first changed one onward are recomputed, with one row of
+    look-back for `prev_high`/`prev_low`, so when `tail` is the newest candle or two the
+    work doesn't depend on how much history `df` has.
+    """
+    if df.empty:
+        return stratify_df(tail)
+    if tail.empty:
+        return df
+
+    tail = tail.sort_index()
+    start = df.index.searchsorted(tail.index[0])
+    columns = list(tail.columns)
+
+    raw = tail.combine_first(df.iloc[start:][columns])[columns]
+    lookback = df.iloc[max(start - 1, 0):start][columns]
+    window = stratify_df(pd.concat([lookback, raw]))
+    window = window.iloc[len(lookback):].copy()
+
+    head = df.iloc[:start]
+    if head.empty:
+        return window
+    for column in STRAT_CATEGORICAL_COLUMNS:
+        categories = head[column].cat.categories.union(window[column].cat.categories)
+        head = head.assign(**{column: head[column].cat.set_categories(categories)})
+        window[column] = window[column].cat.set_categories(categories)
+    return pd.concat([head, window[head.columns]])
+
+
 def atr_metrics(df: pd.DataFrame, period: int = 14) -> tuple[Decimal, float]:
     high = df['high']
     low = df['low']
@@ -244,6 +280,65 @@ def is_pmg(df: pd.DataFrame, direction: int, threshold: int = 5) -> tuple[bool,
     return False, 0
 
 
+def pmg_length(values: np.ndarray, direction: int) -> int:
+    """
+    Same count as `is_pmg(df, direction, threshold=0)[1]`, for a plain `high` (bull) or
+    `low` (bear) column: how many candles back the highs keep rising or the lows keep
+    falling from the newest one.
+    """
+    if direction == 1:
+        steps = values[1:] <= values[:-1]
+    elif direction == -1:
+        steps = values[1:] >= values[:-1]
+    else:
+        return 0
+    steps = steps[::-1]
+    return len(steps) if steps.all() else int(np.argmin(steps))
+
+
+def risk_reward(trigger, target, stop):
+    """
+    Float (scalar or array) version of `SymbolRec.calculate_rr`, 0 where there is no
+    target.
+    """
+    trigger, target, stop = (np.asarray(x, dtype=np.float64) for x in (trigger, target, stop))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rr = np.select(
+            [
+                (target > trigger) & (trigger - stop > 0),
+                (target < trigger) & (stop - trigger > 0),
+            ],
+            [
+                (target - trigger) / (trigger - stop),
+                (trigger - target) / (stop - trigger),
+            ],
+            default=0.0,
+        )
+    return np.round(rr, 2)
+
+
+def find_targets(values: np.ndarray, target: float, trigger: float, direction: int, limit: int = 5) -> list[float]:
+    """
+    Array version of `SetupBuilder.find_targets`. `values` is the `high` (bull) or `low`
+    (bear) column in chronological order, the result is newest first: every value past
+    `target` that is further out than any newer one, skipping those within 0.1% of the
+    trigger.
+    """
+    values = values[::-1]
+    with np.errstate(invalid='ignore'):
+        beyond = (values >= target) if direction == 1 else (values <= target)
+        mask = beyond & (np.abs((values - trigger) / trigger) >= 0.001)
+    candidates = values[mask]
+    if not len(candidates):
+        return []
+    if direction == 1:
+        keep = candidates[1:] > np.maximum.accumulate(candidates)[:-1]
+    else:
+        keep = candidates[1:] < np.minimum.accumulate(candidates)[:-1]
+    keep = np.concatenate(([True], keep))
+    return candidates[keep][:limit].tolist()
+
+
 def within_percentage(price1, price2, percentage=3):
     """check if two triggers are within a percentage of each other"""
     if price1 == price2:
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+import asyncio
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta, time
 from itertools import chain
 
 import logging
 from dataclasses import asdict
 from time import perf_counter
+from typing import Iterable, Union
 
 import pandas as pd
 import pytz
 # from polygon import exceptions as polygon_exceptions
+from django.db import transaction
+from django.db.models import Max
 from django.utils import timezone
 import yfinance as yf
 
@@ -20,40 +25,46 @@ from ..models.timeframes import Timeframe
 # from ..integrations.polygon.bridges import polygon_bridge, async_polygon_bridge
 # from ..integrations.twelvedata.bridges import twelvedata_bridge
 from ..integrations.alpaca.bridges import alpaca_bridge
-from ..integrations.binance.bridges import async_binance_bridge, binance_bridge
+from ..integrations.binance.bridges import async_binance_bridge
+from .ingestion import copy_pricerecs
 
 
 log = logging.getLogger(__name__)
 
 
-def df_to_pricerec(symbol_type: str, df: pd.DataFrame):
+def df_to_pricerec(symbol_type: str, df: Union[pd.DataFrame, Iterable[pd.DataFrame]]):
     """
-    DataFrames returned from client bridges have a DatetimeIndex. This must be removed
-    to write the column to the database. Also drop the 'timestamp' field
+    Write one or many DataFrames returned from client bridges (`time` index) to the
+    price record table, through `COPY` rather than model instances, see
+    `ops.ingestion`.
     """
     if df is None or (isinstance(df, pd.DataFrame) and df.empty):
         return
-    df = df.copy()
-    df.reset_index(inplace=True)
-
-    try:
-        del df['timestamp']
-    except KeyError:
-        pass
 
     try:
         model = StockPriceRec if symbol_type == SymbolType.STOCK else CryptoPriceRec
-        model_instances = [model(**row) for row in df.to_dict('records')]
-        model.objects.bulk_create(model_instances, ignore_conflicts=True)
+        copy_pricerecs(model, df)
     except Exception as e:
         log.error(f"error writing to db: {e}")
 
 
+BACKFILL_SCHEDULE_OFFSETS = {
+    Timeframe.DAYS_1: (0, -14),
+    Timeframe.MINUTES_1: (-13, -1),
+}
+
+
+def crypto_backfill_dates(tf: Timeframe) -> tuple[datetime, datetime]:
+    schedule_start_date = timezone.now().date() - timedelta(days=365 * 5)
+    schedule_end_date = timezone.now().date()
+    schedule = pd.date_range(start=schedule_start_date, end=schedule_end_date, freq='D', tz='UTC')
+    start_date = schedule[BACKFILL_SCHEDULE_OFFSETS[tf][0]]
+    end_date = schedule[BACKFILL_SCHEDULE_OFFSETS[tf][1]] + timedelta(days=1)
+    return start_date, end_date
+
+
 def backfill_db(symbolrec: SymbolRec):
-    schedule_offsets = {
-        Timeframe.DAYS_1: (0, -14),
-        Timeframe.MINUTES_1: (-13, -1),
-    }
+    schedule_offsets = BACKFILL_SCHEDULE_OFFSETS
 
     for tf in (Timeframe.DAYS_1, Timeframe.MINUTES_1):
         if symbolrec.symbol_type == SymbolType.STOCK:
@@ -66,12 +77,8 @@ def backfill_db(symbolrec: SymbolRec):
             end_date = schedule.iloc[schedule_offsets[tf][1]].market_close - timedelta(minutes=1)
             df = alpaca_bridge.historical(symbolrec.symbol, tf, start_date, end_date)
         else:
-            schedule_start_date = timezone.now().date() - timedelta(days=365 * 5)
-            schedule_end_date = timezone.now().date()
-            schedule = pd.date_range(start=schedule_start_date, end=schedule_end_date, freq='D', tz='UTC')
-            start_date = schedule[schedule_offsets[tf][0]]
-            end_date = schedule[schedule_offsets[tf][1]] + timedelta(days=1)
-            df = binance_bridge.historical(symbolrec.symbol, tf, start_date)
+            start_date, end_date = crypto_backfill_dates(tf)
+            _, df = asyncio.run(async_binance_bridge.historical(symbolrec.symbol, tf, start_date))
 
         if isinstance(df, pd.DataFrame) and not df.empty:
             df_to_pricerec(symbolrec.symbol_type, df)
@@ -100,11 +107,66 @@ def refresh_historical_db(symbolrec: SymbolRec, tf: Timeframe, overwrite: bool =
         df = alpaca_bridge.historical(symbolrec.symbol, tf, start_date, end_date)
     else:
         # TODO: this will need to be handled differently to support multiple exchanges
-        df = binance_bridge.historical(symbolrec.symbol, tf, start_date)
+        _, df = asyncio.run(async_binance_bridge.historical(symbolrec.symbol, tf, start_date))
 
     df_to_pricerec(symbolrec.symbol_type, df)
 
 
+def refresh_crypto_historical_db(symbolrecs: list[SymbolRec], tf: Timeframe, overwrite: bool = False) -> None:
+    """
+    `refresh_historical_db` for many crypto symbols at once. Symbols with price records
+    are topped up from their latest one, the rest are backfilled, and every kline
+    request goes through a single `bulk_query_historical` so they run concurrently.
+
+    With `overwrite` every symbol is backfilled, and a symbol's price records are only
+    replaced once all of its frames arrived, in the same transaction as the insert. A
+    symbol with a failed or empty query keeps the records it had.
+    """
+    symbols = [symbolrec.symbol for symbolrec in symbolrecs]
+    if overwrite:
+        latest = {}
+    else:
+        latest = dict(
+            CryptoPriceRec.objects
+            .filter(symbol__in=symbols)
+            .values('symbol')
+            .annotate(latest=Max('time'))
+            .values_list('symbol', 'latest')
+        )
+
+    historical_map = [(symbol, tf, start_date) for symbol, start_date in latest.items()]
+    to_backfill = [symbol for symbol in symbols if symbol not in latest]
+    for backfill_tf in (Timeframe.DAYS_1, Timeframe.MINUTES_1):
+        start_date, _ = crypto_backfill_dates(backfill_tf)
+        historical_map.extend((symbol, backfill_tf, start_date) for symbol in to_backfill)
+
+    log.info(f'Binance: refreshing {len(latest)} symbols, backfilling {len(to_backfill)}')
+    results = asyncio.run(async_binance_bridge.bulk_query_historical(historical_map))
+    frames_by_symbol = defaultdict(list)
+    for symbol, df in results:
+        if isinstance(df, pd.DataFrame) and not df.empty:
+            frames_by_symbol[symbol].append(df)
+        else:
+            log.warning(f'no data for {symbol}')
+
+    if not overwrite:
+        df_to_pricerec(SymbolType.CRYPTO, list(chain.from_iterable(frames_by_symbol.values())))
+        return
+
+    requested = Counter(symbol for symbol, _, _ in historical_map)
+    complete = [symbol for symbol, frames in frames_by_symbol.items() if len(frames) == requested[symbol]]
+    if len(complete) < len(symbols):
+        log.warning(f'Binance: {len(symbols) - len(complete)} symbols incomplete, keeping their price records')
+    if not complete:
+        return
+    try:
+        with transaction.atomic():
+            CryptoPriceRec.objects.filter(symbol__in=complete).delete()
+            copy_pricerecs(CryptoPriceRec, chain.from_iterable(frames_by_symbol[symbol] for symbol in complete))
+    except Exception as e:
+        log.error(f"error overwriting {len(complete)} symbols: {e}")
+
+
 def refresh_crypto_quotes():
     symbolrecs = SymbolRec.objects.filter(symbol_type=SymbolType.CRYPTO)
     quotes = async_binance_bridge.quotes()
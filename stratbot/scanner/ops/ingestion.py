@@ -0,0 +1,139 @@
+"""
+Bulk load candle DataFrames into the price record hypertables.
+
+Rows are streamed with PostgreSQL `COPY` into a temporary staging table and moved over
+with `INSERT ... ON CONFLICT DO NOTHING`, `chunk_size` rows at a time, so no model
+instances are built and memory stays bounded however many frames are passed in.
+"""
+from __future__ import annotations
+
+import io
+import logging
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Iterable, Iterator, Union
+
+import pandas as pd
+from django.db import connections, models, transaction
+
+from ..models.pricerecs import CryptoPriceRec, StockPriceRec
+
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+PriceRecModel = type[Union[StockPriceRec, CryptoPriceRec]]
+
+
+@dataclass
+class CopyStatistics:
+    table: str
+    rows_copied: int = 0
+    rows_inserted: int = 0
+    chunks: int = 0
+    duration: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_copied / self.duration if self.duration else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.table}: copied {self.rows_copied} rows in {self.chunks} chunks, '
+            f'{self.rows_inserted} new, {self.duration:.2f}s ({self.rows_per_second:,.0f} rows/s)'
+        )
+
+
+def copy_columns(model: PriceRecModel) -> list[models.Field]:
+    return [field for field in model._meta.concrete_fields if not isinstance(field, models.AutoField)]
+
+
+def prepare_frame(df: pd.DataFrame, fields: list[models.Field]) -> pd.DataFrame:
+    """
+    Shape a bridge DataFrame (`time` index) into the table's columns, in order. Missing
+    columns are written as NULL and extra ones, like `timestamp`, are dropped.
+    """
+    if df.index.name == 'time':
+        df = df.reset_index()
+    df = df.reindex(columns=[field.column for field in fields])
+    for field in fields:
+        # Integer columns with gaps come back as floats, which COPY won't parse.
+        if isinstance(field, models.IntegerField) and df[field.column].dtype.kind == 'f':
+            df[field.column] = df[field.column].round().astype('Int64')
+    return df
+
+
+def csv_chunks(
+    frames: Iterable[pd.DataFrame],
+    fields: list[models.Field],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[tuple[io.StringIO, int]]:
+    """
+    CSV buffers of at most `chunk_size` rows each, filled from `frames` in order.
+    """
+    buffer, rows = io.StringIO(), 0
+    for df in frames:
+        if df is None or df.empty:
+            continue
+        df = prepare_frame(df, fields)
+        start = 0
+        while start < len(df):
+            take = min(chunk_size - rows, len(df) - start)
+            df.iloc[start:start + take].to_csv(buffer, header=False, index=False)
+            rows += take
+            start += take
+            if rows == chunk_size:
+                buffer.seek(0)
+                yield buffer, rows
+                buffer, rows = io.StringIO(), 0
+    if rows:
+        buffer.seek(0)
+        yield buffer, rows
+
+
+def copy_pricerecs(
+    model: PriceRecModel,
+    frames: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    using: str = 'default',
+) -> CopyStatistics:
+    """
+    Load one or many candle DataFrames into `model`'s table. Rows that already exist
+    (same unique key) are skipped, the same as `bulk_create(ignore_conflicts=True)`.
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+
+    table = model._meta.db_table
+    # Qualified so neither DROP can ever reach a regular table of the same name.
+    staging = f'pg_temp.{table}_staging'
+    fields = copy_columns(model)
+    columns = ', '.join(f'"{field.column}"' for field in fields)
+    stats = CopyStatistics(table=table)
+
+    s = perf_counter()
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        # Same column types (and numeric rounding) as the table, no constraints or indexes.
+        cursor.execute(f'DROP TABLE IF EXISTS {staging}')
+        cursor.execute(f'CREATE TEMPORARY TABLE {staging} AS SELECT {columns} FROM {table} WITH NO DATA')
+        try:
+            for buffer, rows in csv_chunks(frames, fields, chunk_size=chunk_size):
+                with transaction.atomic(using=using):
+                    cursor.copy_expert(f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+                    cursor.execute(
+                        f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} ON CONFLICT DO NOTHING'
+                    )
+                    stats.rows_inserted += cursor.rowcount
+                    cursor.execute(f'TRUNCATE {staging}')
+                stats.rows_copied += rows
+                stats.chunks += 1
+                log.debug(f'{table}: chunk {stats.chunks}, {rows} rows')
+        finally:
+            cursor.execute(f'DROP TABLE IF EXISTS {staging}')
+    stats.duration = perf_counter() - s
+
+    log.info(str(stats))
+    return stats
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import heapq
 import logging
+import multiprocessing
 from multiprocessing import Pool
+from multiprocessing.connection import Connection
 import os
 import time
 from abc import ABC
@@ -15,20 +18,25 @@ from time import perf_counter
 from typing import Any, ClassVar, Optional
 
 import django
+import numpy as np
 import pandas as pd
 from django.db.models import QuerySet
 from dotenv import load_dotenv
 from rich.console import Console
-from dirtyfields.dirtyfields import reset_state
-from django.db import transaction
+from django.db import connections, transaction
 from django.utils import timezone
+from redis.exceptions import RedisError
 
 from stratbot.scanner.models.live_loop import LiveLoop as LiveLoopModel
 from stratbot.scanner.models.live_loop import LiveLoopRun as LiveLoopRunModel
-from stratbot.scanner.models.symbols import SymbolRec, SymbolType, Setup
+from stratbot.scanner.models.symbols import NegatedReason, SymbolRec, SymbolType, Setup
 from stratbot.scanner.models.timeframes import Timeframe
-from stratbot.scanner.ops.candles.candlepair import CandlePair
 from stratbot.scanner.ops.candles.storage import from_cache
+from stratbot.scanner.ops.quotes import QuoteSnapshot, read_quote_snapshot
+from stratbot.scanner.ops.setups import persist_dirty_setups
+from .columnar import SetupColumns
+from .sharding import merge_run_statistics, run_shard_worker, shard_for_symbol, stats_to_dict
+from .snapshot import MarketSnapshot, tfc_distance_ratio
 
 load_dotenv(dotenv_path='v1/.env')
 dev = bool(os.getenv("DEV") == 'True')
@@ -85,6 +93,15 @@ class OneLoopRunStatistics:
     price_records_refreshed: bool = False
     price_records_refreshed_duration: float | None = None
     num_price_records: int | None = None
+    quotes_refresh_duration: float | None = None
+    num_quotes: int | None = None
+    quotes_version: int | None = None
+    market_snapshot_fetch_duration: float | None = None
+    market_snapshot_symbols: int | None = None
+    market_snapshot_hits: int = 0
+    market_snapshot_misses: int = 0
+    setups_persist_duration: float | None = None
+    num_negated_reasons_written: int = 0
     num_setups_examined: int = 0
     num_setups_updated: int = 0
     num_setups_triggered: int = 0
@@ -113,6 +130,7 @@ class LoopPersistentDataStore:
         self._price_record_mapping: defaultdict[
             SymbolRec, defaultdict[Timeframe, pd.DataFrame]
         ] = defaultdict(lambda: defaultdict(pd.DataFrame))
+        self._setup_columns: SetupColumns | None = None
 
     @property
     def any_needs_refresh(self) -> bool:
@@ -166,22 +184,32 @@ class LoopPersistentDataStore:
     @property
     def symbolrecs(self) -> list[SymbolRec]:  # dict[str, SymbolRec]:
         if self.symbols_needs_refresh:
-            self._symbolrecs = list(SymbolRec.objects.filter(symbol_type=self.loop.symbol_type))
+            self._symbolrecs = [
+                symbolrec
+                for symbolrec in SymbolRec.objects.filter(symbol_type=self.loop.symbol_type)
+                if self.loop.owns_symbol(symbolrec.symbol)
+            ]
             # self._symbolrecs = {rec.symbol: rec for rec in symbolrecs}
             self.symbols_needs_refresh = False
         return self._symbolrecs
 
+    def active_setups_queryset(self) -> QuerySet:
+        queryset = (
+            Setup.objects
+            .select_related('symbol_rec')
+            .filter(expires__gt=datetime.utcnow().astimezone())
+            .filter(symbol_rec__symbol_type=self.loop.symbol_type)
+            .filter(negated=False)
+            .filter(hit_magnitude=False)
+        )
+        if self.loop.shard is not None:
+            queryset = queryset.filter(symbol_rec__in=[symbolrec.pk for symbolrec in self.symbolrecs])
+        return queryset
+
     @property
     def setups(self) -> list[Setup]:  # QuerySet:
         if self.setups_needs_refresh:
-            self._setups = (
-                Setup.objects
-                .select_related('symbol_rec')
-                .filter(expires__gt=datetime.utcnow().astimezone())
-                .filter(symbol_rec__symbol_type=self.loop.symbol_type)
-                .filter(negated=False)
-                .filter(hit_magnitude=False)
-            )
+            self._setups = self.active_setups_queryset()
             self.setups_needs_refresh = False
         return self._setups
 
@@ -205,9 +233,19 @@ class LoopPersistentDataStore:
                 setup_timeframe = Timeframe(setup.tf)
                 new_mapping[setup_symbol][setup_timeframe].append(setup)
             self._setup_mapping = new_mapping
+            self._setup_columns = None
             self.setup_mapping_needs_refresh = False
         return self._setup_mapping
 
+    @property
+    def setup_columns(self) -> SetupColumns:
+        setup_mapping = self.setup_mapping
+        if self._setup_columns is None:
+            self._setup_columns = SetupColumns.from_setup_mapping(
+                setup_mapping, self.symbolrecs, self.loop.scan_timeframes
+            )
+        return self._setup_columns
+
     @property
     def price_record_mapping(self) -> defaultdict[SymbolRec, defaultdict[Timeframe, pd.DataFrame]]:
         if self._price_record_mapping_needs_refresh:
@@ -274,6 +312,190 @@ class LoopPersistentDataStore:
         current_stats.num_price_records = num_price_records
 
 
+class IncrementalLoopPersistentDataStore(LoopPersistentDataStore):
+    """
+    A `LoopPersistentDataStore` that, after the initial full load, keeps `symbolrecs`,
+    `setups`, `setup_mapping` and `price_record_mapping` current by applying deltas
+    instead of rebuilding everything:
+
+    * setups written since the last sync (by `Setup.updated_at`, with a small overlap
+      to catch transactions that committed late) are added, replaced or dropped
+      depending on whether they are still active;
+    * setups that expire are dropped locally off an expiry heap, without a query;
+    * symbols added or removed are picked up by diffing primary keys.
+
+    A full rebuild still happens whenever one of the refresh flags is set (e.g. after
+    an unhandled exception) and every `full_refresh_interval`, since a high-water mark
+    can't see deleted rows.
+    """
+
+    sync_overlap: ClassVar[timedelta] = timedelta(seconds=5)
+    full_refresh_interval: ClassVar[timedelta] = timedelta(minutes=15)
+
+    def __init__(self, loop: LiveLoop):
+        super().__init__(loop)
+        self._symbolrecs_by_pk: dict[int, SymbolRec] = {}
+        self._setups_by_pk: dict[int, Setup] = {}
+        self._expiry_heap: list[tuple[datetime, int]] = []
+        self._setups_changed: bool = False
+        self._synced_at: Optional[datetime] = None
+        self._full_refresh_at: Optional[datetime] = None
+
+    @property
+    def setups(self) -> list[Setup]:
+        if self.setups_needs_refresh:
+            self._setups = list(self.active_setups_queryset())
+            self.setups_needs_refresh = False
+        elif self._setups_changed:
+            self._setups = list(self._setups_by_pk.values())
+        self._setups_changed = False
+        return self._setups
+
+    def _index_all(self, synced_at: datetime) -> None:
+        self._symbolrecs_by_pk = {symbolrec.pk: symbolrec for symbolrec in self.symbolrecs}
+        self._setups_by_pk = {}
+        self._expiry_heap = []
+        for setup in self.setups:
+            if setup.symbol_rec_id in self._symbolrecs_by_pk:
+                self._setups_by_pk[setup.pk] = setup
+                self._expiry_heap.append((setup.expires, setup.pk))
+        heapq.heapify(self._expiry_heap)
+        self._synced_at = synced_at
+
+    def _is_active(self, setup: Setup, now: datetime) -> bool:
+        return (
+            setup.expires > now
+            and not setup.negated
+            and not setup.hit_magnitude
+            and setup.symbol_rec_id in self._symbolrecs_by_pk
+        )
+
+    def _add_setup(self, setup: Setup) -> None:
+        symbolrec = self._symbolrecs_by_pk[setup.symbol_rec_id]
+        self._setup_mapping[symbolrec][Timeframe(setup.tf)].append(setup)
+        self._setups_by_pk[setup.pk] = setup
+        heapq.heappush(self._expiry_heap, (setup.expires, setup.pk))
+        self._setups_changed = True
+        self._setup_columns = None
+
+    def _remove_setup(self, setup: Setup) -> None:
+        self._setups_by_pk.pop(setup.pk, None)
+        if symbolrec := self._symbolrecs_by_pk.get(setup.symbol_rec_id):
+            timeframe_setups = self._setup_mapping[symbolrec][Timeframe(setup.tf)]
+            if setup in timeframe_setups:
+                timeframe_setups.remove(setup)
+        self._setups_changed = True
+        self._setup_columns = None
+
+    def _apply_symbol_changes(self) -> int:
+        symbol_pks = {
+            pk
+            for pk, symbol in (
+                SymbolRec.objects
+                .filter(symbol_type=self.loop.symbol_type)
+                .values_list('pk', 'symbol')
+            )
+            if self.loop.owns_symbol(symbol)
+        }
+        added = symbol_pks - self._symbolrecs_by_pk.keys()
+        removed = self._symbolrecs_by_pk.keys() - symbol_pks
+        if not added and not removed:
+            return 0
+
+        for pk in removed:
+            symbolrec = self._symbolrecs_by_pk[pk]
+            for timeframe_setups in self._setup_mapping.pop(symbolrec, {}).values():
+                for setup in timeframe_setups:
+                    self._setups_by_pk.pop(setup.pk, None)
+            self._price_record_mapping.pop(symbolrec, None)
+            del self._symbolrecs_by_pk[pk]
+            self.loop.logger.info(f'removed {symbolrec.symbol} from loop store')
+
+        for symbolrec in SymbolRec.objects.filter(pk__in=added):
+            self._symbolrecs_by_pk[symbolrec.pk] = symbolrec
+            for timeframe in self.loop.scan_timeframes:
+                self._setup_mapping[symbolrec][timeframe] = []
+                self._price_record_mapping[symbolrec][timeframe] = pd.DataFrame()
+            self.loop.logger.info(f'added {symbolrec.symbol} to loop store')
+
+        self._symbolrecs = list(self._symbolrecs_by_pk.values())
+        self._setups_changed = True
+        self._setup_columns = None
+        return len(added) + len(removed)
+
+    def _apply_expirations(self, now: datetime) -> int:
+        num_expired = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, pk = heapq.heappop(self._expiry_heap)
+            setup = self._setups_by_pk.get(pk)
+            # The heap can hold stale entries for setups that were replaced with a new
+            # `expires` since they were pushed.
+            if setup is not None and setup.expires <= now:
+                self._remove_setup(setup)
+                num_expired += 1
+        return num_expired
+
+    def _apply_setup_changes(self, now: datetime) -> int:
+        num_changed = 0
+        changed_setups = (
+            Setup.objects
+            .select_related('symbol_rec')
+            .filter(symbol_rec__symbol_type=self.loop.symbol_type)
+            .filter(updated_at__gte=self._synced_at - self.sync_overlap)
+            .filter(expires__gt=now)
+        )
+        for setup in changed_setups:
+            current = self._setups_by_pk.get(setup.pk)
+            is_active = self._is_active(setup, now)
+            if current is not None:
+                # Our own `bulk_update` round-trips through here as well, skip rows we
+                # already hold the latest version of.
+                if current.updated_at == setup.updated_at:
+                    continue
+                self._remove_setup(current)
+            elif not is_active:
+                # an inactive row we already dropped, seen again within `sync_overlap`
+                continue
+            if is_active:
+                self._add_setup(setup)
+            num_changed += 1
+        self._synced_at = now
+        return num_changed
+
+    def apply_changes(self, now: datetime) -> int:
+        return (
+            self._apply_symbol_changes()
+            + self._apply_expirations(now)
+            + self._apply_setup_changes(now)
+        )
+
+    def check_and_refresh_all(self) -> None:
+        now = timezone.now()
+        if (
+            self._full_refresh_at is None
+            or now - self._full_refresh_at >= self.full_refresh_interval
+        ):
+            self.symbols_needs_refresh = True
+
+        if self.any_needs_refresh:
+            super().check_and_refresh_all()
+            self._index_all(now)
+            self._full_refresh_at = now
+            return
+
+        current_stats = self.loop.current_stats
+        _time = perf_counter()
+        num_changes = self.apply_changes(now)
+        current_stats.symbols_refreshed = False
+        current_stats.symbols_refreshed_duration = None
+        current_stats.num_symbols = len(self.symbolrecs)
+        current_stats.setups_refreshed = num_changes > 0
+        current_stats.setups_refresh_duration = perf_counter() - _time
+        current_stats.num_setups = len(self.setups)
+        current_stats.price_records_refreshed = False
+        current_stats.price_records_refreshed_duration = None
+
+
 class LiveLoop(ABC):
     symbol_type: ClassVar[SymbolType]
     scan_timeframes: ClassVar[tuple[Timeframe, ...]]
@@ -284,6 +506,9 @@ class LiveLoop(ABC):
     overall_stats_class: ClassVar[type[OverallLoopRunStatistics]] = OverallLoopRunStatistics
     current_stats_class: ClassVar[type[OneLoopRunStatistics]] = OneLoopRunStatistics
     store_class: ClassVar[type[LoopPersistentDataStore]] = LoopPersistentDataStore
+    incremental_store_class: ClassVar[
+        type[IncrementalLoopPersistentDataStore]
+    ] = IncrementalLoopPersistentDataStore
 
     def __init__(
         self,
@@ -292,6 +517,20 @@ class LiveLoop(ABC):
         min_wait_duration: timedelta = timedelta(seconds=1),
         # The minimum time in-between recording run statistics.
         min_stats_record_duration: timedelta = timedelta(seconds=30),
+        # Evaluate all active setups in one batched NumPy pass instead of calling
+        # `check_setup` for each of them.
+        columnar: bool = False,
+        # Keep the store current by applying deltas instead of full rebuilds.
+        incremental: bool = False,
+        # Partition symbols across this many worker processes. The loop that isn't
+        # given a `shard` coordinates the workers and records their merged stats.
+        num_shards: int = 1,
+        shard: Optional[int] = None,
+        # A shard worker that hasn't replied with its run statistics within this long
+        # is treated as dead and restarted.
+        shard_timeout: timedelta = timedelta(seconds=60),
+        # Symbols last quoted longer ago than this have no price.
+        max_quote_age: timedelta = timedelta(seconds=30),
     ):
         self.overall_stats: Optional[OverallLoopRunStatistics] = None
         self.previous_stats: deque[OneLoopRunStatistics] = deque([])
@@ -304,8 +543,117 @@ class LiveLoop(ABC):
         self.overall_stats_db_instance: Optional[LiveLoopModel] = None
         self.min_wait_duration = min_wait_duration
         self.min_stats_record_duration = min_stats_record_duration
-        self.store = self.store_class(self)
-        self.quotes: dict[str, int] = {}
+        self.columnar = columnar
+        self.incremental = incremental
+        self.num_shards = num_shards
+        self.shard = shard
+        self.shard_timeout = shard_timeout
+        self.shard_workers: list[tuple[multiprocessing.Process, Connection]] = []
+        self.store = (self.incremental_store_class if incremental else self.store_class)(self)
+        self.max_quote_age = max_quote_age
+        self.quotes: dict[str, float] = {}
+        self.quotes_version: Optional[int] = None
+        self.quote_snapshot: Optional[QuoteSnapshot] = None
+        self.market_snapshot = MarketSnapshot()
+        # (setup pk, `NegatedReason` reason) for setups negated in the current run.
+        self.pending_negated_reasons: list[tuple[int, int]] = []
+        self._negated_reasons: Optional[dict[int, NegatedReason]] = None
+
+    @property
+    def is_shard_coordinator(self) -> bool:
+        return self.num_shards > 1 and self.shard is None
+
+    def owns_symbol(self, symbol: str) -> bool:
+        if self.shard is None:
+            return True
+        return shard_for_symbol(symbol, self.num_shards) == self.shard
+
+    def start_shard_worker(self, shard: int) -> tuple[multiprocessing.Process, Connection]:
+        parent_conn, child_conn = multiprocessing.Pipe()
+        loop_kwargs = {
+            "min_wait_duration": self.min_wait_duration,
+            "min_stats_record_duration": self.min_stats_record_duration,
+            "columnar": self.columnar,
+            "incremental": self.incremental,
+            "max_quote_age": self.max_quote_age,
+        }
+        process = multiprocessing.Process(
+            target=run_shard_worker,
+            args=(self.__class__, loop_kwargs, shard, self.num_shards, child_conn),
+            name=f"{self.__class__.__name__}-shard-{shard}",
+            daemon=True,
+        )
+        process.start()
+        # Only the worker holds the other end now, so `recv` sees EOF if it dies.
+        child_conn.close()
+        return process, parent_conn
+
+    def start_shard_workers(self) -> None:
+        # Workers are forked, close our connections so none of them inherit a socket.
+        connections.close_all()
+        self.shard_workers = [self.start_shard_worker(shard) for shard in range(self.num_shards)]
+
+    def stop_shard_workers(self) -> None:
+        for process, conn in self.shard_workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self.shard_workers = []
+
+    def restart_shard_worker(self, shard: int) -> None:
+        process, conn = self.shard_workers[shard]
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=5)
+        conn.close()
+        connections.close_all()
+        self.shard_workers[shard] = self.start_shard_worker(shard)
+
+    def run_shards(self) -> None:
+        for shard, (process, _) in enumerate(self.shard_workers):
+            if not process.is_alive():
+                self.logger.warning("Restarting dead shard worker %s.", shard)
+                self.restart_shard_worker(shard)
+
+        run_number = self.current_stats.run_number
+        # shard -> (exit reason, detail) for workers that didn't reply
+        failed: dict[int, tuple[str, str]] = {}
+        for shard, (_, conn) in enumerate(self.shard_workers):
+            try:
+                conn.send(run_number)
+            except (BrokenPipeError, OSError) as e:
+                failed[shard] = ("ShardWorkerDied", str(e))
+
+        deadline = perf_counter() + self.shard_timeout.total_seconds()
+        shard_stats = []
+        for shard, (_, conn) in enumerate(self.shard_workers):
+            if shard not in failed:
+                try:
+                    if conn.poll(max(deadline - perf_counter(), 0)):
+                        shard_stats.append(conn.recv())
+                        continue
+                    failed[shard] = ("ShardWorkerTimeout", f"no reply within {self.shard_timeout}")
+                except (EOFError, OSError) as e:
+                    failed[shard] = ("ShardWorkerDied", str(e) or e.__class__.__name__)
+            exit_reason, exit_reason_detail = failed[shard]
+            self.logger.warning("Restarting shard worker %s: %s %s", shard, exit_reason, exit_reason_detail)
+            self.restart_shard_worker(shard)
+            shard_stats.append(stats_to_dict(self.current_stats_class(
+                loop=None,
+                start_datetime=None,
+                start_perf=0.0,
+                end_datetime=None,
+                end_perf=0.0,
+                run_number=run_number,
+                exit_reason=exit_reason,
+                exit_reason_detail=exit_reason_detail,
+            )))
+        merge_run_statistics(self.current_stats, shard_stats)
 
     def handle_loop_run_unhandled_exception(self, exception: Exception) -> None:
         assert not isinstance(
@@ -337,23 +685,73 @@ class LiveLoop(ABC):
         self._check_and_refresh_setups()
 
     def refresh_latest_prices(self) -> None:
-        self.quotes = dict(
-            SymbolRec.objects
-            .filter(symbol_type=self.store.loop.symbol_type)
-            .filter(as_of__gte=timezone.now() - timedelta(seconds=30))
-            .values_list('symbol', 'price')
-        )
+        """
+        Read the quotes the quote consumers publish to Redis, fetching them only when
+        the snapshot version changed since the last run. Only symbols quoted within
+        `max_quote_age` get a price. Falls back to the `SymbolRec` prices when nothing
+        has been published.
+        """
+        _time = perf_counter()
+        try:
+            snapshot = read_quote_snapshot(self.symbol_type, since_version=self.quotes_version)
+        except RedisError as e:
+            self.logger.warning(f"failed to read quote snapshot, using symbolrec prices: {e}")
+            snapshot = None
+        if snapshot is not None and snapshot.changed:
+            self.quote_snapshot = snapshot if snapshot.version else None
+
+        if snapshot is None or self.quote_snapshot is None:
+            self.quotes = dict(
+                SymbolRec.objects
+                .filter(symbol_type=self.symbol_type)
+                .filter(as_of__gte=timezone.now() - self.max_quote_age)
+                .values_list('symbol', 'price')
+            )
+            self.quotes_version = None
+        else:
+            self.quotes = self.quote_snapshot.fresh(self.max_quote_age.total_seconds())
+            self.quotes_version = self.quote_snapshot.version
+
+        self.current_stats.quotes_refresh_duration = perf_counter() - _time
+        self.current_stats.num_quotes = len(self.quotes)
+        self.current_stats.quotes_version = self.quotes_version
         self._refresh_latest_prices()
 
+    def refresh_market_snapshot(self) -> None:
+        """
+        Fetch the bars and opens this run's setup checks read, for every symbol that
+        has a quote and at least one setup.
+        """
+        timeframes_by_symbol = {}
+        for symbolrec, setups_by_timeframe in self.store.setup_mapping.items():
+            if symbolrec.symbol not in self.quotes:
+                continue
+            timeframes = [timeframe for timeframe, setups in setups_by_timeframe.items() if setups]
+            if timeframes:
+                timeframes_by_symbol[symbolrec.symbol] = timeframes
+        self.market_snapshot = MarketSnapshot.fetch(self.symbol_type, timeframes_by_symbol)
+        self.current_stats.market_snapshot_fetch_duration = self.market_snapshot.fetch_duration
+        self.current_stats.market_snapshot_symbols = len(self.market_snapshot.symbols)
+
     def run_next_iteration(self) -> None:
+        if self.is_shard_coordinator:
+            self.run_shards()
+            return
+        self.pending_negated_reasons = []
         self.run_pre_run_checks()
         self.check_and_refresh_setups()
         self.refresh_latest_prices()
-        for timeframe in self.scan_timeframes:
-            # self.check_timeframe_before_checking_setups(timeframe)
-            for symbol in self.store.symbolrecs:
-                for setup in self.store.setup_mapping[symbol][timeframe]:
-                    self.check_setup(symbol, setup)
+        self.refresh_market_snapshot()
+        if self.columnar:
+            self.check_setups_columnar()
+        else:
+            for timeframe in self.scan_timeframes:
+                # self.check_timeframe_before_checking_setups(timeframe)
+                for symbol in self.store.symbolrecs:
+                    for setup in self.store.setup_mapping[symbol][timeframe]:
+                        self.check_setup(symbol, setup)
+        self.current_stats.market_snapshot_hits = self.market_snapshot.hits
+        self.current_stats.market_snapshot_misses = self.market_snapshot.misses
         self._run_next_iteration()
         self.check_and_persist_updated_setups()
         self.queue_prepared_alerts()
@@ -361,6 +759,15 @@ class LiveLoop(ABC):
     def check_timeframe_before_checking_setups(self, timeframe: Timeframe) -> None:
         self._check_timeframe_before_checking_setups(timeframe)
 
+    def negate_setup(self, setup: Setup, reason: int) -> None:
+        """
+        Mark `setup` negated. The change and its `NegatedReason` are written with the
+        rest of the run's changes in `check_and_persist_updated_setups`.
+        """
+        if not setup.negated:
+            self.pending_negated_reasons.append((setup.pk, reason))
+        setup.negated = True
+
     def check_setup(self, symbolrec: SymbolRec, setup: Setup) -> None:
         self.current_stats.num_setups_examined += 1
 
@@ -376,27 +783,28 @@ class LiveLoop(ABC):
             self.store.loop.logger.info(
                 f"mag % ({setup.magnitude_percent}) < threshold ({setup.mag_threshold}), negating: {symbol}, {setup}"
             )
-            setup.negated = True
-            setup.save()
+            self.negate_setup(setup, NegatedReason.MAG_THRESHOLD)
             return
 
         # check rr threshold
         rr_threshold = 1.0
         if not setup.potential_outside and setup.rr < rr_threshold:
             self.store.loop.logger.info(f"rr: {setup.rr} < {rr_threshold}, negating: {symbol}, {setup}")
-            setup.negated = True
-            setup.save()
+            self.negate_setup(setup, NegatedReason.RR_MINIMUM)
             return
 
         # remove setups on smaller timeframes moving against TFC
         if setup.tf in ["15", "30"]:
-            tfc_state = symbolrec.tfc_state(["D"])["D"]
-            if (tfc_state.distance_ratio > 0 and setup.direction == -1) or (
-                tfc_state.distance_ratio < 0 and setup.direction == 1
+            open_price = self.market_snapshot.open_price(symbol)
+            if open_price is not None:
+                distance_ratio = tfc_distance_ratio(symbolrec.price, open_price)
+            else:
+                distance_ratio = symbolrec.tfc_state(["D"])["D"].distance_ratio
+            if (distance_ratio > 0 and setup.direction == -1) or (
+                distance_ratio < 0 and setup.direction == 1
             ):
                 self.store.loop.logger.info(f"TFC mismatch (daily): {symbol}, {setup}")
-                setup.negated = True
-                setup.save()
+                self.negate_setup(setup, NegatedReason.TFC_CONFLICT)
                 return
 
         # is in force?
@@ -413,19 +821,18 @@ class LiveLoop(ABC):
             setup.in_force = False
             updated = True
 
-        df = getattr(symbolrec, symbolrec.TF_MAP[setup.tf])
-        df = df.tail(2)
-        try:
-            current_bar = df.iloc[-1]
-            previous_bar = df.iloc[-2]
-            candle_pair = CandlePair(current_bar, previous_bar, price)
-        except IndexError:
-            return
+        current_bar = self.market_snapshot.current_bar(symbol, setup.tf)
+        if current_bar is None:
+            df = getattr(symbolrec, symbolrec.TF_MAP[setup.tf])
+            if len(df) < 2:
+                return
+            current_bar = df.iloc[-1].high, df.iloc[-1].low
+        high, low = current_bar
         target = setup.targets[0]
 
         # check if hit magnitude
-        if ((setup.direction == 1 and (price >= target or current_bar.high >= target)) or
-                (setup.direction == -1 and (price <= target or current_bar.low <= target))):
+        if ((setup.direction == 1 and (price >= target or high >= target)) or
+                (setup.direction == -1 and (price <= target or low <= target))):
             self.store.loop.logger.info(f"hit magnitude: {symbol}, {setup}")
             setup.hit_magnitude = True
             updated = True
@@ -501,20 +908,97 @@ class LiveLoop(ABC):
 
         self._check_setup(symbolrec, setup)
 
+    def check_setups_columnar(self) -> None:
+        """
+        Columnar counterpart of calling `check_setup` for every setup.
+
+        All checks are computed in one pass over `store.setup_columns` and only the
+        rows whose state changed are written back onto their `Setup` instances, which
+        `check_and_persist_updated_setups` then picks up through `dirtyfields`. Unlike
+        `check_setup`, `_check_setup` is only called for changed rows.
+        """
+        columns = self.store.setup_columns
+        if not len(columns):
+            return
+
+        now = timezone.now()
+        now_ns = pd.Timestamp(now).value
+        prices = columns.symbol_prices(self.quotes)
+        candidates = columns.candidates(prices, now_ns)
+        bar_highs, bar_lows = columns.current_bars(candidates, self.market_snapshot)
+        tfc_directions = columns.tfc_directions(candidates, self.market_snapshot)
+        evaluation = columns.evaluate(prices, bar_highs, bar_lows, tfc_directions, now_ns)
+        # every packed setup counts, the same as one `check_setup` call per setup
+        self.current_stats.num_setups_examined += len(columns)
+
+        for row in np.flatnonzero(evaluation.changed):
+            setup = columns.setups[row]
+            symbolrec = columns.symbolrecs[columns.symbol_idx[row]]
+            symbol = symbolrec.symbol
+
+            if evaluation.negated_mag[row]:
+                self.logger.info(
+                    f"mag % ({setup.magnitude_percent}) < threshold ({setup.mag_threshold}), "
+                    f"negating: {symbol}, {setup}"
+                )
+                self.negate_setup(setup, NegatedReason.MAG_THRESHOLD)
+            elif evaluation.negated_rr[row]:
+                self.logger.info(f"rr: {setup.rr} < 1.0, negating: {symbol}, {setup}")
+                self.negate_setup(setup, NegatedReason.RR_MINIMUM)
+            elif evaluation.negated_tfc[row]:
+                self.logger.info(f"TFC mismatch (daily): {symbol}, {setup}")
+                self.negate_setup(setup, NegatedReason.TFC_CONFLICT)
+
+            if evaluation.triggered[row]:
+                setup.in_force = True
+                if not setup.initial_trigger:
+                    self.logger.info(f"initial trigger: {symbol}, {setup}")
+                    setup.initial_trigger = now
+                else:
+                    setup.last_triggered = now
+            elif evaluation.untriggered[row]:
+                setup.in_force = False
+
+            if evaluation.hit_magnitude[row]:
+                self.logger.info(f"hit magnitude: {symbol}, {setup}")
+                setup.hit_magnitude = True
+
+            self._check_setup(symbolrec, setup)
+
+        columns.commit(evaluation)
+
+    @property
+    def negated_reasons(self) -> dict[int, NegatedReason]:
+        if self._negated_reasons is None:
+            self._negated_reasons = {
+                negated_reason.reason: negated_reason for negated_reason in NegatedReason.objects.all()
+            }
+        return self._negated_reasons
+
     def check_and_persist_updated_setups(self) -> None:
-        needs_save: set[Setup] = set()
-        save_fields: set[str] = set()
-        for setup in self.store.setups:
-            if setup.is_dirty():
-                needs_save.add(setup)
-                dirty_fields = setup.get_dirty_fields()
-                save_fields |= set(dirty_fields)
-                reset_state(sender=setup.__class__, instance=setup)
-        if needs_save:
-            instances = list(needs_save)
-            fields = list(save_fields)
-            Setup.objects.bulk_update(instances, fields, batch_size=500)
-            self.current_stats.num_setups_updated += len(instances)
+        """
+        Write every setup changed during the run with one `bulk_update` and the
+        `NegatedReason`s of the setups negated during it with one `bulk_create`, in one
+        transaction.
+        """
+        _time = perf_counter()
+        SetupNegatedReason = Setup.negated_reasons.through
+        negated_reasons = []
+        for setup_pk, reason in self.pending_negated_reasons:
+            try:
+                negated_reason = self.negated_reasons[reason]
+            except KeyError:
+                self.logger.warning(f"no NegatedReason row for reason {reason}, not recording it")
+                continue
+            negated_reasons.append(SetupNegatedReason(setup_id=setup_pk, negatedreason_id=negated_reason.pk))
+        self.pending_negated_reasons = []
+
+        with transaction.atomic():
+            self.current_stats.num_setups_updated += len(persist_dirty_setups(self.store.setups))
+            if negated_reasons:
+                SetupNegatedReason.objects.bulk_create(negated_reasons, batch_size=500, ignore_conflicts=True)
+                self.current_stats.num_negated_reasons_written += len(negated_reasons)
+        self.current_stats.setups_persist_duration = perf_counter() - _time
         self._check_and_persist_updated_setups()
 
     def queue_prepared_alerts(self) -> None:
@@ -523,7 +1007,9 @@ class LiveLoop(ABC):
     def update_stats_post_run(self, exception: Exception | None) -> None:
         self.current_stats.end_datetime = timezone.now()
         self.current_stats.end_perf = perf_counter()
-        self.current_stats.fully_ran = exception is None
+        # A sharding coordinator doesn't raise for shards that exited early, it only
+        # records their exit reason.
+        self.current_stats.fully_ran = exception is None and not self.current_stats.exit_reason
 
         self.overall_stats.last_datetime = self.current_stats.end_datetime
         self.overall_stats.last_perf = self.current_stats.end_perf
@@ -613,7 +1099,7 @@ class LiveLoop(ABC):
             "run_number": self.overall_stats.last_run_number + 1,
         }
 
-    def run(self) -> None:
+    def prepare_run(self) -> None:
         self.start_datetime = timezone.now()
         self.start_perf = perf_counter()
         self.current_datetime = self.start_datetime
@@ -627,42 +1113,57 @@ class LiveLoop(ABC):
         )
         self.previous_stats: deque[OneLoopRunStatistics] = deque([])
 
+    def run_one_iteration(self) -> None:
+        self.current_datetime = timezone.now()
+        self.current_perf = perf_counter()
+        self.current_stats = self.current_stats_class(
+            **self.get_current_stats_class_init_defaults()
+        )
+
+        try:
+            with transaction.atomic():
+                self.run_next_iteration()
+        except Exception as e:
+            if isinstance(e, LoopRunExit):
+                self.handle_loop_run_exit(e)
+                self.logger.info(
+                    (
+                        "Ran into a loop run exit during a loop run "
+                        "(reason=%s, detail=%s)."
+                    ),
+                    (e.reason or ""),
+                    (e.detail or ""),
+                )
+            else:
+                self.logger.exception(
+                    (
+                        "Ran into unhandled exception during a loop run "
+                        "(symbol_type=%s)."
+                    ),
+                    self.symbol_type,
+                )
+                self.handle_loop_run_unhandled_exception(e)
+            self.update_stats_post_run(e)
+        else:
+            self.update_stats_post_run(None)
+
+    def run(self) -> None:
+        self.prepare_run()
+
         # Create the overall stats record in the database to represent this run.
         self.flush_start_of_overall_run()
 
-        while True:
-            self.current_datetime = timezone.now()
-            self.current_perf = perf_counter()
-            self.current_stats = self.current_stats_class(
-                **self.get_current_stats_class_init_defaults()
-            )
+        if self.is_shard_coordinator:
+            self.start_shard_workers()
+        try:
+            self.run_forever()
+        finally:
+            if self.is_shard_coordinator:
+                self.stop_shard_workers()
 
-            try:
-                with transaction.atomic():
-                    self.run_next_iteration()
-            except Exception as e:
-                if isinstance(e, LoopRunExit):
-                    self.handle_loop_run_exit(e)
-                    self.logger.info(
-                        (
-                            "Ran into a loop run exit during a loop run "
-                            "(reason=%s, detail=%s)."
-                        ),
-                        (e.reason or ""),
-                        (e.detail or ""),
-                    )
-                else:
-                    self.logger.exception(
-                        (
-                            "Ran into unhandled exception during a loop run "
-                            "(symbol_type=%s)."
-                        ),
-                        self.symbol_type,
-                    )
-                    self.handle_loop_run_unhandled_exception(e)
-                self.update_stats_post_run(e)
-            else:
-                self.update_stats_post_run(None)
+    def run_forever(self) -> None:
+        while True:
+            self.run_one_iteration()
 
             # Check and flush stats records.
             end_datetime = timezone.now()
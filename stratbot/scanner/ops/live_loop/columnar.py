@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from stratbot.scanner.models.symbols import SymbolRec, Setup
+from stratbot.scanner.models.timeframes import Timeframe
+from .snapshot import tfc_distance_ratio
+
+if TYPE_CHECKING:
+    from .snapshot import MarketSnapshot
+
+
+RR_THRESHOLD: float = 1.0
+TFC_CHECK_TIMEFRAMES: frozenset[str] = frozenset({"15", "30"})
+
+
+@dataclass
+class SetupEvaluation:
+    """
+    Result of one batched pass over `SetupColumns`. Every attribute is a boolean array
+    with one entry per row (setup).
+    """
+
+    examined: np.ndarray
+    negated_mag: np.ndarray
+    negated_rr: np.ndarray
+    negated_tfc: np.ndarray
+    triggered: np.ndarray
+    untriggered: np.ndarray
+    hit_magnitude: np.ndarray
+
+    @property
+    def negated(self) -> np.ndarray:
+        return self.negated_mag | self.negated_rr | self.negated_tfc
+
+    @property
+    def changed(self) -> np.ndarray:
+        return (
+            self.negated
+            | self.triggered
+            | self.untriggered
+            | self.hit_magnitude
+        )
+
+
+class SetupColumns:
+    """
+    Active setups packed into parallel NumPy arrays, one row per `Setup`.
+
+    This mirrors the checks done by `LiveLoop.check_setup` (magnitude threshold, RR
+    threshold, daily TFC mismatch, in force and hit magnitude) but computes them for
+    every row at once. The arrays are built once per setup refresh and the mutable
+    state columns (`in_force`, `hit_magnitude`, `negated`) are kept in sync with the
+    `Setup` instances through `commit`.
+    """
+
+    def __init__(self, rows: Iterable[tuple[SymbolRec, Setup]]):
+        rows = list(rows)
+        num_rows = len(rows)
+
+        self.symbolrecs: list[SymbolRec] = []
+        self.setups: list[Setup] = []
+        # Unique (symbol index, timeframe) pairs so each candle frame is only looked
+        # at once per pass, no matter how many setups share it.
+        self.bar_keys: list[tuple[int, Timeframe]] = []
+
+        self.symbol_idx = np.empty(num_rows, dtype=np.int64)
+        self.bar_idx = np.empty(num_rows, dtype=np.int64)
+        self.trigger = np.empty(num_rows, dtype=np.float64)
+        self.direction = np.empty(num_rows, dtype=np.int8)
+        self.stop = np.empty(num_rows, dtype=np.float64)
+        self.target = np.empty(num_rows, dtype=np.float64)
+        self.rr = np.empty(num_rows, dtype=np.float64)
+        self.expires = np.empty(num_rows, dtype=np.int64)
+        self.mag_threshold = np.empty(num_rows, dtype=np.float64)
+        self.potential_outside = np.empty(num_rows, dtype=np.bool_)
+        self.check_tfc = np.empty(num_rows, dtype=np.bool_)
+        self.in_force = np.empty(num_rows, dtype=np.bool_)
+        self.hit_magnitude = np.empty(num_rows, dtype=np.bool_)
+        self.negated = np.empty(num_rows, dtype=np.bool_)
+
+        symbol_index: dict[str, int] = {}
+        bar_index: dict[tuple[int, Timeframe], int] = {}
+        for row, (symbolrec, setup) in enumerate(rows):
+            if (s_idx := symbol_index.get(symbolrec.symbol)) is None:
+                s_idx = symbol_index[symbolrec.symbol] = len(self.symbolrecs)
+                self.symbolrecs.append(symbolrec)
+            bar_key = (s_idx, Timeframe(setup.tf))
+            if (b_idx := bar_index.get(bar_key)) is None:
+                b_idx = bar_index[bar_key] = len(self.bar_keys)
+                self.bar_keys.append(bar_key)
+
+            self.setups.append(setup)
+            self.symbol_idx[row] = s_idx
+            self.bar_idx[row] = b_idx
+            self.trigger[row] = setup.trigger
+            self.direction[row] = setup.direction
+            self.stop[row] = setup.stop
+            self.target[row] = setup.targets[0] if setup.targets else np.nan
+            self.rr[row] = setup.rr
+            self.expires[row] = pd.Timestamp(setup.expires).value
+            self.mag_threshold[row] = setup.mag_threshold
+            self.potential_outside[row] = setup.potential_outside
+            self.check_tfc[row] = setup.tf in TFC_CHECK_TIMEFRAMES
+            self.in_force[row] = setup.in_force
+            self.hit_magnitude[row] = setup.hit_magnitude
+            self.negated[row] = setup.negated
+
+    def __len__(self) -> int:
+        return len(self.setups)
+
+    @classmethod
+    def from_setup_mapping(
+        cls,
+        setup_mapping: dict[SymbolRec, dict[Timeframe, list[Setup]]],
+        symbolrecs: list[SymbolRec],
+        timeframes: Iterable[Timeframe],
+    ) -> SetupColumns:
+        """
+        Pack setups in the same order `LiveLoop.run_next_iteration` walks them.
+        """
+        return cls(
+            (symbolrec, setup)
+            for timeframe in timeframes
+            for symbolrec in symbolrecs
+            for setup in setup_mapping[symbolrec][timeframe]
+        )
+
+    def symbol_prices(self, quotes: dict[str, float]) -> np.ndarray:
+        """
+        Latest price per packed symbol, `NaN` where there is no recent quote.
+        """
+        prices = np.full(len(self.symbolrecs), np.nan, dtype=np.float64)
+        for s_idx, symbolrec in enumerate(self.symbolrecs):
+            price = quotes.get(symbolrec.symbol)
+            if price is not None:
+                prices[s_idx] = price
+        return prices
+
+    def candidates(self, prices: np.ndarray, now_ns: int) -> np.ndarray:
+        """
+        Rows that will be looked at in this pass: not negated, not expired and with a
+        price available for their symbol.
+        """
+        return (
+            ~self.negated
+            & (self.expires > now_ns)
+            & ~np.isnan(prices[self.symbol_idx])
+        )
+
+    def current_bars(
+        self, rows: np.ndarray, snapshot: Optional[MarketSnapshot] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        High and low of the newest candle for each (symbol, timeframe) referenced by
+        `rows`, from `snapshot` when it has them. `NaN` when the frame has fewer than
+        two candles, matching the early return in `LiveLoop.check_setup`.
+        """
+        highs = np.full(len(self.bar_keys), np.nan, dtype=np.float64)
+        lows = np.full(len(self.bar_keys), np.nan, dtype=np.float64)
+        for b_idx in np.unique(self.bar_idx[rows]):
+            s_idx, timeframe = self.bar_keys[b_idx]
+            symbolrec = self.symbolrecs[s_idx]
+            if snapshot is not None and (bar := snapshot.current_bar(symbolrec.symbol, timeframe)) is not None:
+                highs[b_idx], lows[b_idx] = bar
+                continue
+            df = getattr(symbolrec, symbolrec.TF_MAP[timeframe])
+            if df is None or len(df) < 2:
+                continue
+            current_bar = df.iloc[-1]
+            highs[b_idx] = current_bar.high
+            lows[b_idx] = current_bar.low
+        return highs, lows
+
+    def tfc_directions(self, rows: np.ndarray, snapshot: Optional[MarketSnapshot] = None) -> np.ndarray:
+        """
+        Sign of the daily TFC distance for each symbol that has a 15/30 setup in
+        `rows`, 0 otherwise. The daily open comes from `snapshot` when it has it.
+        """
+        directions = np.zeros(len(self.symbolrecs), dtype=np.int8)
+        for s_idx in np.unique(self.symbol_idx[rows & self.check_tfc]):
+            symbolrec = self.symbolrecs[s_idx]
+            if snapshot is not None and (open_price := snapshot.open_price(symbolrec.symbol)) is not None:
+                if symbolrec.price is not None:
+                    directions[s_idx] = np.sign(tfc_distance_ratio(symbolrec.price, open_price))
+                continue
+            try:
+                tfc_state = self.symbolrecs[s_idx].tfc_state(["D"])["D"]
+            except (KeyError, TypeError, AttributeError):
+                continue
+            directions[s_idx] = np.sign(tfc_state.distance_ratio)
+        return directions
+
+    def evaluate(
+        self,
+        prices: np.ndarray,
+        bar_highs: np.ndarray,
+        bar_lows: np.ndarray,
+        tfc_directions: np.ndarray,
+        now_ns: int,
+    ) -> SetupEvaluation:
+        price = prices[self.symbol_idx]
+        bull = self.direction == 1
+        bear = self.direction == -1
+
+        examined = self.candidates(prices, now_ns)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            magnitude_percent = np.round(
+                np.abs(self.trigger - self.target) / self.trigger * 100, 2
+            )
+        negated_mag = examined & (magnitude_percent < self.mag_threshold)
+        remaining = examined & ~negated_mag
+
+        negated_rr = remaining & ~self.potential_outside & (self.rr < RR_THRESHOLD)
+        remaining &= ~negated_rr
+
+        tfc = tfc_directions[self.symbol_idx]
+        negated_tfc = remaining & self.check_tfc & (
+            ((tfc > 0) & bear) | ((tfc < 0) & bull)
+        )
+        remaining &= ~negated_tfc
+
+        in_force = (bear & (price < self.trigger)) | (bull & (price > self.trigger))
+        triggered = remaining & in_force
+        untriggered = remaining & ~in_force & self.in_force
+
+        high = bar_highs[self.bar_idx]
+        low = bar_lows[self.bar_idx]
+        hit = (
+            remaining
+            & ~np.isnan(high)
+            & (
+                (bull & ((price >= self.target) | (high >= self.target)))
+                | (bear & ((price <= self.target) | (low <= self.target)))
+            )
+        )
+
+        return SetupEvaluation(
+            examined=examined,
+            negated_mag=negated_mag,
+            negated_rr=negated_rr,
+            negated_tfc=negated_tfc,
+            triggered=triggered,
+            untriggered=untriggered,
+            hit_magnitude=hit & ~self.hit_magnitude,
+        )
+
+    def commit(self, evaluation: SetupEvaluation) -> None:
+        """
+        Fold an evaluation back into the state columns once it has been applied to
+        the `Setup` instances.
+        """
+        self.negated |= evaluation.negated
+        self.in_force[evaluation.triggered] = True
+        self.in_force[evaluation.untriggered] = False
+        self.hit_magnitude |= evaluation.hit_magnitude
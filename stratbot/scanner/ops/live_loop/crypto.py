@@ -4,7 +4,6 @@ from datetime import datetime
 
 
 from stratbot.scanner.models.symbols import SymbolType, SymbolRec, SymbolTypeManager
-from stratbot.scanner.ops import historical
 from .base import LiveLoop
 
 
@@ -18,6 +17,3 @@ class CryptoLoop(LiveLoop):
     display_timeframes = SymbolTypeManager.display_timeframes(symbol_type)
     tfc_timeframes = SymbolTypeManager.tfc_timeframes(symbol_type)
     logger = logger
-
-    def _refresh_latest_prices(self) -> None:
-        self._quotes = historical.refresh_crypto_quotes()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import fields
+from multiprocessing.connection import Connection
+from typing import TYPE_CHECKING, Any, Final
+
+from django.db import connections
+
+if TYPE_CHECKING:
+    from .base import LiveLoop, OneLoopRunStatistics
+
+
+# How per-shard `OneLoopRunStatistics` fields are combined into the single
+# `LiveLoopRun` row recorded by the coordinating loop. Shards run in parallel, so
+# durations are the slowest shard rather than the sum.
+SUM_FIELDS: Final[tuple[str, ...]] = (
+    "num_symbols",
+    "num_setups",
+    "num_price_records",
+    "market_snapshot_symbols",
+    "market_snapshot_hits",
+    "market_snapshot_misses",
+    "num_negated_reasons_written",
+    "num_setups_examined",
+    "num_setups_updated",
+    "num_setups_triggered",
+    "num_alerts_attempted",
+)
+MAX_FIELDS: Final[tuple[str, ...]] = (
+    "symbols_refreshed_duration",
+    "setups_refresh_duration",
+    "price_records_refreshed_duration",
+    # Every shard reads the whole quote snapshot.
+    "quotes_refresh_duration",
+    "num_quotes",
+    "quotes_version",
+    "market_snapshot_fetch_duration",
+    "setups_persist_duration",
+)
+ANY_FIELDS: Final[tuple[str, ...]] = (
+    "symbols_refreshed",
+    "setups_refreshed",
+    "price_records_refreshed",
+)
+
+
+def jump_hash(key: int, num_buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping & Veach). Growing from N to N + 1 buckets only moves
+    ~1/(N + 1) of the keys.
+    """
+    bucket, jump = -1, 0
+    while jump < num_buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for_symbol(symbol: str, num_shards: int) -> int:
+    # `hash()` is salted per process, so derive a stable key from the symbol instead.
+    key = int.from_bytes(hashlib.blake2b(symbol.encode(), digest_size=8).digest(), "big")
+    return jump_hash(key, num_shards)
+
+
+def stats_to_dict(stats: OneLoopRunStatistics) -> dict[str, Any]:
+    # `dataclasses.asdict` would deep-copy the `loop` reference, and it can't be
+    # pickled across processes anyway.
+    return {field.name: getattr(stats, field.name) for field in fields(stats) if field.name != "loop"}
+
+
+def merge_run_statistics(stats: OneLoopRunStatistics, shard_stats: list[dict[str, Any]]) -> None:
+    for name in SUM_FIELDS:
+        values = [shard[name] for shard in shard_stats if shard[name] is not None]
+        setattr(stats, name, sum(values) if values else None)
+    for name in MAX_FIELDS:
+        values = [shard[name] for shard in shard_stats if shard[name] is not None]
+        setattr(stats, name, max(values) if values else None)
+    for name in ANY_FIELDS:
+        setattr(stats, name, any(shard[name] for shard in shard_stats))
+
+    exited = [(shard_index, shard) for shard_index, shard in enumerate(shard_stats) if not shard["fully_ran"]]
+    if exited:
+        stats.exit_reason = exited[0][1]["exit_reason"]
+        stats.exit_reason_detail = "; ".join(
+            f"shard {shard_index}: {shard['exit_reason']} {shard['exit_reason_detail']}".strip()
+            for shard_index, shard in exited
+        )
+
+
+def run_shard_worker(
+    loop_class: type[LiveLoop],
+    loop_kwargs: dict[str, Any],
+    shard: int,
+    num_shards: int,
+    conn: Connection,
+) -> None:
+    """
+    Worker process entry point. Runs one loop iteration for its shard each time the
+    coordinator sends a run number and replies with that run's statistics. `None`
+    stops the worker.
+    """
+    # Forked from the coordinator, never share its database sockets.
+    connections.close_all()
+
+    loop = loop_class(shard=shard, num_shards=num_shards, **loop_kwargs)
+    loop.prepare_run()
+    while (run_number := conn.recv()) is not None:
+        loop.overall_stats.last_run_number = run_number - 1
+        loop.run_one_iteration()
+        conn.send(stats_to_dict(loop.current_stats))
+        # Only the coordinator flushes stats, don't let them pile up here.
+        loop.previous_stats.clear()
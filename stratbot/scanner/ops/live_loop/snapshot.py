@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Iterable, Optional
+
+from django.core.cache import caches
+from redis.exceptions import RedisError
+
+from stratbot.scanner.models.symbols import SymbolType
+
+
+logger = logging.getLogger(__name__)
+r = caches['markets'].client.get_client(write=True)
+
+TFC_TIMEFRAME = "D"
+
+
+@dataclass
+class SymbolSnapshot:
+    # timeframe -> (high, low) of the newest bar, only for timeframes with two or more
+    # bars, matching the early return in `LiveLoop.check_setup`.
+    current_bars: dict[str, tuple[float, float]] = field(default_factory=dict)
+    # timeframe -> open of the newest bar
+    opens: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class MarketSnapshot:
+    """
+    The newest bars and opens a loop run needs, read from the `barHistory` documents
+    once at the start of the run instead of once per setup. Lookups count as a hit when
+    the snapshot has the value and a miss when the caller has to fall back to
+    `SymbolRec`.
+    """
+
+    symbols: dict[str, SymbolSnapshot] = field(default_factory=dict)
+    fetch_duration: float = 0.0
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def fetch(
+        cls,
+        symbol_type: SymbolType,
+        timeframes_by_symbol: dict[str, Iterable[str]],
+        redis_client=None,
+    ) -> MarketSnapshot:
+        """
+        One `JSON.GET` per symbol, all in one non-transactional pipeline, asking only
+        for the last two bars of each timeframe in `timeframes_by_symbol` and the open
+        of the daily bar.
+        """
+        _time = perf_counter()
+        redis_client = redis_client if redis_client is not None else r
+        requests = []
+        with redis_client.pipeline(transaction=False) as pipe:
+            for symbol, timeframes in timeframes_by_symbol.items():
+                timeframes = sorted({str(tf) for tf in timeframes})
+                paths = [open_path(TFC_TIMEFRAME), *(bars_path(tf) for tf in timeframes)]
+                pipe.json().get(f"barHistory:{symbol_type}:{symbol}", *paths)
+                requests.append((symbol, timeframes, paths))
+            try:
+                results = pipe.execute(raise_on_error=False) if requests else []
+            except RedisError as e:
+                logger.warning(f"failed to fetch market snapshot: {e}")
+                results = []
+
+        snapshot = cls()
+        for (symbol, timeframes, paths), result in zip(requests, results):
+            if isinstance(result, Exception) or result is None:
+                continue
+            # a single path comes back as its list of matches rather than keyed by path
+            if len(paths) == 1:
+                result = {paths[0]: result}
+            snapshot.symbols[symbol] = symbol_snapshot(timeframes, result)
+        snapshot.fetch_duration = perf_counter() - _time
+        return snapshot
+
+    def current_bar(self, symbol: str, timeframe: str) -> Optional[tuple[float, float]]:
+        try:
+            bar = self.symbols[symbol].current_bars[str(timeframe)]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bar
+
+    def open_price(self, symbol: str, timeframe: str = TFC_TIMEFRAME) -> Optional[float]:
+        try:
+            open_price = self.symbols[symbol].opens[str(timeframe)]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return open_price
+
+
+def open_path(timeframe: str) -> str:
+    return f'$["{timeframe}"][-1].o'
+
+
+def bars_path(timeframe: str) -> str:
+    return f'$["{timeframe}"][-2:]'
+
+
+def symbol_snapshot(timeframes: list[str], result: dict[str, list]) -> SymbolSnapshot:
+    """
+    Build a `SymbolSnapshot` from the `JSON.GET` reply for `open_path(TFC_TIMEFRAME)`
+    and `bars_path(tf)` for each of `timeframes`.
+    """
+    snapshot = SymbolSnapshot()
+    opens = result.get(open_path(TFC_TIMEFRAME)) or []
+    if opens and opens[0] is not None:
+        snapshot.opens[TFC_TIMEFRAME] = opens[0]
+    for tf in timeframes:
+        bars = result.get(bars_path(tf)) or []
+        if bars:
+            snapshot.opens.setdefault(tf, bars[-1]['o'])
+        if len(bars) >= 2:
+            snapshot.current_bars[tf] = (bars[-1]['h'], bars[-1]['l'])
+    return snapshot
+
+
+def tfc_distance_ratio(price: float, open_price: float) -> float:
+    # Same rounding as `SymbolRec.tfc_state`, so a tiny move still reads as no move.
+    return round((price - open_price) / open_price, 5)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from time import sleep
+
+
+class AdaptivePacer:
+    """
+    Spaces out scan iterations: back to `min_interval` after an iteration that changed
+    setups, otherwise doubling up to `max_interval`, so an idle market doesn't spin.
+    """
+
+    def __init__(self, min_interval: float = 0.25, max_interval: float = 5.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+
+    def wait(self, elapsed: float, busy: bool) -> None:
+        if busy:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        sleep(max(0.0, self.interval - elapsed))
@@ -0,0 +1,255 @@
+"""
+Latest quotes for a symbol type, persisted by change rather than by universe.
+
+Quote consumers feed every price they see into a `QuoteBook`, which keeps the
+symbols whose price differs from what was last written, plus a heartbeat for symbols
+still quoting at the same price. `flush` writes those with a single
+`UPDATE ... FROM (VALUES ...)` on `SymbolRec`, each with the time it was last quoted
+as `as_of`, and publishes them to the `quotes:{symbol_type}` Redis hash (prices) and
+`quotes:{symbol_type}:as_of` hash (epoch seconds). Each publish also bumps
+`quotes:{symbol_type}:version` and stamps `quotes:{symbol_type}:published_at` in the
+same transaction, so `read_quote_snapshot` gets both hashes and their version as of one
+publish, and skips them entirely when the version hasn't moved.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from time import perf_counter, time
+from typing import Any, Iterable, Optional
+
+from django.core.cache import caches
+from django.db import OperationalError, connections
+from redis.exceptions import RedisError
+
+from stratbot.scanner.models.symbols import SymbolRec, SymbolType
+
+
+log = logging.getLogger(__name__)
+r = caches['markets'].client.get_client(write=True)
+
+
+def quotes_key(symbol_type: SymbolType | str) -> str:
+    return f'quotes:{symbol_type}'
+
+
+def quotes_as_of_key(symbol_type: SymbolType | str) -> str:
+    return f'{quotes_key(symbol_type)}:as_of'
+
+
+def quotes_version_key(symbol_type: SymbolType | str) -> str:
+    return f'{quotes_key(symbol_type)}:version'
+
+
+def quotes_published_at_key(symbol_type: SymbolType | str) -> str:
+    return f'{quotes_key(symbol_type)}:published_at'
+
+
+@dataclass(frozen=True)
+class QuoteSnapshot:
+    version: int
+    published_at: Optional[float]
+    # symbol -> price and symbol -> when it was last quoted (epoch seconds), empty when
+    # `changed` is False
+    quotes: dict[str, float]
+    as_of: dict[str, float]
+    changed: bool = True
+
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        """
+        Seconds since the last publish, None if nothing was ever published.
+        """
+        if self.published_at is None:
+            return None
+        return (now if now is not None else time()) - self.published_at
+
+    def fresh(self, max_age: float, now: Optional[float] = None) -> dict[str, float]:
+        """
+        Prices of the symbols quoted within the last `max_age` seconds.
+        """
+        cutoff = (now if now is not None else time()) - max_age
+        return {
+            symbol: price for symbol, price in self.quotes.items()
+            if self.as_of.get(symbol, 0.0) >= cutoff
+        }
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def read_quote_snapshot(
+    symbol_type: SymbolType, redis_client=None, since_version: Optional[int] = None
+) -> QuoteSnapshot:
+    """
+    The published quotes of `symbol_type`. The version is read first, and if it is still
+    `since_version` nothing else is fetched and the snapshot comes back with `changed`
+    False, the caller's copy is current. Otherwise the version, both hashes and the
+    publish time are read in one transaction, so they are all from the same publish.
+    """
+    redis_client = redis_client if redis_client is not None else r
+    if since_version is not None and int(redis_client.get(quotes_version_key(symbol_type)) or 0) == since_version:
+        return QuoteSnapshot(since_version, None, {}, {}, changed=False)
+
+    with redis_client.pipeline(transaction=True) as pipe:
+        pipe.get(quotes_version_key(symbol_type))
+        pipe.get(quotes_published_at_key(symbol_type))
+        pipe.hgetall(quotes_key(symbol_type))
+        pipe.hgetall(quotes_as_of_key(symbol_type))
+        version, published_at, quotes, as_of = pipe.execute()
+
+    return QuoteSnapshot(
+        int(version or 0),
+        float(published_at) if published_at is not None else None,
+        {_decode(symbol): float(price) for symbol, price in quotes.items()},
+        {_decode(symbol): float(ts) for symbol, ts in as_of.items()},
+    )
+
+
+@dataclass
+class QuoteFlushStatistics:
+    quotes_seen: int = 0
+    flushes: int = 0
+    failed_flushes: int = 0
+    rows_updated: int = 0
+    heartbeat_rows: int = 0
+    flush_seconds: float = 0.0
+    last_flush_rows: int = 0
+    last_flush_seconds: float = 0.0
+    version: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.last_flush_rows} quotes written in {self.last_flush_seconds * 1000:.2f} ms '
+            f'({self.rows_updated} rows, {self.heartbeat_rows} heartbeats, in {self.flushes} flushes, '
+            f'{self.quotes_seen} quotes seen, version {self.version})'
+        )
+
+
+class QuoteBook:
+    """
+    Change tracking for the quotes of `symbols`. Quotes for other symbols are ignored.
+
+    A symbol whose price changed is written on the next flush. A symbol still quoting
+    at the price last written is rewritten every `heartbeat` seconds, so its `as_of`
+    keeps tracking when it was last quoted while a halted symbol's goes stale.
+    """
+
+    def __init__(
+        self,
+        symbol_type: SymbolType,
+        symbols: Iterable[str],
+        redis_client=None,
+        using: str = 'default',
+        heartbeat: float = 10.0,
+    ):
+        self.symbol_type = symbol_type
+        self.symbols = set(symbols)
+        self.redis = redis_client if redis_client is not None else r
+        self.using = using
+        self.heartbeat = heartbeat
+        self.stats = QuoteFlushStatistics()
+        # symbol -> (price, as_of) as last written
+        self._written: dict[str, tuple[float, float]] = {}
+        # symbol -> (price, as_of) for changed prices
+        self._pending: dict[str, tuple[float, float]] = {}
+        # symbol -> last quoted, for quotes at the price last written
+        self._unchanged: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def update(self, symbol: str, price: Any, ts: Optional[float] = None) -> bool:
+        """
+        Record `price` for `symbol`, quoted at `ts` (epoch seconds, now by default).
+        Returns True if it is a change to be flushed.
+        """
+        self.stats.quotes_seen += 1
+        if symbol not in self.symbols:
+            return False
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            return False
+        ts = ts if ts is not None else time()
+        written = self._written.get(symbol)
+        if written is not None and written[0] == price:
+            self._pending.pop(symbol, None)
+            self._unchanged[symbol] = ts
+            return False
+        self._unchanged.pop(symbol, None)
+        self._pending[symbol] = (price, ts)
+        return True
+
+    def _due_heartbeats(self, now: float) -> dict[str, tuple[float, float]]:
+        return {
+            symbol: (self._written[symbol][0], seen)
+            for symbol, seen in self._unchanged.items()
+            if now - self._written[symbol][1] >= self.heartbeat
+        }
+
+    def flush(self, now: Optional[float] = None) -> int:
+        """
+        Persist the changed quotes and any heartbeats due. Returns the number of symbols
+        written. If the database errored they stay pending, unless a newer price came in
+        since.
+        """
+        heartbeats = self._due_heartbeats(now if now is not None else time())
+        if not self._pending and not heartbeats:
+            return 0
+        s = perf_counter()
+        pending, self._pending = self._pending, {}
+        for symbol in heartbeats:
+            del self._unchanged[symbol]
+        quotes = {**heartbeats, **pending}
+        try:
+            self._update_symbolrecs(quotes)
+        except OperationalError as e:
+            self._pending = {**pending, **self._pending}
+            for symbol, (_, seen) in heartbeats.items():
+                self._unchanged.setdefault(symbol, seen)
+            self.stats.failed_flushes += 1
+            log.error(f'{self.symbol_type}: failed to write {len(quotes)} quotes, retrying on the next flush: {e}')
+            return 0
+        self._publish(quotes)
+        self._written.update(quotes)
+
+        elapsed = perf_counter() - s
+        stats = self.stats
+        stats.flushes += 1
+        stats.rows_updated += len(quotes)
+        stats.heartbeat_rows += len(heartbeats)
+        stats.flush_seconds += elapsed
+        stats.last_flush_rows = len(quotes)
+        stats.last_flush_seconds = elapsed
+        return len(quotes)
+
+    def _update_symbolrecs(self, quotes: dict[str, tuple[float, float]]) -> None:
+        connection = connections[self.using]
+        qn = connection.ops.quote_name
+        opts = SymbolRec._meta
+        symbol, price, as_of = (qn(opts.get_field(name).column) for name in ('symbol', 'price', 'as_of'))
+        values = ', '.join(['(%s, %s, %s)'] * len(quotes))
+        sql = (
+            f'UPDATE {qn(opts.db_table)} AS s '
+            f'SET {price} = v.price::double precision, {as_of} = v.as_of::timestamptz '
+            f'FROM (VALUES {values}) AS v(symbol, price, as_of) '
+            f'WHERE s.{symbol} = v.symbol'
+        )
+        params = []
+        for symbol_, (price_, ts) in quotes.items():
+            params.extend((symbol_, price_, datetime.fromtimestamp(ts, tz=dt_timezone.utc)))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def _publish(self, quotes: dict[str, tuple[float, float]]) -> None:
+        try:
+            with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(quotes_key(self.symbol_type), mapping={k: price for k, (price, _) in quotes.items()})
+                pipe.hset(quotes_as_of_key(self.symbol_type), mapping={k: ts for k, (_, ts) in quotes.items()})
+                pipe.incr(quotes_version_key(self.symbol_type))
+                pipe.set(quotes_published_at_key(self.symbol_type), time())
+                self.stats.version = pipe.execute()[2]
+        except RedisError as e:
+            log.error(f'{self.symbol_type}: failed to publish {len(quotes)} quotes to redis: {e}')
@@ -0,0 +1,276 @@
+"""
+Scan a whole symbol universe for new setups in one pass.
+
+`historical.refresh_setups` works one `SymbolRec` at a time: its own `Setup` query,
+one Redis read per timeframe and a `CandlePair`/`SetupBuilder` per candle. Here the
+unexpired setups are looked up once, and symbols are scanned in chunks: the chunk's
+candle frames are fetched in a single pipelined read, candle pairs, priorities and RR
+are computed as arrays per timeframe and its new setups go out in one `bulk_create`
+before the next chunk is loaded, so only one chunk of frames is held at a time.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Final, Optional
+
+import numpy as np
+import pandas as pd
+from django.core.cache import caches
+from django.utils import timezone
+
+from stratbot.scanner.models.symbols import Setup, SymbolRec, SymbolType, SymbolTypeManager
+from stratbot.scanner.models.timeframes import Timeframe, TIMEFRAMES_INTRADAY
+from .candles import metrics
+from .candles.candlepair import prioritize_setups
+from .candles.columnar import candles_from_bytes
+from .candles.levels import CandleLevels
+
+
+log = logging.getLogger(__name__)
+cache = caches['markets']
+r = cache.client.get_client(write=True)
+
+
+PERIOD_TIMEFRAMES: Final[frozenset[Timeframe]] = frozenset({
+    Timeframe.WEEKS_1, Timeframe.MONTHS_1, Timeframe.QUARTERS_1, Timeframe.YEARS_1,
+})
+# Patterns where the target is taken from the candle before the target candle.
+INSIDE_TARGET_STRAT_IDS: Final[frozenset[str]] = frozenset({'1'})
+DEFAULT_CHUNK_SIZE: Final[int] = 500
+
+
+@dataclass
+class SetupScanStatistics:
+    num_symbols: int = 0
+    num_chunks: int = 0
+    num_frames: int = 0
+    num_setups: int = 0
+    read_duration: float = 0.0
+    scan_duration: float = 0.0
+    write_duration: float = 0.0
+
+    @property
+    def total_duration(self) -> float:
+        return self.read_duration + self.scan_duration + self.write_duration
+
+
+def load_frames(keys: list[tuple[SymbolRec, Timeframe]]) -> list[pd.DataFrame]:
+    """
+    Fetch the cached candle frame for every (symbol, timeframe) in one round trip.
+    """
+    pipe = r.pipeline(transaction=False)
+    for symbolrec, tf in keys:
+        pipe.get(f'df:{symbolrec.symbol_type}:{symbolrec.symbol}:{tf}')
+    return [candles_from_bytes(data) for data in pipe.execute()]
+
+
+def open_candle_check(symbol_type: SymbolType, tf: Timeframe, now: datetime) -> Callable[[pd.Timestamp], bool]:
+    """
+    `SymbolRec.is_df_open` with the exchange calendar lookups done once per timeframe
+    instead of once per frame. The returned function takes the newest candle timestamp.
+    """
+    calendar = SymbolRec.exchange_calendar
+    delta = SymbolRec.CANDLE_EXPIRE_DELTAS[tf]
+    period_open = False
+    market_open = False
+    if tf in PERIOD_TIMEFRAMES:
+        period_open = calendar.session_index(tf).session_containing(now) is not None
+    elif symbol_type == SymbolType.STOCK:
+        market_open = calendar.is_open()
+
+    def is_open(timestamp: pd.Timestamp) -> bool:
+        if symbol_type == SymbolType.CRYPTO and now < timestamp + delta:
+            return True
+        if tf in PERIOD_TIMEFRAMES:
+            return period_open
+        if market_open:
+            return not (tf in TIMEFRAMES_INTRADAY and now > timestamp + delta)
+        return False
+
+    return is_open
+
+
+def _candle_dict(candle: pd.Series) -> dict:
+    # Same NaN cleanup as `SetupBuilder.with_candle_pair`.
+    return {k: None if pd.isnull(v) else v for k, v in candle.to_dict().items()}
+
+
+def scan_timeframe(
+    tf: Timeframe,
+    frames: list[tuple[SymbolRec, pd.DataFrame]],
+    now: datetime,
+    rr_min: float = 0.0,
+) -> list[Setup]:
+    """
+    Build the new setups for one timeframe across many symbols, the batched equivalent
+    of calling `SymbolRec.scan_strat_setups([tf])` on each of them.
+    """
+    is_open_by_type: dict[str, Callable[[pd.Timestamp], bool]] = {}
+    closed: list[tuple[SymbolRec, pd.DataFrame]] = []
+    for symbolrec, df in frames:
+        if df.empty:
+            continue
+        if (is_open := is_open_by_type.get(symbolrec.symbol_type)) is None:
+            is_open = is_open_by_type[symbolrec.symbol_type] = open_candle_check(symbolrec.symbol_type, tf, now)
+        if is_open(df.index[-1]):
+            df = df.iloc[:-1]
+        if len(df) < 2:
+            log.info(f'[{symbolrec.symbol}] [{tf}] not enough candles')
+            continue
+        closed.append((symbolrec, df))
+    if not closed:
+        return []
+
+    def candles(column: str, position: int, dtype: type = np.float64) -> np.ndarray:
+        return np.array([
+            df[column].iat[position] if len(df) >= -position else np.nan
+            for _, df in closed
+        ], dtype=dtype)
+
+    # Object arrays, `strat_id` is NaN for a frame's first candle.
+    target_strat_id = candles('strat_id', -2, dtype=object)
+    trigger_strat_id = candles('strat_id', -1, dtype=object)
+    priority = prioritize_setups(
+        target_strat_id,
+        trigger_strat_id,
+        candles('candle_shape', -1, dtype=object),
+        candles('green', -1, dtype=bool),
+        candles('red', -1, dtype=bool),
+    )
+
+    # `SymbolRec.TRADE_DIRECTIONS`: 2D candles only set up bulls, 2U only bears, insides
+    # both, outsides nothing.
+    bull_rows = np.flatnonzero((priority > 0) & np.isin(trigger_strat_id, ['2D', '1']))
+    bear_rows = np.flatnonzero((priority > 0) & np.isin(trigger_strat_id, ['2U', '1']))
+    rows = np.concatenate([bull_rows, bear_rows])
+    direction = np.concatenate([np.ones(len(bull_rows), dtype=np.int8), -np.ones(len(bear_rows), dtype=np.int8)])
+    if not len(rows):
+        return []
+
+    bull = direction == 1
+    trigger_high, trigger_low = candles('high', -1)[rows], candles('low', -1)[rows]
+    trigger = np.where(bull, trigger_high, trigger_low)
+    stop = trigger_high - (trigger_high - trigger_low) / 2
+
+    from_inside = np.isin(target_strat_id[rows], list(INSIDE_TARGET_STRAT_IDS))
+    initial_target = np.where(
+        from_inside,
+        np.where(bull, candles('high', -3)[rows], candles('low', -3)[rows]),
+        np.where(bull, candles('high', -2)[rows], candles('low', -2)[rows]),
+    )
+
+    # Insides set up both directions, so the levels are shared between their rows.
+    levels_by_row: dict[int, CandleLevels] = {}
+    targets: list[list[float]] = []
+    pmg = np.zeros(len(rows), dtype=np.int64)
+    for i, (row, row_direction) in enumerate(zip(rows, direction)):
+        if (levels := levels_by_row.get(row)) is None:
+            levels = levels_by_row[row] = CandleLevels.from_df(closed[row][1])
+        if np.isnan(initial_target[i]):
+            targets.append([])
+        else:
+            targets.append(levels.targets(initial_target[i], trigger[i], row_direction))
+        pmg[i] = levels.pmg(row_direction)
+
+    first_target = np.array([row_targets[0] if row_targets else np.nan for row_targets in targets])
+    rr = metrics.risk_reward(trigger, first_target, stop)
+    valid = np.isnan(first_target) | (rr >= rr_min)
+
+    setups = []
+    expirations: dict[tuple[str, pd.Timestamp], datetime] = {}
+    for i in np.flatnonzero(valid):
+        row = rows[i]
+        symbolrec, df = closed[row]
+        trigger_candle, target_candle = df.iloc[-1], df.iloc[-2]
+        timestamp = trigger_candle.name
+        # Expiration only depends on the symbol type, timeframe and timestamp, and most
+        # symbols share the same newest candle.
+        expiration_key = (symbolrec.symbol_type, timestamp)
+        if (expires := expirations.get(expiration_key)) is None:
+            expires = expirations[expiration_key] = symbolrec.get_setup_expiration(tf, timestamp)
+        setups.append(Setup(
+            symbol_rec=symbolrec,
+            tf=tf,
+            direction=int(direction[i]),
+            timestamp=timestamp,
+            expires=expires,
+            candle_tag=trigger_candle.candle_shape,
+            trigger_candle=_candle_dict(trigger_candle),
+            target_candle=_candle_dict(target_candle),
+            trigger=float(trigger[i]),
+            stop=float(stop[i]),
+            pattern=[target_strat_id[row], trigger_strat_id[row]],
+            targets=targets[i],
+            priority=int(priority[row]),
+            rr=float(rr[i]),
+            pmg=int(pmg[i]),
+        ))
+    return setups
+
+
+def scan_setups(
+    symbol_type: SymbolType,
+    tfs: Optional[list[Timeframe]] = None,
+    rr_min: float = 0.0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> SetupScanStatistics:
+    """
+    Scan every symbol of `symbol_type` for new setups, skipping (symbol, timeframe)
+    pairs that still have an unexpired setup, and write them with one `bulk_create`
+    per chunk of `chunk_size` symbols.
+    """
+    stats = SetupScanStatistics()
+    now = timezone.now()
+    symbol_type = SymbolType(symbol_type)
+    tfs = [Timeframe(tf) for tf in (tfs or SymbolTypeManager.scan_timeframes(symbol_type))]
+
+    start = time.perf_counter()
+    symbolrecs = list(SymbolRec.objects.filter(symbol_type=symbol_type))
+    skip = set(
+        Setup.objects
+        .filter(symbol_rec__symbol_type=symbol_type, expires__gt=now)
+        .values_list('symbol_rec_id', 'tf')
+        .distinct()
+    )
+    stats.num_symbols = len(symbolrecs)
+    stats.read_duration = time.perf_counter() - start
+
+    for offset in range(0, len(symbolrecs), chunk_size):
+        chunk = symbolrecs[offset:offset + chunk_size]
+        start = time.perf_counter()
+        keys = [
+            (symbolrec, tf)
+            for tf in tfs
+            for symbolrec in chunk
+            if (symbolrec.pk, tf) not in skip
+        ]
+        frames = load_frames(keys)
+        stats.num_chunks += 1
+        stats.num_frames += len(keys)
+        stats.read_duration += time.perf_counter() - start
+
+        start = time.perf_counter()
+        frames_by_tf: dict[Timeframe, list[tuple[SymbolRec, pd.DataFrame]]] = {tf: [] for tf in tfs}
+        for (symbolrec, tf), df in zip(keys, frames):
+            frames_by_tf[tf].append((symbolrec, df))
+        del keys, frames
+        setups = []
+        for tf in tfs:
+            setups.extend(scan_timeframe(tf, frames_by_tf.pop(tf), now, rr_min=rr_min))
+        stats.scan_duration += time.perf_counter() - start
+
+        start = time.perf_counter()
+        Setup.objects.bulk_create(setups, batch_size=2_000, ignore_conflicts=True)
+        stats.num_setups += len(setups)
+        stats.write_duration += time.perf_counter() - start
+
+    log.info(
+        f'{symbol_type}: scanned {stats.num_frames} frames for {stats.num_symbols} symbols '
+        f'in {stats.num_chunks} chunks, '
+        f'{stats.num_setups} setups written in {stats.total_duration:.2f}s '
+        f'(read {stats.read_duration:.2f}s, scan {stats.scan_duration:.2f}s, write {stats.write_duration:.2f}s)'
+    )
+    return stats
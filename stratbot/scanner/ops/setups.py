@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from dirtyfields.dirtyfields import reset_state
+from django.utils import timezone
+
+from stratbot.scanner.models.symbols import Setup
+
+# stamped on every pass over a setup that is in force, not a change in its state
+BOOKKEEPING_FIELDS = frozenset({'last_triggered', 'updated_at'})
+
+
+def persist_dirty_setups(setups: Iterable[Setup], batch_size: int = 500) -> list[Setup]:
+    """
+    `bulk_update` the setups with changed fields, and only those fields, then mark them
+    clean. `bulk_update` skips `auto_now`, so `updated_at` is stamped here for anything
+    tracking changes off of it. Returns the setups written.
+    """
+    needs_save = list(dict.fromkeys(setup for setup in setups if setup.is_dirty()))
+    if not needs_save:
+        return []
+
+    save_fields = {'updated_at'}
+    updated_at = timezone.now()
+    for setup in needs_save:
+        save_fields |= set(setup.get_dirty_fields())
+        setup.updated_at = updated_at
+    Setup.objects.bulk_update(needs_save, list(save_fields), batch_size=batch_size)
+    for setup in needs_save:
+        reset_state(sender=setup.__class__, instance=setup)
+    return needs_save
+
+
+def changed_setups(setups: Iterable[Setup]) -> list[Setup]:
+    """
+    The dirty setups with a change beyond `BOOKKEEPING_FIELDS`: in force, negated,
+    triggered, targets and so on. Call it before `persist_dirty_setups` marks them clean.
+    """
+    return [setup for setup in setups if setup.get_dirty_fields().keys() - BOOKKEEPING_FIELDS]
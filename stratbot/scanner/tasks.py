@@ -1,6 +1,5 @@
 from __future__ import annotations
 import logging
-import pickle
 
 import msgspec
 import pandas as pd
@@ -18,8 +17,9 @@ from django.core.cache import caches
 from .models.symbols import SymbolRec, SymbolType, Setup, Exchange
 from .models.exchange_calendar import ExchangeCalendar
 from .models.timeframes import Timeframe
-from .ops import historical
+from .ops import historical, setup_scanner
 from .integrations.binance.bridges import async_binance_bridge
+from .ops.candles.columnar import candles_to_bytes
 from .ops.candles.metrics import atr_metrics
 
 
@@ -51,6 +51,11 @@ def add_new_symbol(symbol: str, symbol_type: str) -> None:
 @celery_app.task()
 def queue_refresh_historical_db(symbol_type: str, overwrite: bool = False) -> None:
     symbol_type = SymbolType(symbol_type)
+    if symbol_type == SymbolType.CRYPTO:
+        # Klines for every symbol are fetched concurrently in one task.
+        refresh_crypto_historical_db.delay(overwrite)
+        return
+
     signatures: list[Signature] = []
     for symbolrec in SymbolRec.objects.filter(symbol_type=symbol_type).iterator(chunk_size=2_000):
         symbol_signature = refresh_historical_db.si(symbolrec.pk, overwrite)
@@ -65,6 +70,12 @@ def refresh_historical_db(symbolrec_pk: int, overwrite: bool = False) -> None:
     historical.refresh_historical_db(symbolrec, tf=Timeframe.MINUTES_1, overwrite=overwrite)
 
 
+@celery_app.task()
+def refresh_crypto_historical_db(overwrite: bool = False) -> None:
+    symbolrecs = list(SymbolRec.objects.filter(symbol_type=SymbolType.CRYPTO))
+    historical.refresh_crypto_historical_db(symbolrecs, tf=Timeframe.MINUTES_1, overwrite=overwrite)
+
+
 @celery_app.task()
 def queue_refresh_redpanda(symbol_type: str) -> None:
     symbol_type = SymbolType(symbol_type)
@@ -228,15 +239,15 @@ def cache_historical_dfs(symbolrec_pk: int) -> None:
     symbolrec = SymbolRec.objects.get(pk=symbolrec_pk)
 
     one_df = parse_ohlcv_df(symbolrec.one.tail(100_000).copy())
-    serialized_df = pickle.dumps(one_df.tail(10_000))
-    r.set(f'df:{symbolrec.symbol_type}:{symbolrec.symbol}:1', serialized_df)
+    pipe = r.pipeline(transaction=False)
+    pipe.set(f'df:{symbolrec.symbol_type}:{symbolrec.symbol}:1', candles_to_bytes(one_df.tail(10_000)))
 
     daily_df = parse_ohlcv_df(symbolrec.daily_db.copy())
     for tf in symbolrec.scan_timeframes:
         df = daily_df if tf >= Timeframe.DAYS_1 else one_df
         df = historical_resample(symbolrec.symbol_type, tf, df)
-        serialized_df = pickle.dumps(df)
-        r.set(f'df:{symbolrec.symbol_type}:{symbolrec.symbol}:{tf}', serialized_df)
+        pipe.set(f'df:{symbolrec.symbol_type}:{symbolrec.symbol}:{tf}', candles_to_bytes(df))
+    pipe.execute()
 
 
 # @celery_app.task()
@@ -296,15 +307,10 @@ def cache_historical_dfs(symbolrec_pk: int) -> None:
 
 
 @celery_app.task()
-def queue_setup_refresh(symbol_type: str) -> None:
-    symbol_type = SymbolType(symbol_type)
-    signatures: list[Signature] = []
-    for symbolrec in SymbolRec.objects.filter(symbol_type=symbol_type).iterator(chunk_size=2_000):
-        symbol_signature = refresh_setups.si(symbolrec.pk)
-        signatures.append(symbol_signature)
-    celery_group = group(signatures)
-    # celery_group.delay()
-    celery_group.apply_async(countdown=5)
+def queue_setup_refresh(symbol_type: str, timeframes: list[Timeframe] = None) -> None:
+    # One batched scan of the whole universe rather than a `refresh_setups` task per
+    # symbol, see `ops.setup_scanner`.
+    setup_scanner.scan_setups(SymbolType(symbol_type), tfs=timeframes)
 
 
 @celery_app.task()
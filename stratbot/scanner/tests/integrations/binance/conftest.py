@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+import pytest
+from aiohttp import web
+
+
+@dataclass
+class BinanceStub:
+    """
+    State of the local stand-in for the futures REST API. `responses` is a queue of
+    `(status, headers)` to send instead of klines, for throttling and error cases.
+    """
+    base_url: str = ""
+    requests: list[dict] = field(default_factory=list)
+    responses: deque = field(default_factory=deque)
+    used_weight: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+
+def _klines(start_ms: int, end_ms: int, interval_ms: int, limit: int) -> list[list]:
+    rows = []
+    for open_ms in range(start_ms, end_ms, interval_ms)[:limit]:
+        close_ms = open_ms + interval_ms - 1
+        rows.append([open_ms, "1.0", "2.0", "0.5", "1.5", "10.0", close_ms, "15.0", 3, "5.0", "7.5", "0"])
+    return rows
+
+
+@pytest.fixture
+def binance_stub():
+    stub = BinanceStub()
+    intervals = {"1m": 60_000, "1d": 86_400_000}
+
+    async def continuous_klines(request: web.Request) -> web.Response:
+        stub.requests.append(dict(request.query))
+        stub.in_flight += 1
+        stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+        try:
+            # Give concurrent requests a chance to overlap.
+            await asyncio.sleep(0.01)
+            stub.used_weight += 5
+            headers = {"X-MBX-USED-WEIGHT-1M": str(stub.used_weight)}
+            if stub.responses:
+                status, extra_headers = stub.responses.popleft()
+                return web.json_response({"code": -1}, status=status, headers={**headers, **extra_headers})
+            query = request.query
+            rows = _klines(
+                int(query["startTime"]),
+                int(query["endTime"]),
+                intervals[query["interval"]],
+                int(query["limit"]),
+            )
+            return web.json_response(rows, headers=headers)
+        finally:
+            stub.in_flight -= 1
+
+    app = web.Application()
+    app.router.add_get("/fapi/v1/continuousKlines", continuous_klines)
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    stub.base_url = f"http://127.0.0.1:{port}"
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield stub
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
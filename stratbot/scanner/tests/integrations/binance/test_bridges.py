@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytz
+import pytest
+
+from stratbot.scanner.integrations.binance.bridges import AsyncBinanceBridge, WeightRateLimiter
+from stratbot.scanner.models.timeframes import Timeframe
+
+
+START = datetime(2024, 1, 1, tzinfo=pytz.utc)
+
+
+def _bridge(binance_stub, **kwargs) -> AsyncBinanceBridge:
+    kwargs = {"max_concurrency": 4, "backoff": 0.01, **kwargs}
+    return AsyncBinanceBridge(client=None, base_url=binance_stub.base_url, **kwargs)
+
+
+def test_historical_extends_chunks(binance_stub):
+    bridge = _bridge(binance_stub)
+    end = START + timedelta(minutes=2_500)
+
+    symbol, df = asyncio.run(bridge.historical("BTCUSDT", Timeframe.MINUTES_1, START, end))
+
+    assert symbol == "BTCUSDT"
+    assert len(binance_stub.requests) == 3
+    assert len(df) == 2_500
+    assert df.index.is_monotonic_increasing
+    assert df.index[0] == START
+    assert list(df.columns[:6]) == ["timestamp", "open", "high", "low", "close", "volume"]
+
+
+def test_bulk_query_runs_concurrently(binance_stub):
+    bridge = _bridge(binance_stub)
+    historical_map = [
+        (f"SYM{i}USDT", Timeframe.DAYS_1, datetime.utcnow() - timedelta(days=30))
+        for i in range(12)
+    ]
+
+    results = asyncio.run(bridge.bulk_query_historical(historical_map))
+
+    assert [symbol for symbol, _ in results] == [symbol for symbol, _, _ in historical_map]
+    assert all(len(df) in (30, 31) for _, df in results)
+    assert 1 < binance_stub.max_in_flight <= 4
+
+
+def test_bulk_query_skips_failed_symbols(binance_stub):
+    binance_stub.responses.append((500, {}))
+    bridge = _bridge(binance_stub, max_retries=0)
+    historical_map = [(f"SYM{i}USDT", Timeframe.DAYS_1, START) for i in range(3)]
+
+    results = asyncio.run(bridge.bulk_query_historical(historical_map))
+
+    assert len(results) == 2
+    assert {symbol for symbol, _ in results} < {symbol for symbol, _, _ in historical_map}
+
+
+def test_retries_throttled_and_server_errors(binance_stub):
+    binance_stub.responses.extend([(429, {"Retry-After": "0"}), (503, {})])
+    bridge = _bridge(binance_stub)
+
+    _, df = asyncio.run(bridge.historical("BTCUSDT", Timeframe.MINUTES_1, START, START + timedelta(minutes=10)))
+
+    assert len(binance_stub.requests) == 3
+    assert len(df) == 10
+
+
+def test_gives_up_after_max_retries(binance_stub):
+    binance_stub.responses.extend([(500, {})] * 3)
+    bridge = _bridge(binance_stub, max_retries=2)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(bridge.historical("BTCUSDT", Timeframe.MINUTES_1, START, START + timedelta(minutes=10)))
+    assert len(binance_stub.requests) == 3
+
+
+def test_rate_limiter_waits_for_weight():
+    async def scenario() -> float:
+        limiter = WeightRateLimiter(limit=10, period=0.5)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(4):
+            await limiter.acquire(5)
+        return loop.time() - start
+
+    # 10 weight up front, the next 10 refill over half a second.
+    assert asyncio.run(scenario()) >= 0.4
+
+
+def test_rate_limiter_observes_server_weight():
+    limiter = WeightRateLimiter(limit=100)
+    limiter.observe(used_weight=95)
+
+    assert limiter.tokens <= 5
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import MagicMock
+
+import orjson
+import pytest
+from django.db import DataError, IntegrityError, OperationalError
+
+from stratbot.scanner.integrations.binance.consumer import BinanceCandleConsumer
+from stratbot.scanner.integrations.consumer import BaseConsumer
+from stratbot.scanner.models.pricerecs import CryptoPriceRec
+from stratbot.scanner.models.symbols import SymbolRec
+
+
+class FakeMessage:
+    def __init__(self, key: str, value: dict):
+        self._key = key.encode()
+        self._value = orjson.dumps(value)
+
+    def error(self):
+        return None
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+
+class FakeKafkaConsumer:
+    def __init__(self):
+        self.batches: list[list[FakeMessage]] = []
+        self.consumed = 0
+        self.committed = 0
+        self.consume_args = []
+        self.paused = False
+
+    def consume(self, num_messages, timeout):
+        self.consume_args.append((num_messages, timeout))
+        msgs = self.batches.pop(0) if self.batches else []
+        self.consumed += len(msgs)
+        return msgs
+
+    def commit(self, asynchronous=True):
+        self.committed = self.consumed
+
+    def assignment(self):
+        return ['partition 0']
+
+    def pause(self, partitions):
+        self.paused = True
+
+    def resume(self, partitions):
+        self.paused = False
+
+
+def kline(symbol: str, minute: int, closed: bool = True) -> FakeMessage:
+    start = 1_704_067_200_000 + minute * 60_000
+    return FakeMessage(symbol, {
+        'ps': symbol, 'E': start + 59_000, 'x': closed, 'ct': 'PERPETUAL', 't': start, 'T': start + 59_999,
+        'i': '1m', 'o': '1.0', 'h': '2.0', 'l': '0.5', 'c': '1.5', 'v': '10', 'n': 5, 'q': '15.0',
+        'V': '1', 'Q': '1.5',
+    })
+
+
+@pytest.fixture
+def consumer(mocker) -> BinanceCandleConsumer:
+    symbolrecs = MagicMock()
+    symbolrecs.values_list.return_value = ['BTCUSDT', 'ETHUSDT']
+    mocker.patch.object(SymbolRec.objects, 'filter', return_value=symbolrecs)
+    mocker.patch.object(BaseConsumer, '_set_consumer', lambda self: setattr(self, 'consumer', FakeKafkaConsumer()))
+    consumer = BinanceCandleConsumer()
+    consumer.buffer.max_rows = 3
+    return consumer
+
+
+def test_closed_bars_are_written_in_one_bulk_insert(consumer, mocker):
+    bulk_create = mocker.patch.object(CryptoPriceRec.objects, 'bulk_create')
+    consumer.consumer.batches = [[kline('BTCUSDT', 0), kline('ETHUSDT', 0), kline('BTCUSDT', 1, closed=False)]]
+
+    assert asyncio.run(consumer.consume_batch()) == 3
+
+    assert consumer.consumer.consume_args == [(consumer.batch_size, consumer.batch_timeout)]
+    assert len(consumer.buffer) == 2
+    bulk_create.assert_not_called()
+    assert consumer.consumer.committed == 0
+
+    consumer.consumer.batches = [[kline('ETHUSDT', 1)]]
+    asyncio.run(consumer.consume_batch())
+
+    bulk_create.assert_called_once()
+    rows, = bulk_create.call_args.args
+    assert [(row.symbol, row.exchange, row.time.minute) for row in rows] == [
+        ('BTCUSDT', 'BINANCE', 0), ('ETHUSDT', 'BINANCE', 0), ('ETHUSDT', 'BINANCE', 1),
+    ]
+    assert bulk_create.call_args.kwargs == {'ignore_conflicts': True}
+    assert len(consumer.buffer) == 0
+    assert consumer.consumer.committed == 4
+
+
+def test_offsets_wait_for_a_successful_flush(consumer, mocker):
+    bulk_create = mocker.patch.object(CryptoPriceRec.objects, 'bulk_create', side_effect=OperationalError('down'))
+    consumer.consumer.batches = [[kline('BTCUSDT', minute) for minute in range(3)]]
+
+    asyncio.run(consumer.consume_batch())
+    assert len(consumer.buffer) == 3
+    assert consumer.consumer.committed == 0
+    assert consumer.buffer.stats.failed_flushes == 1
+
+    bulk_create.side_effect = None
+    consumer.buffer._retry_at = 0.0
+    asyncio.run(consumer.consume_batch())
+    assert len(consumer.buffer) == 0
+    assert consumer.consumer.committed == 3
+    assert consumer.buffer.stats.rows_flushed == 3
+
+
+def test_buffer_flushes_when_old_enough(consumer, mocker):
+    bulk_create = mocker.patch.object(CryptoPriceRec.objects, 'bulk_create')
+    consumer.buffer.max_age = 0.0
+    consumer.consumer.batches = [[kline('BTCUSDT', 0)]]
+
+    asyncio.run(consumer.consume_batch())
+    bulk_create.assert_called_once()
+    assert consumer.consumer.committed == 1
+
+
+def test_failed_flushes_back_off(consumer, mocker):
+    bulk_create = mocker.patch.object(CryptoPriceRec.objects, 'bulk_create', side_effect=OperationalError('down'))
+    buffer = consumer.buffer
+    buffer.min_retry_delay, buffer.max_retry_delay = 0.5, 2.0
+    for minute in range(3):
+        buffer.add({'symbol': 'BTCUSDT', 'close': float(minute)})
+
+    delays = []
+    for _ in range(4):
+        assert buffer.due()
+        assert buffer.flush() is False
+        assert not buffer.due()
+        delays.append(buffer._retry_delay)
+        buffer._retry_at = 0.0
+    assert delays == [0.5, 1.0, 2.0, 2.0]
+    assert bulk_create.call_count == 4
+
+    bulk_create.side_effect = None
+    assert buffer.flush() is True
+    assert (buffer._retry_delay, buffer._retry_at) == (0.0, None)
+
+
+def test_full_buffer_pauses_consumption(consumer, mocker):
+    bulk_create = mocker.patch.object(CryptoPriceRec.objects, 'bulk_create', side_effect=OperationalError('down'))
+    consumer.buffer.max_buffered = 4
+    consumer.consumer.batches = [[kline('BTCUSDT', minute) for minute in range(3)], [kline('ETHUSDT', 0)]]
+
+    asyncio.run(consumer.consume_batch())
+    assert not consumer.consumer.paused
+    consumer.buffer._retry_at = 0.0
+    asyncio.run(consumer.consume_batch())
+    assert len(consumer.buffer) == 4
+    assert not consumer.consumer.paused
+
+    asyncio.run(consumer.consume_batch())
+    assert consumer.consumer.paused
+    assert consumer.consumer.committed == 0
+
+    bulk_create.side_effect = None
+    consumer.buffer._retry_at = 0.0
+    asyncio.run(consumer.consume_batch())
+    assert len(consumer.buffer) == 0
+    assert consumer.consumer.committed == 4
+    asyncio.run(consumer.consume_batch())
+    assert not consumer.consumer.paused
+
+
+@pytest.mark.parametrize('error', [DataError, IntegrityError])
+def test_rejected_rows_are_dropped(consumer, mocker, error):
+    written = []
+
+    def bulk_create(objs, ignore_conflicts):
+        if any(obj.close < 0 for obj in objs):
+            raise error('bad row')
+        written.extend(obj.time.minute for obj in objs)
+
+    mocker.patch.object(CryptoPriceRec.objects, 'bulk_create', side_effect=bulk_create)
+    bad = kline('BTCUSDT', 2)
+    bad._value = orjson.dumps({**orjson.loads(bad._value), 'c': '-1.0'})
+    consumer.buffer.max_rows = 6
+    consumer.consumer.batches = [[kline('BTCUSDT', minute) for minute in range(2)] + [bad] +
+                                 [kline('BTCUSDT', minute) for minute in range(3, 6)]]
+
+    asyncio.run(consumer.consume_batch())
+
+    assert sorted(written) == [0, 1, 3, 4, 5]
+    assert (consumer.buffer.stats.rows_flushed, consumer.buffer.stats.rows_dropped) == (5, 1)
+    assert len(consumer.buffer) == 0
+    assert consumer.consumer.committed == 6
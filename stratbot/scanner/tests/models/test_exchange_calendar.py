@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import pandas as pd
+import pytz
+
+from stratbot.scanner.models.exchange_calendar import SessionIndex
+
+
+def _ts(value: str) -> pd.Timestamp:
+    return pd.Timestamp(value, tz=pytz.UTC)
+
+
+def _index() -> SessionIndex:
+    schedule = pd.DataFrame({
+        "pre": [_ts("2024-01-02 09:00"), _ts("2024-01-03 09:00"), pd.NaT],
+        "market_open": [_ts("2024-01-02 14:30"), _ts("2024-01-03 14:30"), pd.NaT],
+        "market_close": [_ts("2024-01-02 21:00"), _ts("2024-01-03 21:00"), pd.NaT],
+        "post": [_ts("2024-01-03 01:00"), _ts("2024-01-04 01:00"), pd.NaT],
+    })
+    return SessionIndex.from_schedule(schedule)
+
+
+def test_session_index_drops_empty_periods():
+    assert len(_index()) == 2
+
+
+def test_next_session_after():
+    index = _index()
+
+    assert index.next_open_after(_ts("2024-01-02 15:00")) == _ts("2024-01-03 14:30")
+    assert index.next_open_after(_ts("2024-01-02 14:30")) == _ts("2024-01-03 14:30")
+    assert index.next_session_after(_ts("2024-01-02 14:30"), inclusive=True) == (
+        _ts("2024-01-02 14:30"), _ts("2024-01-02 21:00"),
+    )
+    assert index.next_open_after(_ts("2024-01-03 15:00")) is None
+
+
+def test_last_session_before():
+    index = _index()
+
+    assert index.last_session_before(_ts("2024-01-03 14:30"))[1] == _ts("2024-01-02 21:00")
+    assert index.last_session_before(_ts("2024-01-03 14:31"))[1] == _ts("2024-01-03 21:00")
+    assert index.last_session_before(_ts("2024-01-01")) is None
+
+
+def test_session_containing_and_is_open():
+    index = _index()
+
+    assert index.session_containing(_ts("2024-01-02 21:00"))[0] == _ts("2024-01-02 14:30")
+    assert index.session_containing(_ts("2024-01-02 22:00")) is None
+    assert index.is_open(_ts("2024-01-02 20:59"))
+    assert not index.is_open(_ts("2024-01-02 21:00"))
+    # Naive datetimes are UTC.
+    assert index.is_open(datetime(2024, 1, 3, 15, 0))
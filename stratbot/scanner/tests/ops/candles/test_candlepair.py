@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from stratbot.scanner.ops.candles.candlepair import CandlePair, prioritize_setups
+
+
+STRAT_IDS = ["1", "2U", "2D", "3"]
+SHAPES = ["", "hammer", "shooter"]
+
+
+def test_prioritize_setups_matches_candle_pair():
+    pairs = list(itertools.product(STRAT_IDS, STRAT_IDS, SHAPES, [True, False], [True, False]))
+
+    expected = []
+    for target_sid, trigger_sid, shape, green, red in pairs:
+        candle_pair = CandlePair(
+            trigger_candle=pd.Series({"strat_id": trigger_sid, "candle_shape": shape, "green": green, "red": red}),
+            target_candle=pd.Series({"strat_id": target_sid, "candle_shape": "", "green": False, "red": False}),
+        )
+        expected.append(candle_pair.prioritize_setup() or 0)
+
+    columns = list(zip(*pairs))
+    priority = prioritize_setups(
+        np.array(columns[0], dtype=object),
+        np.array(columns[1], dtype=object),
+        np.array(columns[2], dtype=object),
+        np.array(columns[3], dtype=bool),
+        np.array(columns[4], dtype=bool),
+    )
+
+    assert priority.tolist() == expected
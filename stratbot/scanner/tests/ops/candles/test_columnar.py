@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import pickle
+
+import pandas as pd
+import pytest
+
+from stratbot.scanner.ops.candles.columnar import candles_from_bytes, candles_to_bytes
+from stratbot.scanner.ops.candles.metrics import stratify_df
+
+
+@pytest.fixture
+def ohlcv() -> pd.DataFrame:
+    index = pd.date_range("2024-01-01", periods=4, freq="D", tz="UTC", name="time")
+    return pd.DataFrame(
+        {
+            "o": [10.0, 11.0, 10.5, 12.0],
+            "h": [12.0, 11.5, 13.0, 12.5],
+            "l": [9.0, 10.0, 9.5, 11.0],
+            "c": [11.0, 10.5, 12.5, 11.5],
+            "v": [100.0, 200.0, 150.0, 120.0],
+        },
+        index=index,
+    )
+
+
+def test_round_trip_is_stratified(ohlcv):
+    df = candles_from_bytes(candles_to_bytes(ohlcv))
+    expected = stratify_df(ohlcv.rename(columns={"o": "open", "h": "high", "l": "low", "c": "close", "v": "volume"}))
+
+    pd.testing.assert_frame_equal(df, expected, check_categorical=False, check_freq=False)
+    assert df["strat_id"].tolist()[1:] == ["1", "3", "1"]
+    assert not df["close"].to_numpy().flags.writeable
+
+
+def test_legacy_pickles_are_still_read(ohlcv):
+    df = candles_from_bytes(pickle.dumps(ohlcv))
+
+    assert "strat_id" in df.columns
+    assert df["high"].tolist() == ohlcv["h"].tolist()
+
+
+def test_missing_key_is_empty():
+    assert candles_from_bytes(None).empty
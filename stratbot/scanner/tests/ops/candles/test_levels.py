@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from stratbot.scanner.models.symbols import SymbolRec
+from stratbot.scanner.ops.candles.levels import CandleLevels
+from stratbot.scanner.ops.candles.metrics import find_targets, pmg_length, risk_reward
+
+
+@pytest.fixture
+def random_walk():
+    rng = np.random.default_rng(7)
+    closes = 100 + np.cumsum(rng.normal(0, 1, 2_000))
+    return closes + rng.uniform(0, 1, len(closes)), closes - rng.uniform(0, 1, len(closes))
+
+
+def test_targets_match_full_scan(random_walk):
+    highs, lows = random_walk
+    levels = CandleLevels(highs, lows)
+
+    for trigger in (highs[-1], highs[-1] * 1.01, highs[-1] * 0.97, highs.max() * 0.999):
+        for target in (trigger, trigger * 1.002, trigger * 1.05, trigger * 0.98):
+            assert levels.targets(target, trigger, 1) == find_targets(highs, target, trigger, 1)
+    for trigger in (lows[-1], lows[-1] * 0.99, lows[-1] * 1.03, lows.min() * 1.001):
+        for target in (trigger, trigger * 0.998, trigger * 0.95, trigger * 1.02):
+            assert levels.targets(target, trigger, -1) == find_targets(lows, target, trigger, -1)
+
+
+def test_targets_skip_levels_near_trigger():
+    highs = np.array([15.0, 11.0, 14.0, 12.0, 10.005, 13.0, 10.0])
+    levels = CandleLevels(highs, highs - 1)
+
+    assert levels.targets(10.0, 10.0, 1) == [13.0, 14.0, 15.0]
+    assert levels.targets(10.0, 10.0, 1, limit=2) == [13.0, 14.0]
+    assert levels.targets(20.0, 10.0, 1) == []
+
+
+def test_pmg(random_walk):
+    highs, lows = random_walk
+    levels = CandleLevels(highs, lows)
+
+    assert levels.pmg(1) == pmg_length(highs, 1)
+    assert levels.pmg(-1) == pmg_length(lows, -1)
+    assert levels.pmg(0) == 0
+
+
+def test_risk_reward_matches_symbolrec():
+    trigger = np.array([10.0, 10.0, 10.0, 10.0, 10.0])
+    target = np.array([13.0, 7.0, 12.0, 10.0, np.nan])
+    stop = np.array([9.0, 11.5, 11.0, 9.0, 9.0])
+
+    expected = [
+        float(SymbolRec.calculate_rr(Decimal(str(tr)), Decimal(str(ta)), Decimal(str(st))))
+        for tr, ta, st in zip(trigger[:4], target[:4], stop[:4])
+    ]
+
+    assert risk_reward(trigger, target, stop).tolist() == expected + [0.0]
+    assert float(risk_reward(10.0, 13.0, 9.0)) == 3.0
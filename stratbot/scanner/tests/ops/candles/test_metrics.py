@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from stratbot.scanner.ops.candles.metrics import find_targets, is_pmg, pmg_length, stratify_df, stratify_tail
+
+
+def _ohlc(rows: list[tuple[float, float, float, float]], start: str = "2024-01-01") -> pd.DataFrame:
+    index = pd.date_range(start, periods=len(rows), freq="D", tz="UTC", name="time")
+    return pd.DataFrame(rows, columns=["open", "high", "low", "close"], index=index)
+
+
+def _assert_same_strat(df: pd.DataFrame, expected: pd.DataFrame) -> None:
+    pd.testing.assert_frame_equal(
+        df.astype({"strat_id": str, "candle_shape": str}),
+        expected.astype({"strat_id": str, "candle_shape": str}),
+    )
+
+
+def test_stratify_tail_appends_new_candle():
+    rows = [(10, 12, 9, 11), (11, 11.5, 10, 10.5), (10.5, 13, 9.5, 12.5)]
+    full = _ohlc(rows + [(12.5, 14, 12, 13.5)])
+
+    df = stratify_tail(stratify_df(_ohlc(rows)), full.iloc[[-1]])
+
+    _assert_same_strat(df, stratify_df(full))
+    assert df["strat_id"].iloc[-1] == "2U"
+
+
+def test_stratify_tail_updates_newest_candle():
+    rows = [(10, 12, 9, 11), (11, 11.5, 10, 10.5), (10.5, 11, 10.2, 10.8)]
+    updated = _ohlc(rows[:-1] + [(10.5, 11, 9.8, 9.9)])
+
+    df = stratify_tail(stratify_df(_ohlc(rows)), updated.iloc[[-1]])
+
+    _assert_same_strat(df, stratify_df(updated))
+    assert df["strat_id"].iloc[-1] == "2D"
+
+
+def test_find_targets_newest_first_and_further_out():
+    highs = np.array([15.0, 11.0, 14.0, 12.0, 10.005, 13.0, 10.0])
+
+    # 10.0 and 10.005 are within 0.1% of the trigger, 12.0 and 11.0 are behind newer highs.
+    assert find_targets(highs, 10.0, 10.0, 1) == [13.0, 14.0, 15.0]
+    assert find_targets(highs, 10.0, 10.0, 1, limit=2) == [13.0, 14.0]
+    assert find_targets(highs, 20.0, 10.0, 1) == []
+
+
+def test_find_targets_bear():
+    lows = np.array([5.0, 8.0, 6.0, 7.0, 9.0])
+
+    assert find_targets(lows, 8.5, 9.0, -1) == [7.0, 6.0, 5.0]
+
+
+def test_pmg_length_matches_is_pmg():
+    df = _ohlc([(1, 9, 1, 1), (1, 8, 2, 1), (1, 8, 3, 1), (1, 7, 2.5, 1), (1, 6, 4, 1)])
+
+    for direction in (1, -1):
+        column = "high" if direction == 1 else "low"
+        expected = is_pmg(df, direction, threshold=0)[1]
+        assert pmg_length(df[column].to_numpy(), direction) == expected
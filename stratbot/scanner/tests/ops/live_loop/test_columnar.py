@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from stratbot.scanner.models.symbols import NegatedReason, Setup, SymbolRec, SymbolType
+from stratbot.scanner.ops.live_loop.base import OneLoopRunStatistics
+from stratbot.scanner.ops.live_loop.columnar import SetupColumns
+from stratbot.scanner.ops.live_loop.crypto import CryptoLoop
+from stratbot.scanner.ops.live_loop.snapshot import MarketSnapshot, SymbolSnapshot
+
+
+def _setup(symbolrec: SymbolRec, **kwargs) -> Setup:
+    defaults = {
+        "symbol_rec": symbolrec,
+        "tf": "60",
+        "direction": 1,
+        "trigger": 100.0,
+        "stop": 99.0,
+        "targets": [105.0],
+        "rr": 5.0,
+        "pattern": ["2D", "2U"],
+        "timestamp": timezone.now(),
+        "expires": timezone.now() + timedelta(hours=1),
+    }
+    defaults.update(kwargs)
+    return Setup(**defaults)
+
+
+def test_evaluate_flags_changed_rows():
+    spy = SymbolRec(symbol="SPY", symbol_type=SymbolType.STOCK)
+    qqq = SymbolRec(symbol="QQQ", symbol_type=SymbolType.STOCK)
+    triggered = _setup(spy)
+    untouched = _setup(spy, direction=-1, trigger=95.0, targets=[90.0])
+    low_rr = _setup(spy, rr=0.5)
+    hit = _setup(qqq, trigger=50.0, targets=[51.0])
+    expired = _setup(qqq, expires=timezone.now() - timedelta(minutes=1))
+    columns = SetupColumns(
+        [(spy, triggered), (spy, untouched), (spy, low_rr), (qqq, hit), (qqq, expired)]
+    )
+
+    prices = columns.symbol_prices({"SPY": 101.0, "QQQ": 50.5})
+    bar_highs = np.array([np.nan, 51.2])
+    bar_lows = np.array([np.nan, 49.0])
+    tfc_directions = np.zeros(2, dtype=np.int8)
+    now_ns = pd.Timestamp(timezone.now()).value
+    evaluation = columns.evaluate(prices, bar_highs, bar_lows, tfc_directions, now_ns)
+
+    assert evaluation.examined.tolist() == [True, True, True, True, False]
+    assert evaluation.negated_rr.tolist() == [False, False, True, False, False]
+    assert evaluation.triggered.tolist() == [True, False, False, True, False]
+    assert evaluation.hit_magnitude.tolist() == [False, False, False, True, False]
+    assert evaluation.changed.tolist() == [True, False, True, True, False]
+
+    columns.commit(evaluation)
+    assert columns.in_force.tolist() == [True, False, False, True, False]
+    assert columns.negated.tolist() == [False, False, True, False, False]
+
+
+def _mixed_loop(columnar: bool) -> tuple[CryptoLoop, list[Setup]]:
+    btc = SymbolRec(pk=1, symbol="BTCUSDT", symbol_type=SymbolType.CRYPTO, price=101.0)
+    eth = SymbolRec(pk=2, symbol="ETHUSDT", symbol_type=SymbolType.CRYPTO, price=50.5)
+    # no quote
+    sol = SymbolRec(pk=3, symbol="SOLUSDT", symbol_type=SymbolType.CRYPTO, price=20.0)
+    setups = [
+        # in force for the first time
+        _setup(btc, pk=1),
+        # in force again
+        _setup(btc, pk=2, initial_trigger=timezone.now() - timedelta(minutes=5)),
+        # no longer in force
+        _setup(btc, pk=3, trigger=102.0, targets=[110.0], in_force=True),
+        # untouched
+        _setup(btc, pk=4, direction=-1, trigger=95.0, stop=96.0, targets=[90.0]),
+        # negated on magnitude threshold
+        _setup(btc, pk=5, targets=[100.01]),
+        # negated on rr
+        _setup(btc, pk=6, rr=0.5),
+        # bearish 15 while the daily is green, negated on tfc
+        _setup(btc, pk=7, tf="15", direction=-1, trigger=102.0, stop=103.0, targets=[95.0]),
+        # hit magnitude through the current bar's high
+        _setup(eth, pk=8, trigger=50.0, stop=49.5, targets=[51.0]),
+        _setup(sol, pk=9, trigger=19.0, stop=18.5, targets=[21.0]),
+    ]
+
+    loop = CryptoLoop(columnar=columnar)
+    loop.current_stats = OneLoopRunStatistics(
+        loop=loop, start_datetime=None, start_perf=0.0, end_datetime=None, end_perf=0.0
+    )
+    loop.store._symbolrecs = [btc, eth, sol]
+    loop.store._setups = setups
+    loop.store.symbols_needs_refresh = False
+    loop.store.setups_needs_refresh = False
+    loop.store.setup_mapping_needs_refresh = True
+    loop.quotes = {"BTCUSDT": 101.0, "ETHUSDT": 50.5}
+    loop.market_snapshot = MarketSnapshot(symbols={
+        "BTCUSDT": SymbolSnapshot(
+            current_bars={"60": (101.5, 99.0), "15": (101.5, 100.5)}, opens={"D": 98.0}
+        ),
+        "ETHUSDT": SymbolSnapshot(current_bars={"60": (51.2, 49.0)}, opens={"D": 50.0}),
+    })
+    return loop, setups
+
+
+def _outcome(loop: CryptoLoop, setups: list[Setup]) -> list[tuple]:
+    return [
+        (
+            setup.pk,
+            setup.negated,
+            setup.in_force,
+            setup.hit_magnitude,
+            setup.initial_trigger is not None,
+            setup.last_triggered is not None,
+        )
+        for setup in setups
+    ]
+
+
+def test_columnar_matches_row_path():
+    row_loop, row_setups = _mixed_loop(columnar=False)
+    for timeframe in row_loop.scan_timeframes:
+        for symbolrec in row_loop.store.symbolrecs:
+            for setup in row_loop.store.setup_mapping[symbolrec][timeframe]:
+                row_loop.check_setup(symbolrec, setup)
+
+    columnar_loop, columnar_setups = _mixed_loop(columnar=True)
+    columnar_loop.check_setups_columnar()
+
+    assert _outcome(columnar_loop, columnar_setups) == _outcome(row_loop, row_setups)
+    assert sorted(columnar_loop.pending_negated_reasons) == sorted(row_loop.pending_negated_reasons) == [
+        (5, NegatedReason.MAG_THRESHOLD),
+        (6, NegatedReason.RR_MINIMUM),
+        (7, NegatedReason.TFC_CONFLICT),
+    ]
+    assert columnar_loop.current_stats.num_setups_examined == row_loop.current_stats.num_setups_examined == 9
+    # sanity check that the mix covers every branch
+    assert [setup.pk for setup in row_setups if setup.in_force] == [1, 2, 8]
+    assert [setup.pk for setup in row_setups if setup.hit_magnitude] == [8]
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import copy
+from datetime import datetime, timedelta
+
+import pytest
+from django.utils import timezone
+
+from stratbot.scanner.models.symbols import Setup, SymbolRec, SymbolType
+from stratbot.scanner.models.timeframes import Timeframe
+from stratbot.scanner.ops.live_loop.base import OneLoopRunStatistics
+from stratbot.scanner.ops.live_loop.crypto import CryptoLoop
+from stratbot.scanner.tests.ops.live_loop.test_columnar import _setup
+
+
+LOOKUPS = {
+    "exact": lambda value, other: value == other,
+    "gt": lambda value, other: value > other,
+    "gte": lambda value, other: value >= other,
+    "in": lambda value, other: value in other,
+}
+
+
+class FakeQuerySet:
+    """
+    Just enough of a `QuerySet` over in-memory rows for the store's queries. Rows are
+    copied on the way out, the same as every query returning fresh instances.
+    """
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def select_related(self, *fields) -> FakeQuerySet:
+        return self
+
+    def filter(self, **lookups) -> FakeQuerySet:
+        rows = self.rows
+        for key, other in lookups.items():
+            *path, lookup = key.split("__")
+            if lookup not in LOOKUPS:
+                path, lookup = [*path, lookup], "exact"
+            rows = [row for row in rows if LOOKUPS[lookup](self._value(row, path), other)]
+        return FakeQuerySet(rows)
+
+    def values_list(self, *fields) -> list[tuple]:
+        return [tuple(getattr(row, field) for field in fields) for row in self.rows]
+
+    def __iter__(self):
+        return iter([copy.copy(row) for row in self.rows])
+
+    @staticmethod
+    def _value(row, path: list[str]):
+        for name in path:
+            row = getattr(row, name)
+        return row
+
+
+class FakeManager:
+    def __init__(self):
+        self.rows: dict[int, object] = {}
+
+    def save(self, row) -> None:
+        self.rows[row.pk] = row
+
+    def delete(self, pk: int) -> None:
+        del self.rows[pk]
+
+    def select_related(self, *fields) -> FakeQuerySet:
+        return FakeQuerySet(list(self.rows.values()))
+
+    def filter(self, **lookups) -> FakeQuerySet:
+        return FakeQuerySet(list(self.rows.values())).filter(**lookups)
+
+
+@pytest.fixture
+def db(mocker) -> tuple[FakeManager, FakeManager]:
+    symbols, setups = FakeManager(), FakeManager()
+    mocker.patch.object(SymbolRec, "objects", symbols)
+    mocker.patch.object(Setup, "objects", setups)
+    return symbols, setups
+
+
+@pytest.fixture
+def loop() -> CryptoLoop:
+    loop = CryptoLoop(incremental=True)
+    loop.current_stats = OneLoopRunStatistics(
+        loop=loop, start_datetime=None, start_perf=0.0, end_datetime=None, end_perf=0.0
+    )
+    return loop
+
+
+def _symbol(pk: int, symbol: str) -> SymbolRec:
+    return SymbolRec(pk=pk, symbol=symbol, symbol_type=SymbolType.CRYPTO)
+
+
+def _write(setups: FakeManager, symbolrec: SymbolRec, updated_at: datetime, **kwargs) -> Setup:
+    setup = _setup(symbolrec, updated_at=updated_at, **kwargs)
+    setups.save(setup)
+    return setup
+
+
+def _held(loop: CryptoLoop) -> dict[int, Setup]:
+    """
+    Setups the store holds, checking `setups` and `setup_mapping` agree.
+    """
+    held = {setup.pk: setup for setup in loop.store.setups}
+    mapped = [
+        setup
+        for setups_by_timeframe in loop.store.setup_mapping.values()
+        for timeframe_setups in setups_by_timeframe.values()
+        for setup in timeframe_setups
+    ]
+    assert sorted(setup.pk for setup in mapped) == sorted(held)
+    assert all(held[setup.pk] is setup for setup in mapped)
+    return held
+
+
+@pytest.fixture
+def loaded(db, loop) -> tuple[FakeManager, FakeManager, datetime]:
+    symbols, setups = db
+    btc = _symbol(1, "BTCUSDT")
+    symbols.save(btc)
+    loaded_at = timezone.now()
+    _write(setups, btc, loaded_at - timedelta(seconds=1), pk=1)
+    _write(setups, btc, loaded_at - timedelta(seconds=1), pk=2, expires=loaded_at + timedelta(minutes=2))
+    loop.store.check_and_refresh_all()
+    assert loop.current_stats.setups_refreshed is True
+    assert set(_held(loop)) == {1, 2}
+    return symbols, setups, loaded_at
+
+
+def test_expired_setup_is_dropped(loop, loaded):
+    _, _, loaded_at = loaded
+
+    assert loop.store.apply_changes(loaded_at + timedelta(minutes=1)) == 0
+    assert set(_held(loop)) == {1, 2}
+
+    assert loop.store.apply_changes(loaded_at + timedelta(minutes=3)) == 1
+    assert set(_held(loop)) == {1}
+
+
+def test_changed_setup_replaces_the_held_one(loop, loaded):
+    symbols, setups, loaded_at = loaded
+    btc = symbols.rows[1]
+
+    _write(setups, btc, loaded_at + timedelta(seconds=1), pk=1, trigger=101.0, stop=100.0)
+    assert loop.store.apply_changes(loaded_at + timedelta(seconds=2)) == 1
+    held = _held(loop)
+    assert held[1].trigger == 101.0
+    assert loop.store.setup_mapping[btc][Timeframe("60")] == [held[2], held[1]]
+
+
+def test_setups_added_and_removed_by_another_writer(loop, loaded):
+    symbols, setups, loaded_at = loaded
+    btc = symbols.rows[1]
+
+    _write(setups, btc, loaded_at + timedelta(seconds=1), pk=3, tf="15")
+    # negated elsewhere, no longer active
+    _write(setups, btc, loaded_at + timedelta(seconds=1), pk=1, negated=True)
+    assert loop.store.apply_changes(loaded_at + timedelta(seconds=2)) == 2
+    held = _held(loop)
+    assert set(held) == {2, 3}
+    assert loop.store.setup_mapping[btc][Timeframe("15")] == [held[3]]
+
+    # a delete can't be seen through `updated_at`, only by the next full refresh
+    setups.delete(2)
+    assert loop.store.apply_changes(loaded_at + timedelta(seconds=3)) == 0
+    assert set(_held(loop)) == {2, 3}
+
+    loop.store._full_refresh_at -= loop.store.full_refresh_interval
+    loop.store.check_and_refresh_all()
+    assert loop.current_stats.symbols_refreshed is True
+    assert set(_held(loop)) == {3}
+
+
+def test_symbols_added_and_removed(loop, loaded):
+    symbols, setups, loaded_at = loaded
+    btc = symbols.rows[1]
+    eth = _symbol(2, "ETHUSDT")
+    symbols.save(eth)
+    _write(setups, eth, loaded_at + timedelta(seconds=1), pk=3)
+
+    assert loop.store.apply_changes(loaded_at + timedelta(seconds=2)) == 2
+    assert [symbolrec.pk for symbolrec in loop.store.symbolrecs] == [1, 2]
+    assert set(loop.store.price_record_mapping[eth]) == set(loop.scan_timeframes)
+    assert set(_held(loop)) == {1, 2, 3}
+
+    symbols.delete(1)
+    setups.delete(1)
+    setups.delete(2)
+    assert loop.store.apply_changes(loaded_at + timedelta(seconds=3)) == 1
+    assert [symbolrec.pk for symbolrec in loop.store.symbolrecs] == [2]
+    assert btc not in loop.store.setup_mapping
+    assert btc not in loop.store.price_record_mapping
+    assert set(_held(loop)) == {3}
+
+
+def test_rows_with_an_unchanged_updated_at_are_skipped(loop, loaded):
+    _, _, loaded_at = loaded
+    before = _held(loop)
+    columns = loop.store.setup_columns
+
+    # both rows are within `sync_overlap` of the last sync and come back from the query
+    assert loop.store.apply_changes(loaded_at + timedelta(seconds=1)) == 0
+    after = _held(loop)
+    assert all(after[pk] is before[pk] for pk in before)
+    assert loop.store.setup_columns is columns
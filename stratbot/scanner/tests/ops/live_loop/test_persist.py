@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import pytest
+from dirtyfields.dirtyfields import reset_state
+
+from stratbot.scanner.models.symbols import NegatedReason, Setup, SymbolRec, SymbolType
+from stratbot.scanner.ops.live_loop import base
+from stratbot.scanner.ops.live_loop.base import OneLoopRunStatistics
+from stratbot.scanner.ops.live_loop.crypto import CryptoLoop
+from stratbot.scanner.tests.ops.live_loop.test_columnar import _setup
+
+
+@pytest.fixture
+def loop(mocker) -> CryptoLoop:
+    mocker.patch.object(base, "transaction")
+    loop = CryptoLoop()
+    loop.current_stats = OneLoopRunStatistics(
+        loop=loop, start_datetime=None, start_perf=0.0, end_datetime=None, end_perf=0.0
+    )
+    loop._negated_reasons = {
+        reason: NegatedReason(pk=pk, reason=reason)
+        for pk, (reason, _) in enumerate(NegatedReason.REASONS, start=1)
+    }
+    return loop
+
+
+def _stored_setups(loop: CryptoLoop, count: int) -> list[Setup]:
+    btc = SymbolRec(pk=1, symbol="BTCUSDT", symbol_type=SymbolType.CRYPTO)
+    setups = [_setup(btc, pk=pk) for pk in range(1, count + 1)]
+    for setup in setups:
+        # as if loaded from the database
+        setup._state.adding = False
+        reset_state(sender=Setup, instance=setup)
+    loop.store._setups = setups
+    loop.store.setups_needs_refresh = False
+    return setups
+
+
+def test_negations_are_written_in_one_batch(loop, mocker):
+    bulk_update = mocker.patch.object(Setup.objects, "bulk_update")
+    through = Setup.negated_reasons.through
+    bulk_create = mocker.patch.object(through.objects, "bulk_create")
+    mag, rr, untouched = _stored_setups(loop, 3)
+
+    loop.negate_setup(mag, NegatedReason.MAG_THRESHOLD)
+    loop.negate_setup(rr, NegatedReason.RR_MINIMUM)
+    # already negated, its reason was recorded the first time
+    loop.negate_setup(rr, NegatedReason.TFC_CONFLICT)
+    loop.check_and_persist_updated_setups()
+
+    bulk_update.assert_called_once()
+    instances, fields = bulk_update.call_args.args
+    assert set(instances) == {mag, rr}
+    assert set(fields) == {"negated", "updated_at"}
+
+    bulk_create.assert_called_once()
+    rows, = bulk_create.call_args.args
+    assert sorted((row.setup_id, row.negatedreason_id) for row in rows) == [(1, 3), (2, 1)]
+    assert bulk_create.call_args.kwargs["ignore_conflicts"] is True
+
+    assert loop.current_stats.num_setups_updated == 2
+    assert loop.current_stats.num_negated_reasons_written == 2
+    assert loop.current_stats.setups_persist_duration is not None
+    assert loop.pending_negated_reasons == []
+    assert not untouched.is_dirty()
+
+
+def test_nothing_to_write(loop, mocker):
+    bulk_update = mocker.patch.object(Setup.objects, "bulk_update")
+    bulk_create = mocker.patch.object(Setup.negated_reasons.through.objects, "bulk_create")
+    _stored_setups(loop, 2)
+
+    loop.check_and_persist_updated_setups()
+
+    bulk_update.assert_not_called()
+    bulk_create.assert_not_called()
+    assert loop.current_stats.num_setups_updated == 0
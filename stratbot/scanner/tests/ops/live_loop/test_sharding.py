@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+import pytest
+
+from stratbot.scanner.ops.live_loop import base
+from stratbot.scanner.ops.live_loop.base import OneLoopRunStatistics
+from stratbot.scanner.ops.live_loop.crypto import CryptoLoop
+from stratbot.scanner.ops.live_loop.sharding import merge_run_statistics, shard_for_symbol, stats_to_dict
+
+
+def test_shard_for_symbol_is_stable_and_consistent():
+    symbols = [f"SYM{i}" for i in range(2_000)]
+    four = {symbol: shard_for_symbol(symbol, 4) for symbol in symbols}
+    five = {symbol: shard_for_symbol(symbol, 5) for symbol in symbols}
+
+    assert four == {symbol: shard_for_symbol(symbol, 4) for symbol in symbols}
+    assert set(four.values()) == {0, 1, 2, 3}
+    assert min(Counter(four.values()).values()) > 400
+    # Growing the shard count only moves symbols onto the new shard.
+    moved = [symbol for symbol in symbols if four[symbol] != five[symbol]]
+    assert all(five[symbol] == 4 for symbol in moved)
+
+
+def test_merge_run_statistics():
+    stats = OneLoopRunStatistics(
+        loop=None, start_datetime=None, start_perf=0.0, end_datetime=None, end_perf=0.0
+    )
+    shard_stats = [
+        {
+            "fully_ran": True, "exit_reason": "", "exit_reason_detail": "",
+            "symbols_refreshed": False, "symbols_refreshed_duration": None,
+            "setups_refreshed": True, "setups_refresh_duration": 0.2,
+            "price_records_refreshed": False, "price_records_refreshed_duration": None,
+            "quotes_refresh_duration": 0.001, "num_quotes": 250, "quotes_version": 7,
+            "market_snapshot_fetch_duration": 0.004, "market_snapshot_symbols": 8,
+            "market_snapshot_hits": 20, "market_snapshot_misses": 1,
+            "setups_persist_duration": 0.01, "num_negated_reasons_written": 2,
+            "num_symbols": 10, "num_setups": 30, "num_price_records": 0,
+            "num_setups_examined": 30, "num_setups_updated": 2,
+            "num_setups_triggered": 0, "num_alerts_attempted": 0,
+        },
+        {
+            "fully_ran": False, "exit_reason": "ValueError", "exit_reason_detail": "boom",
+            "symbols_refreshed": False, "symbols_refreshed_duration": None,
+            "setups_refreshed": True, "setups_refresh_duration": 0.5,
+            "price_records_refreshed": False, "price_records_refreshed_duration": None,
+            "quotes_refresh_duration": 0.002, "num_quotes": 250, "quotes_version": 8,
+            "market_snapshot_fetch_duration": 0.003, "market_snapshot_symbols": 9,
+            "market_snapshot_hits": 6, "market_snapshot_misses": 0,
+            "setups_persist_duration": 0.02, "num_negated_reasons_written": 1,
+            "num_symbols": 12, "num_setups": 40, "num_price_records": 0,
+            "num_setups_examined": 10, "num_setups_updated": 0,
+            "num_setups_triggered": 0, "num_alerts_attempted": 0,
+        },
+    ]
+
+    merge_run_statistics(stats, shard_stats)
+
+    assert stats.num_symbols == 22
+    assert stats.num_setups_examined == 40
+    assert stats.setups_refresh_duration == 0.5
+    assert stats.setups_refreshed is True
+    assert stats.symbols_refreshed_duration is None
+    assert stats.num_quotes == 250
+    assert stats.quotes_version == 8
+    assert stats.market_snapshot_fetch_duration == 0.004
+    assert stats.setups_persist_duration == 0.02
+    assert stats.num_negated_reasons_written == 3
+    assert (stats.market_snapshot_symbols, stats.market_snapshot_hits, stats.market_snapshot_misses) == (17, 26, 1)
+    assert stats.exit_reason == "ValueError"
+    assert stats.exit_reason_detail == "shard 1: ValueError boom"
+
+
+def _flaky_shard_worker(loop_class, loop_kwargs, shard, num_shards, conn):
+    """
+    Stands in for `run_shard_worker`. Shard 1 crashes or hangs on the first run and
+    behaves after being restarted.
+    """
+    while (run_number := conn.recv()) is not None:
+        if shard == 1 and run_number == 1:
+            if os.environ["SHARD_FAILURE"] == "crash":
+                os._exit(1)
+            time.sleep(60)
+        stats = OneLoopRunStatistics(
+            loop=None, start_datetime=None, start_perf=0.0, end_datetime=None, end_perf=0.0,
+            run_number=run_number, fully_ran=True, num_setups_examined=10,
+        )
+        conn.send(stats_to_dict(stats))
+
+
+@pytest.mark.parametrize("failure, exit_reason", [
+    ("crash", "ShardWorkerDied"),
+    ("hang", "ShardWorkerTimeout"),
+])
+def test_failed_shard_worker_is_restarted(mocker, failure, exit_reason):
+    mocker.patch.dict(os.environ, {"SHARD_FAILURE": failure})
+    mocker.patch.object(base, "run_shard_worker", _flaky_shard_worker)
+    mocker.patch.object(base, "connections")
+    loop = CryptoLoop(num_shards=2, shard_timeout=timedelta(seconds=1))
+    loop.start_shard_workers()
+    try:
+        failed_pid = loop.shard_workers[1][0].pid
+
+        loop.current_stats = OneLoopRunStatistics(
+            loop=loop, start_datetime=None, start_perf=0.0, end_datetime=None, end_perf=0.0, run_number=1
+        )
+        loop.run_shards()
+        assert loop.current_stats.num_setups_examined == 10
+        assert loop.current_stats.exit_reason == exit_reason
+        assert loop.current_stats.exit_reason_detail.startswith(f"shard 1: {exit_reason}")
+        process = loop.shard_workers[1][0]
+        assert process.pid != failed_pid and process.is_alive()
+
+        loop.current_stats = OneLoopRunStatistics(
+            loop=loop, start_datetime=None, start_perf=0.0, end_datetime=None, end_perf=0.0, run_number=2
+        )
+        loop.run_shards()
+        assert loop.current_stats.num_setups_examined == 20
+        assert loop.current_stats.exit_reason == ""
+    finally:
+        loop.stop_shard_workers()
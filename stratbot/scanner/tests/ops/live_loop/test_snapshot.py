@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from stratbot.scanner.models.symbols import SymbolRec, SymbolType
+from stratbot.scanner.ops.live_loop.columnar import SetupColumns
+from stratbot.scanner.ops.live_loop.snapshot import MarketSnapshot, bars_path, open_path
+from stratbot.scanner.tests.ops.live_loop.test_columnar import _setup
+
+
+def _bar(o: float, h: float, low: float, c: float) -> dict:
+    return {"o": o, "h": h, "l": low, "c": c, "v": 1.0, "sid": "2U"}
+
+
+BAR_HISTORY = {
+    "barHistory:stock:SPY": {
+        "D": [_bar(98.0, 101.0, 97.0, 100.0), _bar(100.0, 102.0, 99.0, 101.5)],
+        "60": [_bar(99.0, 100.0, 98.5, 99.5), _bar(99.5, 101.0, 99.0, 100.5), _bar(100.5, 103.0, 100.0, 102.0)],
+        "15": [_bar(101.0, 101.5, 100.5, 101.2), _bar(101.2, 102.5, 101.0, 102.0)],
+    },
+    "barHistory:stock:QQQ": {
+        "D": [_bar(50.0, 51.0, 49.0, 50.5)],
+        "60": [_bar(50.0, 50.5, 49.5, 50.2)],
+    },
+}
+
+
+class FakeJSON:
+    def __init__(self, pipe: FakePipeline):
+        self.pipe = pipe
+
+    def get(self, key, *paths):
+        self.pipe.commands.append((key, paths))
+
+
+class FakePipeline:
+    def __init__(self):
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def json(self):
+        return FakeJSON(self)
+
+    def execute(self, raise_on_error=True):
+        results = []
+        for key, paths in self.commands:
+            document = BAR_HISTORY.get(key)
+            if document is None:
+                results.append(None)
+                continue
+            matches = {}
+            for path in paths:
+                tf = path[3:path.index('"]')]
+                bars = document.get(tf, [])
+                matches[path] = [bars[-1]["o"]] if path == open_path(tf) and bars else bars[-2:]
+            results.append(matches if len(paths) > 1 else matches[paths[0]])
+        return results
+
+
+class FakeRedis:
+    def __init__(self):
+        self.pipelines = []
+
+    def pipeline(self, transaction=True):
+        pipe = FakePipeline()
+        self.pipelines.append(pipe)
+        return pipe
+
+
+@pytest.fixture
+def snapshot() -> MarketSnapshot:
+    client = FakeRedis()
+    snapshot = MarketSnapshot.fetch(
+        SymbolType.STOCK, {"SPY": ["60", "15"], "QQQ": ["60"], "IWM": ["60"]}, redis_client=client
+    )
+    assert len(client.pipelines) == 1
+    paths = (open_path("D"), bars_path("15"), bars_path("60"))
+    assert client.pipelines[0].commands[0] == ("barHistory:stock:SPY", paths)
+    return snapshot
+
+
+def test_fetch_keeps_newest_bars_and_opens(snapshot):
+    assert set(snapshot.symbols) == {"SPY", "QQQ"}
+    assert snapshot.current_bar("SPY", "60") == (103.0, 100.0)
+    assert snapshot.current_bar("SPY", "15") == (102.5, 101.0)
+    assert snapshot.open_price("SPY") == 100.0
+    # one bar isn't enough for a current/previous pair
+    assert snapshot.current_bar("QQQ", "60") is None
+    assert snapshot.open_price("IWM") is None
+    assert (snapshot.hits, snapshot.misses) == (3, 2)
+
+
+def test_columns_read_from_snapshot(snapshot):
+    spy = SymbolRec(symbol="SPY", symbol_type=SymbolType.STOCK, price=99.0)
+    columns = SetupColumns([(spy, _setup(spy)), (spy, _setup(spy, tf="15", direction=-1))])
+    rows = np.array([True, True])
+
+    highs, lows = columns.current_bars(rows, snapshot)
+    assert highs[columns.bar_idx].tolist() == [103.0, 102.5]
+    assert lows[columns.bar_idx].tolist() == [100.0, 101.0]
+
+    directions = columns.tfc_directions(rows, snapshot)
+    assert directions.tolist() == [-1]
+    assert snapshot.misses == 0
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from stratbot.scanner.models.pricerecs import CryptoPriceRec
+from stratbot.scanner.models.symbols import SymbolRec, SymbolType
+from stratbot.scanner.models.timeframes import Timeframe
+from stratbot.scanner.ops import historical
+
+
+def _frame(symbol: str) -> pd.DataFrame:
+    return pd.DataFrame({"symbol": [symbol], "close": [1.0]})
+
+
+@pytest.fixture
+def bulk_query(mocker):
+    mocker.patch.object(historical, "transaction")
+    return mocker.patch.object(historical.async_binance_bridge, "bulk_query_historical")
+
+
+def test_overwrite_replaces_only_complete_symbols(bulk_query, mocker):
+    filter_ = mocker.patch.object(CryptoPriceRec.objects, "filter")
+    copy_pricerecs = mocker.patch.object(historical, "copy_pricerecs")
+    # ETHUSDT's minute query failed, SOLUSDT's came back empty
+    bulk_query.return_value = [
+        ("BTCUSDT", _frame("BTCUSDT")),
+        ("ETHUSDT", _frame("ETHUSDT")),
+        ("SOLUSDT", _frame("SOLUSDT")),
+        ("BTCUSDT", _frame("BTCUSDT")),
+        ("SOLUSDT", pd.DataFrame()),
+    ]
+    symbolrecs = [
+        SymbolRec(symbol=symbol, symbol_type=SymbolType.CRYPTO) for symbol in ("BTCUSDT", "ETHUSDT", "SOLUSDT")
+    ]
+
+    historical.refresh_crypto_historical_db(symbolrecs, Timeframe.MINUTES_1, overwrite=True)
+
+    historical_map, = bulk_query.call_args.args
+    assert len(historical_map) == 6
+    filter_.assert_called_once_with(symbol__in=["BTCUSDT"])
+    filter_.return_value.delete.assert_called_once()
+    model, frames = copy_pricerecs.call_args.args
+    assert model is CryptoPriceRec
+    assert [df["symbol"][0] for df in frames] == ["BTCUSDT", "BTCUSDT"]
+
+
+def test_overwrite_keeps_records_when_nothing_arrived(bulk_query, mocker):
+    filter_ = mocker.patch.object(CryptoPriceRec.objects, "filter")
+    copy_pricerecs = mocker.patch.object(historical, "copy_pricerecs")
+    bulk_query.return_value = []
+
+    historical.refresh_crypto_historical_db(
+        [SymbolRec(symbol="BTCUSDT", symbol_type=SymbolType.CRYPTO)], Timeframe.MINUTES_1, overwrite=True
+    )
+
+    filter_.assert_not_called()
+    copy_pricerecs.assert_not_called()
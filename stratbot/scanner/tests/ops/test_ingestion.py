@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import csv
+
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stratbot.scanner.models.pricerecs import CryptoPriceRec, StockPriceRec
+from stratbot.scanner.ops.ingestion import copy_columns, copy_pricerecs, csv_chunks, prepare_frame
+
+
+def _bars(symbol: str, periods: int, **extra) -> pd.DataFrame:
+    index = pd.date_range("2024-01-01", periods=periods, freq="min", tz="UTC", name="time")
+    df = pd.DataFrame(
+        {
+            "timestamp": np.arange(periods),
+            "open": 1.0,
+            "high": 2.0,
+            "low": 0.5,
+            "close": 1.5,
+            "volume": 10.0,
+            "symbol": symbol,
+            **extra,
+        },
+        index=index,
+    )
+    return df
+
+
+def test_prepare_frame_matches_table_columns():
+    fields = copy_columns(StockPriceRec)
+    df = prepare_frame(_bars("AAPL", 3, transactions=[1.0, np.nan, 3.0]), fields)
+
+    assert list(df.columns) == [field.column for field in fields]
+    assert "id" not in df.columns
+    assert "timestamp" not in df.columns
+    assert df["vwap"].isna().all()
+    assert df["transactions"].tolist()[::2] == [1, 3]
+    assert df["transactions"].isna().tolist() == [False, True, False]
+
+
+def test_csv_chunks_split_across_frames():
+    fields = copy_columns(CryptoPriceRec)
+    frames = [
+        _bars("BTCUSDT", 5, exchange="BINANCE"),
+        pd.DataFrame(),
+        _bars("ETHUSDT", 4, exchange="BINANCE"),
+    ]
+
+    chunks = [(list(csv.reader(buffer)), rows) for buffer, rows in csv_chunks(frames, fields, chunk_size=4)]
+
+    assert [rows for _, rows in chunks] == [4, 4, 1]
+    assert all(len(lines) == rows for lines, rows in chunks)
+    symbols = [line[[field.column for field in fields].index("symbol")] for lines, _ in chunks for line in lines]
+    assert symbols == ["BTCUSDT"] * 5 + ["ETHUSDT"] * 4
+    first_time = chunks[0][0][0][[field.column for field in fields].index("time")]
+    assert pd.Timestamp(first_time) == pd.Timestamp("2024-01-01", tz="UTC")
+
+
+@pytest.mark.django_db
+def test_copy_pricerecs_skips_existing_rows():
+    StockPriceRec.objects.create(
+        time=pd.Timestamp("2024-01-01 00:01", tz="UTC"),
+        symbol="AAPL",
+        open=Decimal("9"),
+        high=Decimal("9"),
+        low=Decimal("9"),
+        close=Decimal("9"),
+        volume=Decimal("1"),
+    )
+
+    stats = copy_pricerecs(StockPriceRec, [_bars("AAPL", 3), _bars("MSFT", 2)], chunk_size=2)
+
+    assert (stats.rows_copied, stats.rows_inserted, stats.chunks) == (5, 4, 3)
+    assert StockPriceRec.objects.count() == 5
+    # the existing row wins
+    assert StockPriceRec.objects.get(symbol="AAPL", time=pd.Timestamp("2024-01-01 00:01", tz="UTC")).open == 9
+    assert sorted(StockPriceRec.objects.filter(symbol="MSFT").values_list("close", flat=True)) == [1.5, 1.5]
+
+    # a second load of the same frames only copies
+    stats = copy_pricerecs(StockPriceRec, _bars("MSFT", 2))
+    assert (stats.rows_copied, stats.rows_inserted) == (2, 0)
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import pytest
+
+from stratbot.scanner.ops import pacing
+from stratbot.scanner.ops.pacing import AdaptivePacer
+
+
+@pytest.fixture
+def sleeps(mocker) -> list[float]:
+    sleeps = []
+    mocker.patch.object(pacing, "sleep", side_effect=sleeps.append)
+    return sleeps
+
+
+def test_idle_iterations_back_off_to_max_interval(sleeps):
+    pacer = AdaptivePacer(min_interval=0.25, max_interval=5.0)
+
+    for _ in range(7):
+        pacer.wait(0.0, busy=False)
+
+    assert sleeps == [0.5, 1.0, 2.0, 4.0, 5.0, 5.0, 5.0]
+
+
+def test_busy_iteration_resets_to_min_interval(sleeps):
+    pacer = AdaptivePacer(min_interval=0.25, max_interval=5.0)
+    for _ in range(4):
+        pacer.wait(0.0, busy=False)
+
+    pacer.wait(0.0, busy=True)
+    pacer.wait(0.0, busy=False)
+
+    assert sleeps[-2:] == [0.25, 0.5]
+
+
+def test_elapsed_time_counts_against_the_interval(sleeps):
+    pacer = AdaptivePacer(min_interval=0.25, max_interval=5.0)
+
+    pacer.wait(0.1, busy=True)
+    pacer.wait(0.1, busy=False)
+    pacer.wait(3.0, busy=False)
+
+    assert sleeps == pytest.approx([0.15, 0.4, 0.0])
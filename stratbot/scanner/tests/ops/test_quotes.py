@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock
+
+import pytest
+from django.db import OperationalError
+
+from stratbot.scanner.models.symbols import SymbolType
+from stratbot.scanner.ops import quotes
+from stratbot.scanner.ops.quotes import QuoteBook, read_quote_snapshot
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes: dict[str, dict] = {}
+        self.values: dict[str, bytes] = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k.encode(): str(v).encode() for k, v in mapping.items()})
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+        return int(self.values[key])
+
+    def set(self, key, value):
+        self.values[key] = str(value).encode()
+
+    def get(self, key):
+        return self.values.get(key)
+
+
+@pytest.fixture
+def cursor(mocker) -> MagicMock:
+    cursor = MagicMock()
+    connection = MagicMock()
+    connection.ops.quote_name = lambda name: f'"{name}"'
+    connection.cursor.return_value.__enter__.return_value = cursor
+    mocker.patch.object(quotes, 'connections', {'default': connection})
+    return cursor
+
+
+@pytest.fixture
+def book() -> QuoteBook:
+    return QuoteBook(SymbolType.CRYPTO, ['BTCUSDT', 'ETHUSDT', 'SOLUSDT'], redis_client=FakeRedis())
+
+
+def _rows(params: list) -> list[tuple]:
+    return [(symbol, price, as_of.timestamp()) for symbol, price, as_of in zip(*[iter(params)] * 3)]
+
+
+def test_only_changed_quotes_are_written(book, cursor):
+    book.update('BTCUSDT', '42000.5', ts=1000.0)
+    book.update('ETHUSDT', '2200', ts=1000.5)
+    book.update('DOGEUSDT', '0.1', ts=1000.5)
+    assert book.flush(now=1001.0) == 2
+
+    sql, params = cursor.execute.call_args.args
+    assert sql.count('(%s, %s, %s)') == 2
+    assert sql.startswith('UPDATE "scanner_symbolrec" AS s SET "price" = ')
+    assert _rows(params) == [('BTCUSDT', 42000.5, 1000.0), ('ETHUSDT', 2200.0, 1000.5)]
+    assert read_quote_snapshot(SymbolType.CRYPTO, book.redis).quotes == {'BTCUSDT': 42000.5, 'ETHUSDT': 2200.0}
+
+    book.update('BTCUSDT', '42000.5', ts=1001.5)
+    book.update('ETHUSDT', '2201', ts=1001.5)
+    assert book.flush(now=1002.0) == 1
+    sql, params = cursor.execute.call_args.args
+    assert _rows(params) == [('ETHUSDT', 2201.0, 1001.5)]
+    assert book.stats.rows_updated == 3
+    assert book.stats.flushes == 2
+
+    assert book.flush(now=1003.0) == 0
+    assert cursor.execute.call_count == 2
+
+
+def test_unchanged_quotes_are_rewritten_on_heartbeat(book, cursor):
+    book.update('BTCUSDT', 100, ts=1000.0)
+    book.update('ETHUSDT', 10, ts=1000.0)
+    book.flush(now=1000.0)
+
+    # BTCUSDT keeps quoting the same price, ETHUSDT stops quoting
+    book.update('BTCUSDT', 100, ts=1005.0)
+    assert book.flush(now=1005.0) == 0
+    book.update('BTCUSDT', 100, ts=1009.0)
+    assert book.flush(now=1010.0) == 1
+    sql, params = cursor.execute.call_args.args
+    assert _rows(params) == [('BTCUSDT', 100.0, 1009.0)]
+    assert book.stats.heartbeat_rows == 1
+    assert book.redis.hashes['quotes:crypto:as_of'] == {b'BTCUSDT': b'1009.0', b'ETHUSDT': b'1000.0'}
+
+    assert book.flush(now=1030.0) == 0
+
+
+def test_reverted_quote_is_not_written(book, cursor):
+    book.update('BTCUSDT', 100)
+    book.flush()
+    book.update('BTCUSDT', 101)
+    book.update('BTCUSDT', 100)
+    assert len(book) == 0
+    assert book.flush() == 0
+
+
+def test_failed_flush_keeps_quotes(book, cursor):
+    cursor.execute.side_effect = OperationalError('down')
+    book.update('BTCUSDT', 100)
+    assert book.flush() == 0
+    assert book.stats.failed_flushes == 1
+    assert read_quote_snapshot(SymbolType.CRYPTO, book.redis).version == 0
+
+    cursor.execute.side_effect = None
+    assert book.flush() == 1
+    assert read_quote_snapshot(SymbolType.CRYPTO, book.redis).quotes == {'BTCUSDT': 100.0}
+
+
+def test_snapshot_versions(book, cursor, mocker):
+    snapshot = read_quote_snapshot(SymbolType.CRYPTO, book.redis)
+    assert (snapshot.version, snapshot.published_at, snapshot.quotes) == (0, None, {})
+    assert snapshot.age() is None
+
+    book.update('BTCUSDT', 100)
+    book.flush()
+    book.update('ETHUSDT', 10)
+    book.flush()
+    snapshot = read_quote_snapshot(SymbolType.CRYPTO, book.redis)
+    assert snapshot.version == book.stats.version == 2
+    assert snapshot.quotes == {'BTCUSDT': 100.0, 'ETHUSDT': 10.0}
+    assert 0 <= snapshot.age() < 5
+
+    hgetall = mocker.spy(book.redis, 'hgetall')
+    unchanged = read_quote_snapshot(SymbolType.CRYPTO, book.redis, since_version=2)
+    assert (unchanged.version, unchanged.changed, unchanged.quotes) == (2, False, {})
+    hgetall.assert_not_called()
+
+
+def test_snapshot_drops_stale_symbols(book, cursor):
+    book.update('BTCUSDT', 100, ts=1000.0)
+    book.update('ETHUSDT', 10, ts=1025.0)
+    book.flush(now=1025.0)
+
+    snapshot = read_quote_snapshot(SymbolType.CRYPTO, book.redis)
+    assert snapshot.as_of == {'BTCUSDT': 1000.0, 'ETHUSDT': 1025.0}
+    assert snapshot.fresh(30.0, now=1029.0) == {'BTCUSDT': 100.0, 'ETHUSDT': 10.0}
+    assert snapshot.fresh(30.0, now=1031.0) == {'ETHUSDT': 10.0}
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from django.utils import timezone
+
+from stratbot.scanner.models.symbols import Setup, SymbolRec, SymbolType
+from stratbot.scanner.models.timeframes import Timeframe
+from stratbot.scanner.ops import setup_scanner
+from stratbot.scanner.ops.candles.metrics import stratify_df
+
+
+def _frame(rng: np.random.Generator, periods: int, end: pd.Timestamp, freq: timedelta) -> pd.DataFrame:
+    # Prices on a 0.5 grid so equal highs and lows (insides, tied levels) are common.
+    closes = np.round((50 + np.cumsum(rng.normal(0, 1, periods))) * 2) / 2
+    opens = np.concatenate([[closes[0]], closes[:-1]])
+    highs = np.maximum(opens, closes) + np.round(rng.uniform(0, 1.5, periods) * 2) / 2
+    lows = np.minimum(opens, closes) - np.round(rng.uniform(0, 1.5, periods) * 2) / 2
+    index = pd.date_range(end=end, periods=periods, freq=freq, name="time")
+    return stratify_df(pd.DataFrame(
+        {"open": opens, "high": highs, "low": lows, "close": closes, "volume": 1.0}, index=index
+    ))
+
+
+def _summary(setup: Setup) -> tuple:
+    return (
+        setup.symbol_rec.symbol,
+        setup.direction,
+        setup.timestamp,
+        setup.expires,
+        setup.priority,
+        setup.pattern,
+        setup.candle_tag,
+        setup.trigger,
+        setup.stop,
+        setup.targets,
+        setup.rr,
+        setup.pmg,
+    )
+
+
+def test_scans_and_writes_one_chunk_at_a_time(mocker):
+    symbolrecs = [SymbolRec(pk=pk, symbol=f'SYM{pk}USDT', symbol_type=SymbolType.CRYPTO) for pk in range(1, 6)]
+    mocker.patch.object(SymbolRec.objects, 'filter', return_value=symbolrecs)
+    setup_filter = mocker.patch.object(Setup.objects, 'filter')
+    setup_filter.return_value.values_list.return_value.distinct.return_value = [(2, Timeframe.DAYS_1)]
+    load_frames = mocker.patch.object(
+        setup_scanner, 'load_frames', side_effect=lambda keys: [pd.DataFrame() for _ in keys]
+    )
+    scan_timeframe = mocker.patch.object(
+        setup_scanner, 'scan_timeframe', side_effect=lambda tf, frames, now, rr_min: [Setup() for _ in frames]
+    )
+    bulk_create = mocker.patch.object(Setup.objects, 'bulk_create')
+
+    stats = setup_scanner.scan_setups(
+        SymbolType.CRYPTO, tfs=[Timeframe.DAYS_1, Timeframe.WEEKS_1], chunk_size=2
+    )
+
+    chunks = [[(symbolrec.pk, tf) for symbolrec, tf in call.args[0]] for call in load_frames.call_args_list]
+    assert chunks == [
+        [(1, Timeframe.DAYS_1), (1, Timeframe.WEEKS_1), (2, Timeframe.WEEKS_1)],
+        [(3, Timeframe.DAYS_1), (4, Timeframe.DAYS_1), (3, Timeframe.WEEKS_1), (4, Timeframe.WEEKS_1)],
+        [(5, Timeframe.DAYS_1), (5, Timeframe.WEEKS_1)],
+    ]
+    assert scan_timeframe.call_count == 6
+    assert [len(call.args[0]) for call in bulk_create.call_args_list] == [3, 4, 2]
+    assert not any(SymbolRec.TF_MAP[Timeframe.DAYS_1] in vars(symbolrec) for symbolrec in symbolrecs)
+    assert (stats.num_symbols, stats.num_chunks, stats.num_frames, stats.num_setups) == (5, 3, 9, 9)
+
+
+@pytest.mark.parametrize("tf", [Timeframe.DAYS_1, Timeframe.MINUTES_60])
+@pytest.mark.parametrize("rr_min", [0.0, 1.5])
+def test_scan_timeframe_matches_symbolrec(tf, rr_min):
+    rng = np.random.default_rng(11)
+    now = timezone.now()
+    delta = SymbolRec.CANDLE_EXPIRE_DELTAS[tf]
+    newest_open = now.replace(minute=0, second=0, microsecond=0)
+    if tf == Timeframe.DAYS_1:
+        newest_open = newest_open.replace(hour=0)
+    newest_closed = newest_open - delta
+
+    frames = []
+    for i in range(200):
+        # newest candle still open for every other symbol, and a few frames with only
+        # two candles before (or after) the open one is dropped
+        end = newest_open if i % 2 else newest_closed
+        periods = 2 + i % 2 if i % 20 < 2 else 30
+        symbolrec = SymbolRec(pk=i + 1, symbol=f"SYM{i}USDT", symbol_type=SymbolType.CRYPTO)
+        df = _frame(rng, periods, pd.Timestamp(end), delta)
+        setattr(symbolrec, SymbolRec.TF_MAP[tf], df)
+        frames.append((symbolrec, df))
+    frames.append((SymbolRec(pk=999, symbol="EMPTYUSDT", symbol_type=SymbolType.CRYPTO), pd.DataFrame()))
+
+    expected = [
+        _summary(setup)
+        for symbolrec, df in frames
+        if not df.empty
+        for setup in symbolrec.scan_strat_setups([tf], rr_min=rr_min).get(tf, [])
+    ]
+    actual = [_summary(setup) for setup in setup_scanner.scan_timeframe(tf, frames, now, rr_min=rr_min)]
+
+    assert sorted(actual, key=lambda s: (s[0], s[1])) == sorted(expected, key=lambda s: (s[0], s[1]))
+    # the fixture covers both directions, inside targets, every priority and a two
+    # candle frame
+    assert {setup[1] for setup in actual} == {1, -1}
+    assert any(setup[5][0] == "1" for setup in actual)
+    assert any(not setup[9] for setup in actual)
+    assert {setup[4] for setup in actual} == {1, 2, 3}
+    two_candles = {symbolrec.symbol for symbolrec, df in frames if len(df) == 2}
+    assert any(setup[0] in two_candles for setup in actual)
+    if rr_min:
+        assert all(setup[10] >= rr_min for setup in actual if setup[9])
+        assert len(actual) < len(setup_scanner.scan_timeframe(tf, frames, now))
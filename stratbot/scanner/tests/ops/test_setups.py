@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from dirtyfields.dirtyfields import reset_state
+from django.utils import timezone
+
+from stratbot.scanner.models.symbols import Setup, SymbolRec, SymbolType
+from stratbot.scanner.ops.setups import changed_setups
+from stratbot.scanner.tests.ops.live_loop.test_columnar import _setup
+
+
+def _loaded(symbolrec: SymbolRec, pk: int) -> Setup:
+    setup = _setup(symbolrec, pk=pk)
+    setup._state.adding = False
+    reset_state(sender=Setup, instance=setup)
+    return setup
+
+
+def test_last_triggered_alone_is_not_a_change():
+    btc = SymbolRec(symbol="BTCUSDT", symbol_type=SymbolType.CRYPTO)
+    untouched, stamped, in_force, negated, retargeted = (_loaded(btc, pk) for pk in range(1, 6))
+
+    now = timezone.now()
+    for setup in (stamped, in_force):
+        setup.last_triggered = now
+        setup.updated_at = now
+    in_force.in_force = True
+    in_force.initial_trigger = now
+    negated.negated = True
+    retargeted.targets = [106.0]
+
+    assert not untouched.is_dirty() and stamped.is_dirty()
+    assert changed_setups([untouched, stamped, in_force, negated, retargeted]) == [in_force, negated, retargeted]
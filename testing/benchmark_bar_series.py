@@ -0,0 +1,101 @@
+"""
+Micro-benchmarks for the trade ingest hot path: the `BarSeries` calls made for every
+second bar and timeframe, and the fused timeframe aggregator built on them. The dict
+backed series `BarSeries` used to be is kept here for comparison.
+
+    python testing/benchmark_bar_series.py
+"""
+from dataclasses import replace
+from timeit import repeat
+
+from dataflows.bars import Bar, BarSeries, aggregate_bar, build_timeframe_aggregator
+from dataflows.timeframe_ops import crypto_bucket_boundaries
+
+
+NUMBER = 100_000
+
+
+class DictBarSeries(BarSeries):
+    def __init__(self, symbol: str, tf: str):
+        self.symbol = symbol
+        self.tf = tf
+        self._bars = {}
+
+    def add_bar(self, bar):
+        if len(self._bars) >= self.MAXLEN:
+            self._bars.pop(min(self._bars.keys()))
+        self._bars[bar.ts] = bar
+
+    def get_newest(self):
+        return self._bars[max(self._bars.keys())] if self._bars else None
+
+    def get_previous(self):
+        sorted_keys = sorted(self._bars.keys())
+        return self._bars[sorted_keys[-2]] if len(sorted_keys) > 1 else None
+
+    def replace_newest(self, bar):
+        if self._bars:
+            self._bars.pop(max(self._bars.keys()))
+        self._bars[bar.ts] = bar
+
+    def strat_candles(self):
+        if len(self._bars) < 3:
+            return None, None
+        sorted_keys = sorted(self._bars.keys())
+        return self._bars[sorted_keys[-3]], self._bars[sorted_keys[-2]]
+
+
+def filled(cls) -> BarSeries:
+    bar_series = cls('BTCUSDT', '15')
+    for i in range(BarSeries.MAXLEN):
+        bar_series.add_bar(Bar(ts=float(i * 900), o=100, h=101, l=99, c=100, v=1))
+    return bar_series
+
+
+def timed(label: str, stmt, number: int = NUMBER) -> float:
+    elapsed = min(repeat(stmt, number=number, repeat=5)) / number
+    print(f'  {label:<16} {elapsed * 1e9:10.0f} ns/call')
+    return elapsed
+
+
+class FakeJSON:
+    def get(self, key, *path):
+        return None
+
+
+class FakeRedis:
+    def json(self):
+        return FakeJSON()
+
+
+for cls in (DictBarSeries, BarSeries):
+    print(cls.__name__)
+    bar_series = filled(cls)
+    newest = bar_series.get_newest()
+    counter = iter(range(10 ** 9))
+    bar = Bar(ts=0.0, o=100, h=102, l=98, c=101, v=1)
+
+    timed('get_newest', bar_series.get_newest)
+    timed('get_previous', bar_series.get_previous)
+    timed('strat_candles', bar_series.strat_candles)
+    timed('replace_newest', lambda: bar_series.replace_newest(newest))
+    timed('add_bar', lambda: bar_series.add_bar(replace(bar, ts=float(next(counter) + 10_000))))
+
+    bar_series = filled(cls)
+    bucket = bar_series.get_newest().ts
+    second = replace(bar, ts=bucket)
+    timed('aggregate_bar', lambda: aggregate_bar(bar_series, bucket, second))
+
+print('fused aggregator, 11 timeframes per second bar')
+aggregate_timeframes = build_timeframe_aggregator(FakeRedis(), '', crypto_bucket_boundaries())
+state, _ = aggregate_timeframes(None, ('BTCUSDT', Bar(ts=1_700_000_000.0, o=100, h=101, l=99, c=100, v=1)))
+seconds = iter(range(10 ** 9))
+
+
+def second_bar():
+    global state
+    ts = 1_700_000_000.0 + next(seconds)
+    state, _ = aggregate_timeframes(state, ('BTCUSDT', Bar(ts=ts, o=100, h=101, l=99, c=100, v=1)))
+
+
+timed('per second bar', second_bar, number=20_000)
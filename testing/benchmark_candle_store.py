@@ -0,0 +1,56 @@
+"""
+Compare the pickled DataFrame cache (unpickle, rename, stratify on every read) with
+the columnar candle encoding in `stratbot.scanner.ops.candles.columnar`.
+
+    python testing/benchmark_candle_store.py
+"""
+import pickle
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from stratbot.scanner.ops.candles.columnar import candles_from_bytes, candles_to_bytes
+from stratbot.scanner.ops.candles.metrics import stratify_df
+
+
+ROWS = (500, 10_000)
+ITERATIONS = 200
+
+
+def make_ohlcv(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    close = 100 + rng.standard_normal(rows).cumsum()
+    open_ = close + rng.standard_normal(rows) * 0.2
+    high = np.maximum(open_, close) + rng.random(rows)
+    low = np.minimum(open_, close) - rng.random(rows)
+    volume = rng.integers(1_000, 100_000, rows).astype(float)
+    index = pd.date_range('2024-01-01', periods=rows, freq='15min', tz='UTC', name='time')
+    return pd.DataFrame({'o': open_, 'h': high, 'l': low, 'c': close, 'v': volume}, index=index)
+
+
+def read_pickle(data: bytes) -> pd.DataFrame:
+    df = pickle.loads(data)
+    df.rename(columns={'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume'}, inplace=True)
+    return stratify_df(df)
+
+
+def timed(label: str, func, data: bytes) -> float:
+    s = perf_counter()
+    for _ in range(ITERATIONS):
+        func(data)
+    elapsed = (perf_counter() - s) / ITERATIONS
+    print(f'  {label:<10} {elapsed * 1000:.4f} ms/read ({len(data):,} bytes)')
+    return elapsed
+
+
+for rows in ROWS:
+    df = make_ohlcv(rows)
+    pickled = pickle.dumps(df)
+    columnar = candles_to_bytes(df)
+    pd.testing.assert_frame_equal(read_pickle(pickled), candles_from_bytes(columnar), check_categorical=False)
+
+    print(f'{rows:,} rows')
+    pickle_elapsed = timed('pickle', read_pickle, pickled)
+    columnar_elapsed = timed('columnar', candles_from_bytes, columnar)
+    print(f'  speedup    {pickle_elapsed / columnar_elapsed:.1f}x')
@@ -0,0 +1,50 @@
+"""
+Additional targets for an in force setup: the walk `scan_setups` used to do over every
+price record beyond the target (newest first, without the query itself) against a
+lookup in a `MagnitudeLadder`, on a random walk of daily and 15 minute bars. Checks both
+give the same targets on the way.
+
+    python testing/benchmark_magnitude_ladder.py
+"""
+import random
+from timeit import repeat
+
+from dataflows.targets import MagnitudeLadder
+
+
+def random_walk(n: int, seed: int = 1) -> list[tuple[float, float, float]]:
+    rng = random.Random(seed)
+    price, rows = 100.0, []
+    for i in range(n):
+        price = max(1.0, price * (1 + rng.gauss(0, 0.02)))
+        high, low = price * (1 + abs(rng.gauss(0, 0.01))), price * (1 - abs(rng.gauss(0, 0.01)))
+        rows.append((float(i), round(high, 2), round(low, 2)))
+    return rows
+
+
+def scan_targets(rows, target: float, direction: int, limit: int = 5) -> list[float]:
+    targets, current = [], target
+    for _, high, low in reversed(rows):
+        level = high if direction == 1 else low
+        if level * direction > current * direction:
+            targets.append(level)
+            current = level
+    return targets[:limit]
+
+
+for label, n in (('D', 5_000), ('15', 200_000)):
+    rows = random_walk(n)
+    ladder = MagnitudeLadder('BENCH', label)
+    ladder.extend(rows)
+    probes = [(rows[-1][1] * (1 + 0.05 * k), 1) for k in range(-4, 5)] + \
+             [(rows[-1][2] * (1 - 0.05 * k), -1) for k in range(-4, 5)]
+    for target, direction in probes:
+        assert ladder.targets(target, direction) == scan_targets(rows, target, direction)
+
+    number = 20
+    scan = min(repeat(lambda: [scan_targets(rows, t, d) for t, d in probes], number=number, repeat=3))
+    lookup = min(repeat(lambda: [ladder.targets(t, d) for t, d in probes], number=number, repeat=3))
+    per_call = number * len(probes)
+    print(f'[{label}] {n} bars, ladder {len(ladder.highs)} highs / {len(ladder.lows)} lows')
+    print(f'  scan   {scan / per_call * 1e6:10.1f} us/setup')
+    print(f'  ladder {lookup / per_call * 1e6:10.1f} us/setup')
@@ -0,0 +1,76 @@
+"""
+Compare emitting `copy.deepcopy(state)` from the dataflow `stateful_map` steps with the
+snapshots in `dataflows.bars` / `dataflows.setups`, per event and at peak rate.
+
+    python testing/benchmark_stateful_snapshots.py
+"""
+import copy
+import tracemalloc
+from datetime import datetime, timezone
+from time import process_time
+
+from dataflows.bars import Bar, BarSeries, aggregate_bar, strat_id
+from dataflows.setups import build_setup, snapshot_setups
+
+
+TIMEFRAMES = ['15', '30', '60', '4H', '6H', '12H', 'D', 'W', 'M', 'Q', 'Y']
+# Binance aggTrade messages per second across all symbols on a busy day.
+PEAK_EVENTS_PER_SECOND = 20_000
+ITERATIONS = 20_000
+
+
+def make_bar_series(tf: str) -> BarSeries:
+    bar_series = BarSeries('BTCUSDT', tf)
+    for i in range(BarSeries.MAXLEN):
+        bar = Bar(ts=1_700_000_000 + i * 900, o=100 + i, h=102 + i, l=99 + i, c=101 + i, v=10.0)
+        if previous_bar := bar_series.get_newest():
+            bar.sid = strat_id(previous_bar, bar)
+        bar_series.add_bar(bar)
+    return bar_series
+
+
+def update(bar_series: BarSeries, price: float) -> None:
+    bucket = bar_series.get_newest().ts
+    aggregate_bar(bar_series, bucket, Bar(ts=bucket, o=price, h=price, l=price, c=price, v=1.0))
+
+
+def measure(label: str, step) -> None:
+    start = process_time()
+    for i in range(ITERATIONS):
+        step(i)
+    cpu = (process_time() - start) / ITERATIONS
+
+    # Keep the emitted values alive, the way downstream steps hold on to them.
+    tracemalloc.start()
+    emitted = [step(i) for i in range(1_000)]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del emitted
+
+    core_share = cpu * PEAK_EVENTS_PER_SECOND * 100
+    print(f'  {label:<10} {cpu * 1e6:8.2f} us/event  {core_share:6.1f}% of a core at peak  '
+          f'{allocated / 1_000:8.0f} bytes/event')
+
+
+tf_bar_series = {tf: make_bar_series(tf) for tf in TIMEFRAMES}
+setups = {tf: build_setup('BTCUSDT', bar_series) for tf, bar_series in tf_bar_series.items()}
+for setup in setups.values():
+    setup.negated_reasons = {'CONTINUATION'}
+
+print(f'bar series, one timeframe per event ({BarSeries.MAXLEN} bars)')
+bar_series = tf_bar_series['15']
+measure('deepcopy', lambda i: (update(bar_series, 100 + i % 7), copy.deepcopy(bar_series)))
+measure('snapshot', lambda i: (update(bar_series, 100 + i % 7), bar_series.snapshot()))
+
+print(f'setups, {len(TIMEFRAMES)} timeframes per event')
+now = datetime.now(tz=timezone.utc)
+
+
+def touch(i: int) -> None:
+    for setup in setups.values():
+        setup.current_bar = tf_bar_series[setup.tf].get_newest()
+        setup.in_force_last_alerted = now
+
+
+measure('deepcopy', lambda i: (touch(i), copy.deepcopy(setups)))
+measure('snapshot', lambda i: (touch(i), snapshot_setups(setups)))
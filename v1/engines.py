@@ -14,7 +14,7 @@ from stratbot.scanner.models.exchange_calendar import ExchangeCalendar
 from stratbot.scanner.models.timeframes import Timeframe
 from v1.alerts.console import ConsoleStockAlert, ConsoleAlert
 from v1.perf import func_timer
-from stratbot.scanner.models.symbols import SymbolRec, Setup, SymbolType
+from stratbot.scanner.models.symbols import SymbolRec, Setup, SymbolType, NegatedReason
 from stratbot.scanner.ops import historical
 
 
@@ -51,7 +51,7 @@ class ScanEngine:
     @property
     def setups(self) -> QuerySet:
         return (Setup.objects
-                .prefetch_related('symbol_rec')
+                .select_related('symbol_rec')
                 .filter(expires__gt=timezone.now())
                 .filter(symbol_rec__symbol_type=self.engine_type)
                 # .filter(hit_magnitude=False)
@@ -59,6 +59,20 @@ class ScanEngine:
                 .filter(tf__in=self.timeframes)
                 )
 
+    def load_setups(self) -> list[Setup]:
+        return list(self.setups)
+
+    @staticmethod
+    def active_symbols(setups: list[Setup]) -> set[str]:
+        """
+        Symbols with at least one of `setups`, the only ones worth fetching bars for.
+        """
+        return {setup.symbol_rec.symbol for setup in setups}
+
+    @cached_property
+    def negated_reasons(self) -> dict[int, NegatedReason]:
+        return {negated_reason.reason: negated_reason for negated_reason in NegatedReason.objects.all()}
+
     @cached_property
     def setups_by_direction(self):
         ordered_setups = defaultdict(lambda: defaultdict(list))